@@ -2,13 +2,23 @@
 NEARMISS System - Main Flask Application
 Near Miss reporting system with plant-specific functionality
 """
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, Response, stream_with_context, g
+from flask.json.provider import DefaultJSONProvider
 import logging
 import os
-from datetime import datetime
+import csv
+import io
+import time as clock
+from datetime import datetime, time
 from .utils.auth import AuthManager
-from .models.database import NearMissDatabase
+from .models.database import NearMissDatabase, set_primary_reads
+from .models.records import Record
 from .utils.email import EmailManager
+from .utils.cache import lookup_cache
+from .models.instrumentation import query_stats
+from .utils.metrics import request_metrics, render_metrics
+from .utils.startup import WarmUp
+from .models.directory import user_directory
 
 # Configure logging
 logging.basicConfig(
@@ -18,22 +28,119 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Statements slower than SLOW_QUERY_SECONDS go to their own file (parameters redacted)
+slow_query_handler = logging.FileHandler('logs/slow_queries.log')
+slow_query_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+slow_query_log = logging.getLogger('nearmiss.slow_queries')
+slow_query_log.addHandler(slow_query_handler)
+slow_query_log.propagate = False
+
+def _json_safe(record: dict) -> dict:
+    """Convert date/time values to ISO strings (jsonify can't serialise datetime.time)"""
+    return {key: value.isoformat() if hasattr(value, 'isoformat') else value
+            for key, value in record.items()}
+
+# Columns of the CSV export: the report as displayed, without internal ids or row_version
+CSV_EXPORT_FIELDS = (
+    'report_id', 'date_occurred', 'time_occurred', 'plant', 'employee_name',
+    'dept_name', 'equipment_area', 'hazard_assessment', 'hazard_type',
+    'custom_hazard_type', 'description', 'action_description', 'corrective_action',
+    'responsible_party', 'corrective_action_completed', 'completion_date',
+    'completed_by', 'created_by', 'created_date'
+)
+
+def _csv_rows(reports):
+    """Yield CSV lines for an iterable of report records; the header is sent even when there are none"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    yield buffer.getvalue()
+    for report in reports:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerow(report)
+        yield buffer.getvalue()
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Lets jsonify serialise Record rows and TIME columns"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o._asdict()
+        if isinstance(o, time):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
 def create_app():
     app = Flask(__name__)
     app.secret_key = 'nearmiss_system_secret_key_2025'
+    app.json = RecordJSONProvider(app)
+    app.config.setdefault('SLOW_QUERY_SECONDS', 0.5)
+    query_stats.slow_threshold = app.config['SLOW_QUERY_SECONDS']
     
-    # Initialize components
+    # Initialize components (none of these touch the database until first use)
     auth_manager = AuthManager()
     db = NearMissDatabase()
     email_manager = EmailManager()
     
-    try:
-        # Test database connection
-        test_conn = db.get_connection()
-        test_conn.close()
-        logger.info("Database connection verified")
-    except Exception as e:
-        logger.error(f"Database connection failed: {e}")
+    # Connect and fill caches in the background so a slow database can't stall startup;
+    # requests that arrive first just load what they need themselves
+    warmup = WarmUp()
+    warmup.add('database', db.pool.warm, required=True)
+    warmup.add('email_config', lambda: email_manager.config)
+    warmup.add('user_directory', lambda: user_directory.ensure_fresh(db))
+    warmup.add('lookups', lambda: db.load_lookups('departments', 'equipment', 'hazard_types', 'immediate_actions'))
+    warmup.add('search_index', lambda: db.fulltext_available() or db.refresh_search_index(full=True))
+    warmup.start()
+    
+    @app.before_request
+    def count_request_queries():
+        query_stats.start_request()
+    
+    @app.after_request
+    def finish_request_queries(response):
+        counted = query_stats.finish_request()
+        if counted:
+            queries, query_time = counted
+            logger.debug(f"{request.method} {request.path}: {queries} queries, {query_time * 1000:.1f} ms in SQL")
+        return response
+    
+    @app.before_request
+    def route_reads():
+        # Read-your-writes: a session that just wrote reports reads from the primary for a while
+        set_primary_reads(session.get('primary_reads_until', 0) > clock.time())
+    
+    @app.teardown_request
+    def reset_read_routing(exc):
+        set_primary_reads(False)
+    
+    def pin_reads_to_primary():
+        """Called after a report write so this session's next pages can't see a lagging replica"""
+        session['primary_reads_until'] = clock.time() + db.READ_YOUR_WRITES_SECONDS
+        set_primary_reads(True)
+    
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = clock.perf_counter()
+        request_metrics.request_started()
+    
+    @app.after_request
+    def capture_response_metrics(response):
+        g.metrics_status = response.status_code
+        g.metrics_size = response.content_length or 0
+        return response
+    
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        # Teardown always runs, so in-flight never leaks even when a handler raises
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_metrics.request_finished(request.method, route, g.pop('metrics_status', 500),
+                                         clock.perf_counter() - started, g.pop('metrics_size', 0),
+                                         error=exc is not None)
     
     @app.route('/')
     def index():
@@ -42,7 +149,9 @@ def create_app():
             return redirect(url_for('login'))
         
         logger.info(f"User {session['username']} accessed dashboard")
-        return render_template('dashboard.html', username=session['username'])
+        # Precomputed counts from the report_stats_daily rollup
+        stats = db.get_dashboard_stats(request.args.get('plant') or None)
+        return render_template('dashboard.html', username=session['username'], stats=stats)
     
     @app.route('/login', methods=['GET', 'POST'])
     def login():
@@ -126,25 +235,15 @@ def create_app():
                     'responsible_party_id': request.form.get('responsible_party_id')
                 }
                 
-                # Submit the report
-                success = db.create_near_miss_report(data, session['user_id'])
+                # Submit the report (returns the stored row with names joined in)
+                report = db.create_near_miss_report(data, session['user_id'])
                 
-                if success:
+                if report:
+                    pin_reads_to_primary()
+                    
                     # Send email notifications
                     try:
-                        report_data = {
-                            'report_id': 'Latest',  # Would get actual ID from database
-                            'date_occurred': data.get('date_occurred'),
-                            'time_occurred': data.get('time_occurred'),
-                            'employee_name': session.get('full_name'),
-                            'plant': data.get('plant'),
-                            'dept_name': 'Department',  # Would get from database
-                            'equipment_area': data.get('equipment_area'),
-                            'hazard_assessment': data.get('hazard_assessment'),
-                            'description': data.get('description'),
-                            'immediate_action': 'Action taken',  # Would get from database
-                            'created_by': session.get('full_name')
-                        }
+                        report_data = dict(report, immediate_action=report.get('action_description'))
                         
                         # Send appropriate notification based on priority
                         if data.get('hazard_assessment') == 'High/Immediate':
@@ -155,8 +254,8 @@ def create_app():
                     except Exception as e:
                         logger.warning(f"Email notification failed: {e}")
                     
-                    flash('Near miss report submitted successfully')
-                    logger.info(f"Near miss report created by {session['username']}")
+                    flash(f"Near miss report #{report['report_id']} submitted successfully")
+                    logger.info(f"Near miss report {report['report_id']} created by {session['username']}")
                     return redirect(url_for('reports'))
                 else:
                     flash('Error submitting report. Please try again.')
@@ -165,17 +264,15 @@ def create_app():
                 logger.error(f"Error submitting near miss report: {e}")
                 flash('Error submitting report. Please try again.')
         
-        # Get dropdown data
-        users = db.get_all_users(session.get('plant'))
-        departments = db.get_departments(session.get('plant'))
-        hazard_types = db.get_hazard_types()
-        immediate_actions = db.get_immediate_actions()
+        # Get dropdown data (one round trip for whatever is not cached)
+        lookups = db.load_lookups('users', 'departments', 'hazard_types', 'immediate_actions',
+                                  plant=session.get('plant'))
         
         return render_template('entry_form.html', 
-                             users=users, 
-                             departments=departments,
-                             hazard_types=hazard_types,
-                             immediate_actions=immediate_actions,
+                             users=lookups.users, 
+                             departments=lookups.departments,
+                             hazard_types=lookups.hazard_types,
+                             immediate_actions=lookups.immediate_actions,
                              username=session['username'])
     
     @app.route('/reports')
@@ -190,19 +287,189 @@ def create_app():
         user_filter = request.args.get('user', '')
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
+        page_cursor = request.args.get('cursor', '')
+        
+        if request.args.get('export') == 'csv':
+            if not (session.get('is_supervisor') or session.get('is_admin')):
+                flash('Access denied. Supervisor privileges required.')
+                return redirect(url_for('reports'))
+            
+            # Stream rows straight from the cursor so large exports run in constant memory
+            reports_iter = db.iter_near_miss_reports(search_query, plant_filter, user_filter, date_from, date_to)
+            filename = f"near_miss_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            logger.info(f"User {session['username']} exported reports to CSV")
+            return Response(stream_with_context(_csv_rows(reports_iter)),
+                            mimetype='text/csv',
+                            headers={'Content-Disposition': f'attachment; filename={filename}'})
         
-        # Get reports with filters
-        reports = db.get_near_miss_reports(search_query, plant_filter, user_filter, date_from, date_to)
+        # Get one page of reports with filters
+        try:
+            page = db.get_near_miss_reports_page(search_query, plant_filter, user_filter, date_from, date_to,
+                                                 cursor=page_cursor or None, with_counts=True)
+        except ValueError:
+            flash('Invalid page link - showing the newest reports')
+            page_cursor = ''
+            page = db.get_near_miss_reports_page(search_query, plant_filter, user_filter, date_from, date_to,
+                                                 with_counts=True)
         users = db.get_all_users()
         
         return render_template('reports.html', 
-                             reports=reports,
+                             reports=page['reports'],
+                             counts=page['counts'],
+                             next_cursor=page['next_cursor'],
+                             page_cursor=page_cursor,
                              users=users,
                              search_query=search_query,
                              plant_filter=plant_filter,
                              user_filter=user_filter,
                              username=session['username'])
     
+    @app.route('/api/reports')
+    def api_reports():
+        """API endpoint returning one page of reports plus next_cursor (best match first for searches)"""
+        if 'username' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        try:
+            page = db.get_near_miss_reports_page(
+                request.args.get('search', ''),
+                request.args.get('plant', ''),
+                request.args.get('user', ''),
+                request.args.get('date_from', ''),
+                request.args.get('date_to', ''),
+                page_size=request.args.get('limit', type=int),
+                cursor=request.args.get('cursor') or None
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'reports': [_json_safe(report) for report in page['reports']],
+            'next_cursor': page['next_cursor'],
+            'page_size': page['page_size']
+        })
+    
+    @app.route('/api/reports/<int:report_id>/corrective-action', methods=['POST'])
+    def api_corrective_action(report_id):
+        """API endpoint for supervisors to mark a corrective action completed or reopen it"""
+        if 'username' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        if not (session.get('is_supervisor') or session.get('is_admin')):
+            return jsonify({'success': False, 'message': 'Supervisor privileges required'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        completed = bool(data.get('completed', True))
+        
+        if db.set_corrective_action_completed(report_id, completed, session['user_id']):
+            pin_reads_to_primary()
+            return jsonify({'success': True, 'report_id': report_id, 'completed': completed})
+        return jsonify({'success': False, 'message': 'Report not found or could not be updated'}), 404
+    
+    def _update_result_json(result: dict) -> dict:
+        if result['report'] is not None:
+            result = dict(result, report=_json_safe(result['report']))
+        return result
+    
+    @app.route('/api/reports/<int:report_id>', methods=['GET', 'PUT'])
+    def api_report(report_id):
+        """
+        GET one report (with its row_version) for editing; PUT edits to it.
+        PUT body: {"row_version": ..., "changes": {<field>: <value>, ...}}.
+        A stale row_version gets 409 and the report is left as it was.
+        """
+        if 'username' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        report = db.get_near_miss_report(report_id)
+        if report is None:
+            return jsonify({'success': False, 'message': 'Report not found'}), 404
+        if request.method == 'GET':
+            return jsonify(_json_safe(report))
+        
+        if not (session.get('is_supervisor') or session.get('is_admin')
+                or report.created_by_id == session['user_id']):
+            return jsonify({'success': False, 'message': 'You can only edit your own reports'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Expected a JSON object'}), 400
+        
+        try:
+            result = db.update_near_miss_report(report_id, data.get('changes'), session['user_id'],
+                                                data.get('row_version'))
+        except Exception as e:
+            logger.error(f"Report {report_id} update failed for {session['username']}: {e}")
+            return jsonify({'success': False, 'message': 'Server error - nothing was saved, retry later'}), 503
+        
+        status_code = {'conflict': 409, 'not_found': 404, 'invalid': 400}.get(result['status'], 200)
+        if result['status'] == 'updated':
+            pin_reads_to_primary()
+        return jsonify(dict(_update_result_json(result), success=status_code == 200)), status_code
+    
+    @app.route('/api/reports/bulk-update', methods=['POST'])
+    def api_reports_bulk_update():
+        """
+        API endpoint for supervisors to edit many reports in one transaction
+        (e.g. closing a batch of corrective actions).
+        Body: {"updates": [{"report_id": ..., "row_version": ..., "changes": {...}}, ...]}
+        """
+        if 'username' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        if not (session.get('is_supervisor') or session.get('is_admin')):
+            return jsonify({'success': False, 'message': 'Supervisor privileges required'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        updates = data.get('updates') if isinstance(data, dict) else data
+        
+        if not isinstance(updates, list) or not updates:
+            return jsonify({'success': False, 'message': 'Expected a non-empty "updates" array'}), 400
+        if len(updates) > db.MAX_BULK_UPDATES:
+            return jsonify({'success': False,
+                            'message': f'At most {db.MAX_BULK_UPDATES} updates per request'}), 413
+        
+        try:
+            results = db.update_near_miss_reports(updates, session['user_id'])
+        except Exception as e:
+            logger.error(f"Bulk report update failed for {session['username']}: {e}")
+            return jsonify({'success': False, 'message': 'Server error - nothing was saved, retry later'}), 503
+        
+        updated = sum(1 for result in results if result['status'] == 'updated')
+        if updated:
+            pin_reads_to_primary()
+        logger.info(f"Bulk update by {session['username']}: {updated}/{len(results)} reports updated")
+        return jsonify({'success': True, 'results': [_update_result_json(result) for result in results]})
+    
+    @app.route('/api/reports/bulk', methods=['POST'])
+    def api_reports_bulk():
+        """
+        API endpoint for offline tablets to upload queued reports in one request.
+        Body: {"reports": [{"client_key": ..., <entry form fields>}, ...]}
+        Retrying with the same client_keys is safe; already stored items come back as 'duplicate'.
+        """
+        if 'username' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        data = request.get_json(silent=True) or {}
+        items = data.get('reports') if isinstance(data, dict) else data
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'message': 'Expected a non-empty "reports" array'}), 400
+        if len(items) > db.MAX_BULK_REPORTS:
+            return jsonify({'success': False,
+                            'message': f'At most {db.MAX_BULK_REPORTS} reports per request'}), 413
+        
+        try:
+            results = db.create_near_miss_reports_bulk(items, session['user_id'])
+        except Exception as e:
+            logger.error(f"Bulk report upload failed for {session['username']}: {e}")
+            return jsonify({'success': False, 'message': 'Server error - nothing was saved, retry later'}), 503
+        
+        created = sum(1 for result in results if result['status'] == 'created')
+        if created:
+            pin_reads_to_primary()
+        logger.info(f"Bulk upload by {session['username']}: {created}/{len(results)} reports created")
+        return jsonify({'success': True, 'results': results})
+    
     @app.route('/admin/users')
     def admin_users():
         """Admin page for user management"""
@@ -220,18 +487,40 @@ def create_app():
             flash('Access denied. Admin privileges required.')
             return redirect(url_for('index'))
         
-        departments = db.get_departments()
-        equipment = db.get_equipment()
-        hazard_types = db.get_hazard_types()
-        immediate_actions = db.get_immediate_actions()
+        lookups = db.load_lookups('departments', 'equipment', 'hazard_types', 'immediate_actions')
         
         return render_template('admin_dropdowns.html',
-                             departments=departments,
-                             equipment=equipment,
-                             hazard_types=hazard_types,
-                             immediate_actions=immediate_actions,
+                             departments=lookups.departments,
+                             equipment=lookups.equipment,
+                             hazard_types=lookups.hazard_types,
+                             immediate_actions=lookups.immediate_actions,
                              username=session['username'])
     
+    @app.route('/api/admin/save-dropdowns', methods=['POST'])
+    def api_save_dropdowns():
+        """API endpoint to save admin dropdown edits"""
+        if 'username' not in session or not session.get('is_admin'):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        try:
+            changes = request.get_json() or {}
+            if db.save_dropdown_changes(changes):
+                logger.info(f"Dropdown changes saved by {session['username']}")
+                return jsonify({'success': True, 'message': 'Changes saved'})
+            return jsonify({'success': False, 'message': 'Failed to save changes'})
+        except Exception as e:
+            logger.error(f"Error saving dropdown changes: {e}")
+            return jsonify({'success': False, 'message': 'Server error'}), 500
+    
+    @app.route('/admin/cache/clear', methods=['POST'])
+    def clear_lookup_cache():
+        """Drop cached dropdown data (e.g. after running cleanup_data.py)"""
+        if 'username' not in session or not session.get('is_admin'):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        removed = db.invalidate_lookups()
+        return jsonify({'success': True, 'message': f'Cleared {removed} cached entries'})
+    
     @app.route('/api/departments/<plant>')
     def api_departments(plant):
         """API endpoint to get departments for a plant"""
@@ -259,7 +548,7 @@ def create_app():
         users = db.get_all_users(plant)
         return jsonify(users)
     
-@app.route('/api/add-employee', methods=['POST'])
+    @app.route('/api/add-employee', methods=['POST'])
     def api_add_employee():
         """API endpoint to add a new employee"""
         if 'username' not in session:
@@ -308,7 +597,8 @@ def create_app():
                     'auth_type': request.form.get('auth_type', 'STARTTLS'),
                     'use_auth': 'use_auth' in request.form,
                     'timeout': int(request.form.get('timeout', 30)),
-                    'retries': int(request.form.get('retries', 3))
+                    'retries': int(request.form.get('retries', 3)),
+                    'messages_per_connection': int(request.form.get('messages_per_connection') or 100)
                 }
                 
                 if email_manager.save_email_config(config):
@@ -376,6 +666,60 @@ def create_app():
             logger.error(f"Email queue processing error: {e}")
             return jsonify({'success': False, 'message': 'Failed to process email queue'})
     
+    # Scrapes reuse the email queue counts and search index lag for this many seconds so they stay cheap
+    METRICS_DB_TTL = 15
+    email_queue_metrics = {'value': {}, 'search_lag': None, 'fetched_at': None}
+    
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint (text exposition format)"""
+        now = clock.monotonic()
+        fetched_at = email_queue_metrics['fetched_at']
+        if fetched_at is None or now - fetched_at >= METRICS_DB_TTL:
+            email_queue_metrics['value'] = email_manager.get_queue_metrics()
+            email_queue_metrics['search_lag'] = db.search_index_lag()
+            email_queue_metrics['fetched_at'] = now
+        email_queue = email_queue_metrics['value']
+        
+        pending = email_queue.get('pending')
+        worker_lag = {
+            # Age of the oldest unsent email: how far process_emails.py is behind
+            'email_queue': (pending[1] or 0) if pending else 0,
+            # Age of the oldest report not yet in the search index (absent when full-text serves search)
+            'search_index': email_queue_metrics['search_lag']
+        }
+        
+        body = render_metrics(request_metrics, db.pool.stats(), query_stats.histograms(),
+                              query_stats.acquire_histogram(), email_queue, worker_lag)
+        return Response(body, mimetype='text/plain; version=0.0.4')
+    
+    @app.route('/healthz')
+    def healthz():
+        """Liveness: the process is up and serving (no database access)"""
+        return jsonify({'status': 'alive'})
+    
+    # Readiness re-checks the database at most this often
+    READINESS_CHECK_SECONDS = 5
+    readiness = {'ok': False, 'checked_at': None}
+    
+    @app.route('/readyz')
+    def readyz():
+        """Readiness: warm-up has connected to the database and it is still reachable"""
+        status = warmup.status()
+        if status['ready']:
+            now = clock.monotonic()
+            if readiness['checked_at'] is None or now - readiness['checked_at'] >= READINESS_CHECK_SECONDS:
+                try:
+                    db.pool.acquire(timeout=2).close()
+                    readiness['ok'] = True
+                except Exception as e:
+                    logger.warning(f"Readiness check failed: {e}")
+                    readiness['ok'] = False
+                readiness['checked_at'] = now
+            status['database'] = readiness['ok']
+            status['ready'] = readiness['ok']
+        return jsonify(status), 200 if status['ready'] else 503
+    
     @app.route('/debug')
     def debug():
         """Debug endpoint showing all available routes"""
@@ -393,7 +737,14 @@ def create_app():
                 'function': rule.endpoint
             })
         
-        return render_template('debug.html', endpoints=endpoints, username=session['username'])
+        return render_template('debug.html',
+                             endpoints=endpoints,
+                             cache_stats=lookup_cache.stats(),
+                             pool_stats=db.pool.stats(),
+                             replica_status=db.replica_status(),
+                             query_stats=query_stats.stats(),
+                             startup=warmup.status(),
+                             username=session['username'])
     
     @app.errorhandler(404)
     def not_found(error):
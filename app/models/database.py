@@ -5,13 +5,113 @@ Handles SQL Server connection and database operations
 import pytds
 import logging
 import hashlib
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import json
+import base64
+import time
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Callable, List, Dict, Optional, Iterator, Union
+from .pool import get_pool, ConnectionPool
+from .migrations import MigrationRunner
+from .records import Report, User, Department, Equipment, HazardType, ImmediateAction, LookupBundle
+from .directory import user_directory
+from ..utils.cache import lookup_cache
+from ..utils.search import report_index, tokenize
 
 logger = logging.getLogger(__name__)
 
+# Serialises search index loads across request threads, and the background full rebuild
+_search_index_lock = threading.Lock()
+_search_rebuild_thread = None
+_search_rebuild_guard = threading.Lock()
+
+# Read routing state shared by every NearMissDatabase instance:
+# replica dsn -> monotonic time it may be retried after a failure, and the per-thread primary pin
+_replica_down_until = {}
+_replica_turn = itertools.count()
+_read_routing = threading.local()
+
+def set_primary_reads(enabled: bool):
+    """Send this thread's read-only queries to the primary (read-your-writes for one request)"""
+    _read_routing.primary = enabled
+
+def primary_reads_enabled() -> bool:
+    return getattr(_read_routing, 'primary', False)
+
+# Lookup change versions last read from lookup_versions (table -> version), when, and whether a
+# read has succeeded yet; shared by every NearMissDatabase in the process so other processes'
+# writes clear this process's cache
+_lookup_versions = {}
+_lookup_versions_checked_at = 0.0
+_lookup_versions_synced = False
+_lookup_versions_lock = threading.Lock()
+
+# Worker threads for NearMissDatabase.load_parallel, created on first use
+_loader_executor = None
+_loader_executor_lock = threading.Lock()
+
+def _get_loader_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _loader_executor
+    if _loader_executor is None:
+        with _loader_executor_lock:
+            if _loader_executor is None:
+                _loader_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db-loader')
+    return _loader_executor
+
+def encode_report_cursor(created_date: datetime, report_id: int) -> str:
+    """Encode a report's keyset position as an opaque URL-safe token"""
+    raw = json.dumps([created_date.isoformat(), report_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_report_cursor(token: str) -> tuple:
+    """Decode a token from encode_report_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created, report_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created), int(report_id)
+    except Exception:
+        raise ValueError("Invalid page cursor")
+
+def encode_search_cursor(position: int) -> str:
+    """Encode a position in a ranked search result as an opaque URL-safe token"""
+    raw = json.dumps({'rank': position}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_search_cursor(token: str) -> int:
+    """Decode a token from encode_search_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = int(json.loads(base64.urlsafe_b64decode(padded.encode()))['rank'])
+    except Exception:
+        raise ValueError("Invalid page cursor")
+    if position < 0:
+        raise ValueError("Invalid page cursor")
+    return position
+
 class NearMissDatabase:
-    def __init__(self):
+    # Seconds each lookup table stays cached; writes invalidate explicitly
+    LOOKUP_CACHE_TTL = {
+        'users': 300,
+        'departments': 3600,
+        'equipment': 3600,
+        'hazard_types': 3600,
+        'immediate_actions': 3600
+    }
+    
+    # Seconds between checks of lookup_versions for writes made by other processes
+    # (cleanup_data.py, import_excel_data.py, other web workers)
+    LOOKUP_VERSION_CHECK_SECONDS = 15
+    
+    # Read replicas as connection_params overrides, e.g. [{'dsn': '192.168.10.71'}].
+    # Empty means every query goes to the primary.
+    READ_REPLICAS = []
+    # Seconds a replica is skipped after a failed checkout; seconds a writer's reads stay on the primary
+    REPLICA_RETRY_SECONDS = 30
+    READ_YOUR_WRITES_SECONDS = 30
+    
+    def __init__(self, pool_params: Dict = None, read_replicas: List[Dict] = None):
         self.connection_params = {
             'dsn': '192.168.10.70',
             'port': 1433,
@@ -21,16 +121,70 @@ class NearMissDatabase:
             'autocommit': True,
             'timeout': 10
         }
+        self.pool_params = {
+            'min_size': 2,
+            'max_size': 20,
+            'checkout_timeout': 10,
+            'idle_timeout': 300,
+            'max_lifetime': 1800,
+            'validate': True
+        }
+        if pool_params:
+            self.pool_params.update(pool_params)
+        self.replica_params = [dict(self.connection_params, **replica)
+                               for replica in (self.READ_REPLICAS if read_replicas is None else read_replicas)]
     
-    def get_connection(self):
-        """Get database connection"""
+    @property
+    def pool(self) -> ConnectionPool:
+        """Shared connection pool for this server/database"""
+        return get_pool(self.connection_params, **self.pool_params)
+    
+    def get_connection(self, readonly: bool = False):
+        """
+        Get pooled database connection (close() returns it to the pool).
+        readonly=True may be served by a read replica; writes always use the primary.
+        """
+        if readonly and self.replica_params and not primary_reads_enabled():
+            conn = self._replica_connection()
+            if conn is not None:
+                return conn
+        
         try:
-            conn = pytds.connect(**self.connection_params)
+            conn = self.pool.acquire()
             return conn
         except Exception as e:
             logger.error(f"Database connection error: {e}")
             raise
     
+    def _replica_connection(self):
+        """Connection from the next healthy replica (round robin), or None to fall back to the primary"""
+        start = next(_replica_turn)
+        for offset in range(len(self.replica_params)):
+            params = self.replica_params[(start + offset) % len(self.replica_params)]
+            dsn = params['dsn']
+            if _replica_down_until.get(dsn, 0) > time.monotonic():
+                continue
+            try:
+                return get_pool(params, **self.pool_params).acquire()
+            except Exception as e:
+                _replica_down_until[dsn] = time.monotonic() + self.REPLICA_RETRY_SECONDS
+                logger.warning(f"Read replica {dsn} unavailable, skipping for {self.REPLICA_RETRY_SECONDS}s: {e}")
+        return None
+    
+    def replica_status(self) -> List[Dict]:
+        """Health and pool stats for each configured read replica"""
+        status = []
+        now = time.monotonic()
+        for params in self.replica_params:
+            down_for = _replica_down_until.get(params['dsn'], 0) - now
+            status.append({
+                'dsn': params['dsn'],
+                'healthy': down_for <= 0,
+                'retry_in': round(down_for) if down_for > 0 else 0,
+                'pool': get_pool(params, **self.pool_params).stats()
+            })
+        return status
+    
     def create_database(self):
         """Create NEARMISS database if it doesn't exist"""
         conn_params = self.connection_params.copy()
@@ -226,6 +380,132 @@ class NearMissDatabase:
         finally:
             conn.close()
     
+    def apply_migrations(self) -> List[int]:
+        """Apply pending versioned schema migrations (indexes etc.) on top of create_tables"""
+        return MigrationRunner(self).run()
+    
+    # Reference tables the seeding API can merge into:
+    # table -> (column name -> temp table type, key columns used to match existing rows)
+    REFERENCE_TABLES = {
+        'departments': ({'plant': 'NVARCHAR(20)', 'dept_name': 'NVARCHAR(100)'}, ('plant', 'dept_name')),
+        'equipment': ({'plant': 'NVARCHAR(20)', 'dept_id': 'INT', 'equip_name': 'NVARCHAR(100)'},
+                      ('plant', 'dept_id', 'equip_name')),
+        'hazard_types': ({'hazard_type': 'NVARCHAR(100)'}, ('hazard_type',)),
+        'immediate_actions': ({'action_description': 'NVARCHAR(200)'}, ('action_description',))
+    }
+    
+    # Stay well under SQL Server's 2100 parameters per batch
+    MAX_BATCH_PARAMS = 2000
+    
+    def _merge_rows(self, cursor, table: str, columns: Dict[str, str], rows: List[tuple],
+                    key_columns: tuple) -> int:
+        """
+        Upsert rows into table with a single MERGE.
+        Rows are staged in a #temp table with multi-row INSERTs (a single round trip when
+        they fit in the parameter limit), then merged on key_columns: missing keys are inserted and
+        any non-key columns are updated where they differ. Returns rows inserted/updated.
+        """
+        names = list(columns)
+        staging = f"#seed_{table}"
+        
+        # Last occurrence wins when the input repeats a key
+        by_key = {}
+        for row in rows:
+            by_key[tuple(row[names.index(column)] for column in key_columns)] = tuple(row)
+        rows = list(by_key.values())
+        if not rows:
+            return 0
+        
+        value_columns = [column for column in names if column not in key_columns]
+        on_clause = ' AND '.join(f"t.{column} = s.{column}" for column in key_columns)
+        merge = f"""
+            MERGE {table} WITH (HOLDLOCK) AS t
+            USING {staging} AS s
+            ON {on_clause}
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT ({', '.join(names)}) VALUES ({', '.join(f"s.{column}" for column in names)})
+        """
+        if value_columns:
+            merge += f"""
+            WHEN MATCHED AND ({' OR '.join(f"t.{column} <> s.{column}" for column in value_columns)}) THEN
+                UPDATE SET {', '.join(f"{column} = s.{column}" for column in value_columns)}
+            """
+        
+        create = f"""
+            SET NOCOUNT ON;
+            IF OBJECT_ID('tempdb..{staging}') IS NOT NULL DROP TABLE {staging};
+            CREATE TABLE {staging} ({', '.join(f"{name} {type_}" for name, type_ in columns.items())});
+        """
+        finish = f"""
+            {merge};
+            SELECT @@ROWCOUNT;
+            DROP TABLE {staging};
+        """
+        row_placeholder = '(' + ', '.join(['%s'] * len(names)) + ')'
+        chunk_size = max(1, min(1000, self.MAX_BATCH_PARAMS // len(names)))
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        
+        if len(chunks) > 1:
+            # Parameterised batches run via sp_executesql, and a #temp table created inside one
+            # is dropped when it returns; create it in a plain batch so it lives for the session
+            cursor.execute(create)
+            create = ""
+        
+        changed = 0
+        for position, chunk in enumerate(chunks):
+            batch = create if position == 0 else "SET NOCOUNT ON;"
+            batch += f"INSERT INTO {staging} ({', '.join(names)}) VALUES {', '.join([row_placeholder] * len(chunk))};"
+            if position == len(chunks) - 1:
+                batch += finish
+            cursor.execute(batch, [value for row in chunk for value in row])
+            if position == len(chunks) - 1:
+                changed = cursor.fetchone()[0]
+        
+        return changed
+    
+    def seed_reference_data(self, departments: List[tuple] = None, equipment: List[tuple] = None,
+                            hazard_types: List[str] = None, immediate_actions: List[str] = None) -> Dict[str, int]:
+        """
+        Set-based seeding/upsert of dropdown reference data.
+        departments: (plant, dept_name); equipment: (plant, dept_id, equip_name);
+        hazard_types / immediate_actions: plain strings.
+        Each table is applied with one MERGE and everything commits in one transaction.
+        Returns rows changed per table.
+        """
+        inputs = {
+            'departments': departments,
+            'equipment': equipment,
+            'hazard_types': [(value,) for value in hazard_types] if hazard_types else None,
+            'immediate_actions': [(value,) for value in immediate_actions] if immediate_actions else None
+        }
+        changed = {}
+        
+        conn = self.get_connection()
+        try:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            
+            for table, rows in inputs.items():
+                if rows:
+                    columns, key_columns = self.REFERENCE_TABLES[table]
+                    changed[table] = self._merge_rows(cursor, table, columns, rows, key_columns)
+            
+            conn.commit()
+            logger.info(f"Reference data seeded: {changed}")
+            
+        except Exception as e:
+            logger.error(f"Error seeding reference data: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+        
+        self.invalidate_lookup_tables([table for table, count in changed.items() if count])
+        return changed
+    
     def insert_initial_data(self):
         """Insert initial data including default admin user and dropdown data"""
         conn = self.get_connection()
@@ -240,87 +520,72 @@ class NearMissDatabase:
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
             """, ("Caleb", "Kull", "ckull", "ckull@fresco.com", "Red Oak", 1, password_hash))
             
-            # Insert departments for both plants
-            departments = [
-                ("Red Oak", "Press"),
-                ("Red Oak", "Make Ready"),
-                ("Red Oak", "Ink Room"),
-                ("Red Oak", "Slit/Pack"),
-                ("Red Oak", "Warehouse"),
-                ("Red Oak", "Maintenance"),
-                ("Telford", "Press"),
-                ("Telford", "Make Ready"),
-                ("Telford", "Ink Room"),
-                ("Telford", "Slit/Pack"),
-                ("Telford", "Warehouse"),
-                ("Telford", "Maintenance")
-            ]
-            
-            for plant, dept_name in departments:
-                cursor.execute("""
-                    IF NOT EXISTS (SELECT 1 FROM departments WHERE plant = %s AND dept_name = %s)
-                    INSERT INTO departments (plant, dept_name) VALUES (%s, %s)
-                """, (plant, dept_name, plant, dept_name))
-            
-            # Insert hazard types
-            hazard_types = [
-                "Slip / trip / fall",
-                "Fall from height",
-                "Struck by (object, vehicle, equipment, load)",
-                "Struck against (stationary object, equipment, etc.)",
-                "Caught in / between",
-                "Pinch point",
-                "Cuts / lacerations",
-                "Chemical exposure",
-                "Heat / burn",
-                "Electrical",
-                "Fire / explosion",
-                "Machinery / equipment malfunction",
-                "Lifting / ergonomic",
-                "Respiratory / inhalation",
-                "Eye injury",
-                "Noise exposure",
-                "Environmental"
-            ]
-            
-            for hazard_type in hazard_types:
-                cursor.execute("""
-                    IF NOT EXISTS (SELECT 1 FROM hazard_types WHERE hazard_type = %s)
-                    INSERT INTO hazard_types (hazard_type) VALUES (%s)
-                """, (hazard_type, hazard_type))
-            
-            # Insert immediate actions
-            immediate_actions = [
-                "Hazard corrected / removed immediately",
-                "Area cleaned or debris removed",
-                "Area isolated / barricaded / tagged off",
-                "Equipment shut down / locked out",
-                "Reported to supervisor or line owner",
-                "Reported to safety",
-                "PPE provided",
-                "Training provided",
-                "Procedure reviewed / updated",
-                "Warning signs posted",
-                "Temporary repairs made",
-                "Work order submitted",
-                "Incident documented",
-                "Other personnel notified",
-                "No immediate action taken"
-            ]
-            
-            for action in immediate_actions:
-                cursor.execute("""
-                    IF NOT EXISTS (SELECT 1 FROM immediate_actions WHERE action_description = %s)
-                    INSERT INTO immediate_actions (action_description) VALUES (%s)
-                """, (action, action))
-            
-            logger.info("Initial data inserted successfully")
-            
         except Exception as e:
             logger.error(f"Error inserting initial data: {e}")
             raise
         finally:
             conn.close()
+        
+        # Departments for both plants
+        departments = [
+            ("Red Oak", "Press"),
+            ("Red Oak", "Make Ready"),
+            ("Red Oak", "Ink Room"),
+            ("Red Oak", "Slit/Pack"),
+            ("Red Oak", "Warehouse"),
+            ("Red Oak", "Maintenance"),
+            ("Telford", "Press"),
+            ("Telford", "Make Ready"),
+            ("Telford", "Ink Room"),
+            ("Telford", "Slit/Pack"),
+            ("Telford", "Warehouse"),
+            ("Telford", "Maintenance")
+        ]
+        
+        # Hazard types
+        hazard_types = [
+            "Slip / trip / fall",
+            "Fall from height",
+            "Struck by (object, vehicle, equipment, load)",
+            "Struck against (stationary object, equipment, etc.)",
+            "Caught in / between",
+            "Pinch point",
+            "Cuts / lacerations",
+            "Chemical exposure",
+            "Heat / burn",
+            "Electrical",
+            "Fire / explosion",
+            "Machinery / equipment malfunction",
+            "Lifting / ergonomic",
+            "Respiratory / inhalation",
+            "Eye injury",
+            "Noise exposure",
+            "Environmental"
+        ]
+        
+        # Immediate actions
+        immediate_actions = [
+            "Hazard corrected / removed immediately",
+            "Area cleaned or debris removed",
+            "Area isolated / barricaded / tagged off",
+            "Equipment shut down / locked out",
+            "Reported to supervisor or line owner",
+            "Reported to safety",
+            "PPE provided",
+            "Training provided",
+            "Procedure reviewed / updated",
+            "Warning signs posted",
+            "Temporary repairs made",
+            "Work order submitted",
+            "Incident documented",
+            "Other personnel notified",
+            "No immediate action taken"
+        ]
+        
+        # One MERGE per table instead of a round trip per row
+        self.seed_reference_data(departments=departments, hazard_types=hazard_types,
+                                 immediate_actions=immediate_actions)
+        logger.info("Initial data inserted successfully")
     
     def hash_password(self, password: str) -> str:
         """Hash a password using SHA256"""
@@ -361,275 +626,1492 @@ class NearMissDatabase:
         finally:
             conn.close()
     
-    def get_all_users(self, plant: str = None) -> List[Dict]:
-        """Get all users, optionally filtered by plant"""
+    # Threads shared by all load_parallel calls; keep well under the pool's max_size
+    PARALLEL_LOAD_WORKERS = 8
+    
+    def load_parallel(self, **loaders: Union[Callable, tuple]) -> Dict[str, Any]:
+        """
+        Run independent read methods at the same time, each on its own pooled connection.
+        Each keyword is a callable or a (callable, *args) tuple; returns {keyword: result}, e.g.
+        db.load_parallel(stats=(db.get_dashboard_stats, plant), recent=db.get_near_miss_reports)
+        The first loader runs on the calling thread. Exceptions from a loader are re-raised.
+        For lookup tables prefer load_lookups, which reads them all in one round trip;
+        this is for reads that can't share a batch.
+        """
+        calls = []
+        for name, loader in loaders.items():
+            func, *args = loader if isinstance(loader, tuple) else (loader,)
+            calls.append((name, func, args))
+        if not calls:
+            return {}
+        
+        executor = _get_loader_executor(self.PARALLEL_LOAD_WORKERS)
+        futures = [(name, executor.submit(func, *args)) for name, func, args in calls[1:]]
+        
+        name, func, args = calls[0]
+        results = {name: func(*args)}
+        for name, future in futures:
+            results[name] = future.result()
+        return results
+    
+    # Lookup tables: (SELECT ... WHERE 1=1, plant column or None, ORDER BY, record type)
+    LOOKUP_QUERIES = {
+        'users': ("""
+            SELECT user_id, first_name, last_name, username, email, plant, is_admin, is_supervisor
+            FROM users WHERE 1=1
+        """, 'plant', 'last_name, first_name', User),
+        'departments': ("SELECT dept_id, plant, dept_name FROM departments WHERE 1=1",
+                        'plant', 'dept_name', Department),
+        'equipment': ("""
+            SELECT e.equip_id, e.plant, e.dept_id, e.equip_name, d.dept_name
+            FROM equipment e
+            JOIN departments d ON e.dept_id = d.dept_id
+            WHERE 1=1
+        """, 'e.plant', 'e.equip_name', Equipment),
+        'hazard_types': ("SELECT hazard_type_id, hazard_type FROM hazard_types WHERE 1=1",
+                         None, 'hazard_type', HazardType),
+        'immediate_actions': ("SELECT action_id, action_description FROM immediate_actions WHERE 1=1",
+                              None, 'action_description', ImmediateAction)
+    }
+    
+    def _lookup_query(self, table: str, plant: str = None, dept_id: int = None) -> tuple:
+        """(cache key, query, params) for one lookup table; plant is ignored for unscoped tables"""
+        query, plant_column, order_by, _ = self.LOOKUP_QUERIES[table]
+        cache_key = (table,)
+        params = []
+        
+        if plant_column:
+            cache_key += (plant or None,)
+            if plant:
+                query += f" AND {plant_column} = %s"
+                params.append(plant)
+        
+        if table == 'equipment':
+            cache_key += (dept_id or None,)
+            if dept_id:
+                query += " AND e.dept_id = %s"
+                params.append(dept_id)
+        
+        return cache_key, query + f" ORDER BY {order_by}", params
+    
+    def _get_lookup(self, table: str, plant: str = None, dept_id: int = None) -> list:
+        """
+        Read one lookup table through the cache.
+        Always reads the primary: a reload from a lagging replica would pin stale rows for the whole TTL.
+        """
+        self._sync_lookup_versions()
+        cache_key, query, params = self._lookup_query(table, plant, dept_id)
+        cached = lookup_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            query = """
-                SELECT user_id, first_name, last_name, username, email, plant, is_admin, is_supervisor
-                FROM users
-            """
-            params = []
-            
-            if plant:
-                query += " WHERE plant = %s"
-                params.append(plant)
-            
-            query += " ORDER BY last_name, first_name"
-            
+            cursor.query_name = f"lookup:{table}"
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            users = []
-            for row in rows:
-                users.append({
-                    'user_id': row[0],
-                    'first_name': row[1],
-                    'last_name': row[2],
-                    'username': row[3],
-                    'email': row[4],
-                    'plant': row[5],
-                    'is_admin': row[6],
-                    'is_supervisor': row[7]
-                })
-            
-            return users
+            record_type = self.LOOKUP_QUERIES[table][3]
+            records = [record_type.from_row(row) for row in cursor.fetchall()]
+            lookup_cache.set(cache_key, records, self.LOOKUP_CACHE_TTL[table])
+            return records
             
         except Exception as e:
-            logger.error(f"Error getting users: {e}")
+            logger.error(f"Error getting {table.replace('_', ' ')}: {e}")
             return []
         finally:
             conn.close()
     
-    def get_departments(self, plant: str = None) -> List[Dict]:
+    def get_all_users(self, plant: str = None) -> List[User]:
+        """Get all users, optionally filtered by plant"""
+        return self._get_lookup('users', plant)
+    
+    def get_departments(self, plant: str = None) -> List[Department]:
         """Get departments, optionally filtered by plant"""
+        return self._get_lookup('departments', plant)
+    
+    def get_equipment(self, plant: str = None, dept_id: int = None) -> List[Equipment]:
+        """Get equipment, optionally filtered by plant and department"""
+        return self._get_lookup('equipment', plant, dept_id)
+    
+    def get_hazard_types(self) -> List[HazardType]:
+        """Get all hazard types"""
+        return self._get_lookup('hazard_types')
+    
+    def get_immediate_actions(self) -> List[ImmediateAction]:
+        """Get all immediate actions"""
+        return self._get_lookup('immediate_actions')
+    
+    def load_lookups(self, *tables: str, plant: str = None) -> LookupBundle:
+        """
+        Load several lookup tables for one page in a single round trip.
+        Cached tables are served from the cache; the rest run as one batch with one
+        result set per table, read in order with nextset(). plant scopes users,
+        departments and equipment. Tables not asked for are None in the bundle;
+        a table that fails to load comes back as an empty list.
+        """
+        self._sync_lookup_versions()
+        results = {}
+        pending = []
+        for table in tables:
+            cache_key, query, params = self._lookup_query(table, plant)
+            cached = lookup_cache.get(cache_key)
+            if cached is not None:
+                results[table] = cached
+            else:
+                pending.append((table, cache_key, query, params))
+        
+        if pending:
+            conn = self.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(";\n".join(query for _, _, query, _ in pending),
+                               [param for _, _, _, params in pending for param in params])
+                
+                for position, (table, cache_key, _, _) in enumerate(pending):
+                    if position and not cursor.nextset():
+                        raise RuntimeError(f"Batch ended before the {table} result set")
+                    record_type = self.LOOKUP_QUERIES[table][3]
+                    records = [record_type.from_row(row) for row in cursor.fetchall()]
+                    lookup_cache.set(cache_key, records, self.LOOKUP_CACHE_TTL[table])
+                    results[table] = records
+                    
+            except Exception as e:
+                logger.error(f"Error loading lookups {[table for table, _, _, _ in pending]}: {e}")
+                # Unread result sets may still be on the wire
+                conn.invalidate()
+                for table, _, _, _ in pending:
+                    results.setdefault(table, [])
+            finally:
+                conn.close()
+        
+        return LookupBundle(**results)
+    
+    # Insertable near_miss_reports columns, in the order _report_values returns them
+    REPORT_INSERT_COLUMNS = (
+        'date_occurred', 'time_occurred', 'employee_id', 'plant', 'dept_id',
+        'equipment_area', 'hazard_assessment', 'hazard_type_id',
+        'custom_hazard_type', 'description', 'immediate_action_id',
+        'corrective_action', 'responsible_party_id', 'corrective_action_completed',
+        'completion_date', 'completed_by_id', 'created_by_id'
+    )
+    
+    # Bulk ingest limits; a chunk's parameters must stay under SQL Server's 2100 cap
+    MAX_BULK_REPORTS = 500
+    BULK_CHUNK_SIZE = 100
+    
+    # Dashboard rollup (report_stats_daily, migration 5). A stats source is any SELECT yielding
+    # (created_date, plant, dept_id, hazard_type_id, hazard_assessment, report_delta, open_delta).
+    REPORT_STATS_SOURCE = """
+        SELECT r.created_date, r.plant, r.dept_id, r.hazard_type_id, r.hazard_assessment,
+               1, CASE WHEN r.corrective_action_completed = 1 THEN 0 ELSE 1 END
+        FROM near_miss_reports r
+    """
+    HIGH_PRIORITY_ASSESSMENT = 'High/Immediate'
+    DASHBOARD_MONTHS = 12
+    
+    def _report_stats_merge(self, source: str) -> str:
+        """SQL that adds the deltas from source into report_stats_daily (run inside the writing transaction)"""
+        keys = """
+            CAST(d.created_date AS DATE), d.plant, ISNULL(d.dept_id, 0), ISNULL(d.hazard_type_id, 0),
+            ISNULL(d.hazard_assessment, '')
+        """
+        return f"""
+            MERGE report_stats_daily WITH (HOLDLOCK) AS t
+            USING (
+                SELECT {keys}, SUM(d.report_delta), SUM(d.open_delta)
+                FROM ({source}) AS d (created_date, plant, dept_id, hazard_type_id, hazard_assessment,
+                                      report_delta, open_delta)
+                GROUP BY {keys}
+            ) AS s (stat_date, plant, dept_id, hazard_type_id, hazard_assessment, report_delta, open_delta)
+            ON t.stat_date = s.stat_date AND t.plant = s.plant AND t.dept_id = s.dept_id
+               AND t.hazard_type_id = s.hazard_type_id AND t.hazard_assessment = s.hazard_assessment
+            WHEN MATCHED THEN
+                UPDATE SET report_count = t.report_count + s.report_delta,
+                           open_count = t.open_count + s.open_delta
+            WHEN NOT MATCHED THEN
+                INSERT (stat_date, plant, dept_id, hazard_type_id, hazard_assessment, report_count, open_count)
+                VALUES (s.stat_date, s.plant, s.dept_id, s.hazard_type_id, s.hazard_assessment,
+                        s.report_delta, s.open_delta);
+        """
+    
+    def _report_values(self, data: Dict, created_by_id: int) -> tuple:
+        """Map submitted report fields to REPORT_INSERT_COLUMNS values"""
+        # Convert checkbox value (or JSON boolean) to bit
+        corrective_completed = 1 if data.get('corrective_action_completed') in ('on', True, 1, '1') else 0
+        
+        return (
+            data.get('date_occurred'),
+            data.get('time_occurred'),
+            data.get('employee_id'),
+            data.get('plant'),
+            data.get('dept_id') if data.get('dept_id') else None,
+            data.get('equipment_area'),
+            data.get('hazard_assessment'),
+            data.get('hazard_type_id') if data.get('hazard_type_id') else None,
+            data.get('custom_hazard_type'),
+            data.get('description'),
+            data.get('immediate_action_id') if data.get('immediate_action_id') else None,
+            data.get('corrective_action'),
+            data.get('responsible_party_id') if data.get('responsible_party_id') else None,
+            corrective_completed,
+            data.get('completion_date') if data.get('completion_date') else None,
+            data.get('completed_by_id') if data.get('completed_by_id') else None,
+            created_by_id
+        )
+    
+    def create_near_miss_report(self, data: Dict, created_by_id: int) -> Optional[Report]:
+        """
+        Create a new near miss report.
+        Returns the stored report (same shape as get_near_miss_reports rows, with names
+        already resolved) from the same round trip as the insert, or None on failure.
+        """
+        names = self._report_names()
+        
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            query = "SELECT dept_id, plant, dept_name FROM departments"
-            params = []
             
-            if plant:
-                query += " WHERE plant = %s"
-                params.append(plant)
+            stats_merge = self._report_stats_merge(
+                self.REPORT_STATS_SOURCE + " WHERE r.report_id IN (SELECT report_id FROM @new)"
+            )
+            
+            # OUTPUT INTO a table variable, count it in the dashboard rollup in the same
+            # transaction, then read the row back in the same batch
+            cursor.execute(f"""
+                SET NOCOUNT ON;
+                SET XACT_ABORT ON;
+                DECLARE @new TABLE (report_id INT);
+                
+                BEGIN TRANSACTION;
+                INSERT INTO near_miss_reports ({', '.join(self.REPORT_INSERT_COLUMNS)})
+                OUTPUT INSERTED.report_id INTO @new
+                VALUES ({', '.join(['%s'] * len(self.REPORT_INSERT_COLUMNS))});
                 
-            query += " ORDER BY dept_name"
+                {stats_merge}
+                COMMIT TRANSACTION;
+                
+                {self._report_select()} AND r.report_id = (SELECT report_id FROM @new);
+            """, self._report_values(data, created_by_id))
+            row = cursor.fetchone()
             
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
+            if not row:
+                logger.error(f"Near miss report insert by user {created_by_id} returned no row")
+                return None
+            
+            report = self._row_to_report(row, names)
+            
+            # Let the next search pick the new report up incrementally
+            report_index.last_refresh = 0.0
             
-            return [{'dept_id': row[0], 'plant': row[1], 'dept_name': row[2]} for row in rows]
+            logger.info(f"Near miss report {report['report_id']} created successfully by user {created_by_id}")
+            return report
             
         except Exception as e:
-            logger.error(f"Error getting departments: {e}")
-            return []
+            logger.error(f"Error creating near miss report: {e}")
+            return None
         finally:
             conn.close()
     
-    def get_equipment(self, plant: str = None, dept_id: int = None) -> List[Dict]:
-        """Get equipment, optionally filtered by plant and department"""
+    def create_near_miss_reports_bulk(self, items: List[Dict], created_by_id: int) -> List[Dict]:
+        """
+        Insert many reports in one transaction, skipping ones already submitted.
+        Each item needs a client_key (idempotency key); a retried item whose key already
+        exists (on a live or archived report) comes back as 'duplicate' with the original
+        report_id instead of a second row.
+        Returns one {index, client_key, report_id, status, error} dict per item, in order.
+        Raises on database errors (nothing is committed).
+        """
+        required = ('client_key', 'date_occurred', 'time_occurred', 'employee_id', 'plant', 'description')
+        results = []
+        first_by_key = {}
+        pending = []
+        
+        for index, item in enumerate(items):
+            result = {'index': index, 'client_key': None, 'report_id': None, 'status': None, 'error': None}
+            results.append(result)
+            
+            if not isinstance(item, dict):
+                result.update(status='invalid', error='Item must be an object')
+                continue
+            
+            client_key = str(item.get('client_key') or '').strip()
+            result['client_key'] = client_key or None
+            missing = [field for field in required if not item.get(field)]
+            if missing:
+                result.update(status='invalid', error=f"Missing required fields: {', '.join(missing)}")
+            elif len(client_key) > 64:
+                result.update(status='invalid', error='client_key longer than 64 characters')
+            elif client_key in first_by_key:
+                # Same key twice in one request: resolved from the first occurrence below
+                result['status'] = 'duplicate'
+            else:
+                first_by_key[client_key] = index
+                pending.append((index, client_key, self._report_values(item, created_by_id)))
+        
+        if not pending:
+            return results
+        
+        columns = ', '.join(self.REPORT_INSERT_COLUMNS)
+        incoming_columns = ', '.join(f"i.{column}" for column in self.REPORT_INSERT_COLUMNS)
+        row_placeholder = '(' + ', '.join(['%s'] * (len(self.REPORT_INSERT_COLUMNS) + 2)) + ')'
+        stats_filter = " WHERE r.report_id IN (SELECT report_id FROM @inserted)"
+        
         conn = self.get_connection()
         try:
+            conn.autocommit = False
             cursor = conn.cursor()
-            query = """
-                SELECT e.equip_id, e.plant, e.dept_id, e.equip_name, d.dept_name
-                FROM equipment e
-                JOIN departments d ON e.dept_id = d.dept_id
-                WHERE 1=1
-            """
-            params = []
             
-            if plant:
-                query += " AND e.plant = %s"
-                params.append(plant)
+            for start in range(0, len(pending), self.BULK_CHUNK_SIZE):
+                chunk = pending[start:start + self.BULK_CHUNK_SIZE]
+                params = []
+                for index, client_key, values in chunk:
+                    params.extend((index, client_key) + values)
                 
-            if dept_id:
-                query += " AND e.dept_id = %s"
-                params.append(dept_id)
+                # One round trip per chunk: stage rows, insert the new keys, report outcome per item.
+                # UPDLOCK/HOLDLOCK on the unique client_key index stops concurrent retries racing.
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    DECLARE @incoming TABLE (
+                        item_no INT PRIMARY KEY,
+                        client_key NVARCHAR(64) NOT NULL,
+                        date_occurred DATE, time_occurred TIME, employee_id INT, plant NVARCHAR(20),
+                        dept_id INT, equipment_area NVARCHAR(100), hazard_assessment NVARCHAR(20),
+                        hazard_type_id INT, custom_hazard_type NVARCHAR(100), description NVARCHAR(400),
+                        immediate_action_id INT, corrective_action NVARCHAR(MAX), responsible_party_id INT,
+                        corrective_action_completed BIT, completion_date DATE, completed_by_id INT,
+                        created_by_id INT
+                    );
+                    DECLARE @inserted TABLE (report_id INT, client_key NVARCHAR(64));
+                    
+                    INSERT INTO @incoming (item_no, client_key, {columns})
+                    VALUES {', '.join([row_placeholder] * len(chunk))};
+                    
+                    INSERT INTO near_miss_reports ({columns}, client_key)
+                    OUTPUT INSERTED.report_id, INSERTED.client_key INTO @inserted
+                    SELECT {incoming_columns}, i.client_key
+                    FROM @incoming i
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM near_miss_reports r WITH (UPDLOCK, HOLDLOCK)
+                        WHERE r.client_key = i.client_key
+                    ) AND NOT EXISTS (
+                        -- Keys stay taken after their report is archived
+                        SELECT 1 FROM near_miss_reports_archive a WITH (UPDLOCK, HOLDLOCK)
+                        WHERE a.client_key = i.client_key
+                    );
+                    
+                    {self._report_stats_merge(self.REPORT_STATS_SOURCE + stats_filter)}
+                    
+                    SELECT i.item_no, r.report_id,
+                           CASE WHEN ins.report_id IS NULL THEN 'duplicate' ELSE 'created' END
+                    FROM @incoming i
+                    JOIN (SELECT report_id, client_key FROM near_miss_reports
+                          UNION ALL
+                          SELECT report_id, client_key FROM near_miss_reports_archive) r
+                        ON r.client_key = i.client_key
+                    LEFT JOIN @inserted ins ON ins.report_id = r.report_id;
+                """, params)
                 
-            query += " ORDER BY e.equip_name"
+                for item_no, report_id, status in cursor.fetchall():
+                    results[item_no].update(report_id=report_id, status=status)
             
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
+            conn.commit()
             
-            return [{
-                'equip_id': row[0], 
-                'plant': row[1], 
-                'dept_id': row[2], 
-                'equip_name': row[3],
-                'dept_name': row[4]
-            } for row in rows]
+        except Exception as e:
+            logger.error(f"Error in bulk report insert: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+        
+        # Repeated keys within the request share the first occurrence's report_id
+        for result in results:
+            if result['status'] == 'duplicate' and result['report_id'] is None:
+                result['report_id'] = results[first_by_key[result['client_key']]]['report_id']
+        
+        created = sum(1 for result in results if result['status'] == 'created')
+        if created:
+            report_index.last_refresh = 0.0
+        logger.info(f"Bulk insert by user {created_by_id}: {created} created, "
+                    f"{len(results) - created} duplicate/invalid")
+        return results
+    
+    # Narrow select shared by every report listing: one report table, no joins.
+    # User, department, hazard type and action names are resolved in _row_to_report.
+    # Use _report_select() to fill in {top} and {source}.
+    REPORT_SELECT = """
+        SELECT {top}
+            r.report_id, r.date_occurred, r.time_occurred, r.plant, r.employee_id,
+            r.dept_id, r.equipment_area, r.hazard_assessment, r.hazard_type_id,
+            r.custom_hazard_type, r.description, r.immediate_action_id, r.corrective_action,
+            r.responsible_party_id, r.corrective_action_completed, r.completion_date,
+            r.completed_by_id, r.created_by_id, r.created_date, r.row_version
+        FROM {source} r
+        WHERE 1=1
+    """
+    
+    # Hot and archived reports together (migration 7), for searches that reach past ARCHIVE_AFTER_DAYS
+    REPORT_ARCHIVE_SOURCE = """(
+        SELECT report_id, date_occurred, time_occurred, plant, employee_id, dept_id, equipment_area,
+               hazard_assessment, hazard_type_id, custom_hazard_type, description, immediate_action_id,
+               CAST(corrective_action AS NVARCHAR(MAX)) AS corrective_action, responsible_party_id,
+               corrective_action_completed, completion_date, completed_by_id, created_by_id, created_date,
+               CAST(row_version AS BINARY(8)) AS row_version
+        FROM near_miss_reports
+        UNION ALL
+        SELECT report_id, date_occurred, time_occurred, plant, employee_id, dept_id, equipment_area,
+               hazard_assessment, hazard_type_id, custom_hazard_type, description, immediate_action_id,
+               corrective_action, responsible_party_id,
+               corrective_action_completed, completion_date, completed_by_id, created_by_id, created_date,
+               row_version
+        FROM near_miss_reports_archive
+    )"""
+    
+    # Closed reports submitted longer ago than this are moved to the archive tables
+    ARCHIVE_AFTER_DAYS = 730
+    ARCHIVE_BATCH_SIZE = 500
+    
+    def _report_select(self, top: str = "", archive: bool = False) -> str:
+        """REPORT_SELECT over the hot table, or over hot plus archive"""
+        return self.REPORT_SELECT.format(top=top, source=self.REPORT_ARCHIVE_SOURCE if archive else "near_miss_reports")
+    
+    def _reaches_archive(self, date_from: str = "", date_to: str = "") -> bool:
+        """
+        Whether a date filter asks for reports old enough to have been archived.
+        Archived reports were submitted (so occurred) before the archive cutoff, so a
+        From date on or after it can never match one.
+        """
+        cutoff = datetime.now().date() - timedelta(days=self.ARCHIVE_AFTER_DAYS)
+        for value in (date_from, date_to):
+            if not value:
+                continue
+            try:
+                if datetime.strptime(str(value)[:10], '%Y-%m-%d').date() < cutoff:
+                    return True
+            except ValueError:
+                pass
+        return False
+    
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    
+    # Report search: most matches passed to SQL as an id list (more fall back to a scan so
+    # listings and exports are never cut short), index refresh/rebuild cadence (seconds)
+    SEARCH_RESULT_LIMIT = 2000
+    SEARCH_REFRESH_INTERVAL = 30
+    SEARCH_REBUILD_INTERVAL = 3600
+    FULLTEXT_CHECK_INTERVAL = 600
+    _fulltext = {'available': False, 'checked_at': None}
+    
+    def fulltext_available(self) -> bool:
+        """True when near_miss_reports has a SQL Server full-text index (re-checked every 10 minutes)"""
+        state = NearMissDatabase._fulltext
+        now = time.monotonic()
+        if state['checked_at'] is not None and now - state['checked_at'] < self.FULLTEXT_CHECK_INTERVAL:
+            return state['available']
+        
+        conn = self.get_connection(readonly=True)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*) FROM sys.fulltext_indexes
+                WHERE object_id = OBJECT_ID('near_miss_reports')
+            """)
+            state['available'] = bool(cursor.fetchone()[0])
+        except Exception as e:
+            logger.warning(f"Full-text availability check failed: {e}")
+            state['available'] = False
+        finally:
+            state['checked_at'] = now
+            conn.close()
+        
+        return state['available']
+    
+    def refresh_search_index(self, full: bool = False, wait: bool = True) -> int:
+        """
+        Load reports into the in-process search index.
+        Incremental refreshes read every report whose row_version has moved since the last load,
+        so inserts and edits from any process are picked up, including inserts whose identity
+        values committed out of order. MIN_ACTIVE_ROWVERSION is taken before reading, so a
+        transaction still open during one load is read by the next.
+        Deleted (archived) reports stay in this process's index until the next full rebuild;
+        that is harmless because search matches are re-checked against near_miss_reports.
+        With wait=False, returns at once if another load (e.g. a background rebuild) is running.
+        Returns the number of reports loaded.
+        """
+        if not _search_index_lock.acquire(blocking=wait):
+            return 0
+        try:
+            user_directory.ensure_fresh(self)
+            conn = self.get_connection(readonly=True)
+            try:
+                cursor = conn.cursor()
+                now = time.monotonic()
+                cursor.execute("SELECT MIN_ACTIVE_ROWVERSION()")
+                row = cursor.fetchone()
+                synced_version = row[0] if row else None
+                
+                since = None if full else report_index.synced_version
+                query = "SELECT report_id, description, employee_id FROM near_miss_reports"
+                if since is not None:
+                    query += " WHERE row_version >= %s"
+                cursor.execute(query + " ORDER BY report_id", (since,) if since is not None else None)
+                rows = cursor.fetchall()
+                entries = []
+                for report_id, description, employee_id in rows:
+                    employee = user_directory.get(employee_id)
+                    entries.append((report_id, description,
+                                    employee.first_name if employee else None,
+                                    employee.last_name if employee else None))
+                
+                if full:
+                    report_index.rebuild(entries)
+                    report_index.last_rebuild = now
+                else:
+                    for entry in entries:
+                        report_index.add(*entry)
+                report_index.synced_version = synced_version
+                report_index.last_refresh = now
+                
+                if rows:
+                    logger.debug(f"Search index loaded {len(rows)} reports (full={full})")
+                return len(rows)
+            finally:
+                conn.close()
+        finally:
+            _search_index_lock.release()
+    
+    def start_search_index_rebuild(self) -> bool:
+        """Rebuild the search index on a background thread; False if a rebuild is already running"""
+        global _search_rebuild_thread
+        with _search_rebuild_guard:
+            if _search_rebuild_thread is not None and _search_rebuild_thread.is_alive():
+                return False
+            _search_rebuild_thread = threading.Thread(target=self._rebuild_search_index,
+                                                      name='nearmiss-search-rebuild', daemon=True)
+            _search_rebuild_thread.start()
+            return True
+    
+    def _rebuild_search_index(self):
+        try:
+            self.refresh_search_index(full=True)
+        except Exception as e:
+            logger.error(f"Background search index rebuild failed: {e}")
+    
+    def search_index_lag(self) -> Optional[float]:
+        """
+        Seconds the in-process search index is behind: the age of the oldest report it hasn't
+        loaded yet (0 when current). None when searches use full-text or the index isn't built.
+        """
+        if not report_index.last_rebuild or self.fulltext_available():
+            return None
+        
+        conn = self.get_connection(readonly=True)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DATEDIFF(SECOND, MIN(created_date), GETDATE())
+                FROM near_miss_reports
+                WHERE report_id > %s
+            """, (report_index.high_water,))
+            row = cursor.fetchone()
+            return float(row[0]) if row and row[0] is not None else 0.0
+        except Exception as e:
+            logger.error(f"Error measuring search index lag: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def search_report_ids(self, search_query: str, limit: int = None) -> Optional[List[int]]:
+        """
+        Return every report_id matching every search term (prefix match), best match first.
+        Uses SQL Server full-text when indexed, otherwise the in-process index. The index is
+        (re)built on a background thread, never inside the request that finds it stale.
+        Returns None if neither can be used (including while the index is first being built),
+        or if more than limit reports match, so callers fall back to LIKE and still get the
+        complete result.
+        """
+        limit = limit or self.SEARCH_RESULT_LIMIT
+        terms = list(dict.fromkeys(tokenize(search_query)))[:10]
+        if not terms:
+            return None
+        
+        try:
+            if self.fulltext_available():
+                report_ids = self._fulltext_report_ids(terms, limit + 1)
+            else:
+                now = time.monotonic()
+                if not report_index.last_rebuild:
+                    # Warm-up hasn't built it (yet): scan until the background build is done
+                    self.start_search_index_rebuild()
+                    return None
+                if now - report_index.last_rebuild >= self.SEARCH_REBUILD_INTERVAL:
+                    self.start_search_index_rebuild()
+                if now - report_index.last_refresh >= self.SEARCH_REFRESH_INTERVAL:
+                    # Skipped while the rebuild holds the index; this search uses the current one
+                    self.refresh_search_index(wait=False)
+                report_ids = report_index.search(' '.join(terms), limit + 1)
+            
+            if len(report_ids) > limit:
+                logger.debug(f"Search {search_query!r} matched over {limit} reports, scanning instead")
+                return None
+            return report_ids
             
         except Exception as e:
-            logger.error(f"Error getting equipment: {e}")
-            return []
+            logger.error(f"Error searching reports: {e}")
+            return None
+    
+    def _fulltext_report_ids(self, terms: List[str], limit: int) -> List[int]:
+        """Full-text search: every term must prefix-match the description or employee name"""
+        conn = self.get_connection(readonly=True)
+        try:
+            cursor = conn.cursor()
+            term_filters = []
+            params = [limit, ' OR '.join(f'"{term}*"' for term in terms)]
+            
+            for term in terms:
+                term_filters.append("(CONTAINS(r.description, %s) OR u.first_name LIKE %s OR u.last_name LIKE %s)")
+                params.extend([f'"{term}*"', f"{term}%", f"{term}%"])
+            
+            cursor.execute(f"""
+                SELECT TOP (%s) r.report_id
+                FROM near_miss_reports r
+                LEFT JOIN users u ON r.employee_id = u.user_id
+                LEFT JOIN CONTAINSTABLE(near_miss_reports, description, %s) ft ON ft.[KEY] = r.report_id
+                WHERE {' AND '.join(term_filters)}
+                ORDER BY ISNULL(ft.RANK, 0) DESC, r.created_date DESC
+            """, params)
+            return [row[0] for row in cursor.fetchall()]
         finally:
             conn.close()
     
-    def get_hazard_types(self) -> List[Dict]:
-        """Get all hazard types"""
-        conn = self.get_connection()
+    def _report_filters(self, search_query: str = "", plant_filter: str = "", user_filter: str = "",
+                        date_from: str = "", date_to: str = "", report_ids: List[int] = None,
+                        scan_search: bool = False) -> tuple:
+        """
+        Build the WHERE fragment and params for the report filters.
+        report_ids are the ranked search matches; looked up here when not supplied.
+        scan_search skips the search index: for archive queries (it only holds hot reports),
+        or when the caller already searched and got None.
+        """
+        query = ""
+        params = []
+        
+        if search_query:
+            if report_ids is None and not scan_search:
+                report_ids = self.search_report_ids(search_query)
+            
+            if report_ids is None:
+                # Search index unavailable or too many matches - fall back to a scan with the
+                # index's terms, so both ways match the same reports; names come from the directory
+                user_directory.ensure_fresh(self)
+                terms = list(dict.fromkeys(tokenize(search_query)))[:10] or [search_query]
+                for term in terms:
+                    query += " AND (r.description LIKE %s"
+                    params.append(f"%{term}%")
+                    employee_ids = user_directory.ids_matching_name(term)
+                    if employee_ids:
+                        query += f" OR r.employee_id IN ({', '.join(str(int(user_id)) for user_id in employee_ids)})"
+                    query += ")"
+            elif report_ids:
+                query += f" AND r.report_id IN ({', '.join(str(int(report_id)) for report_id in report_ids)})"
+            else:
+                query += " AND 1=0"
+        
+        if plant_filter:
+            query += " AND r.plant = %s"
+            params.append(plant_filter)
+        
+        if user_filter:
+            user_directory.ensure_fresh(self)
+            user = user_directory.find_by_username(user_filter)
+            if user:
+                query += " AND r.employee_id = %s"
+                params.append(user.user_id)
+            else:
+                query += " AND 1=0"
+        
+        if date_from:
+            query += " AND r.date_occurred >= %s"
+            params.append(date_from)
+            
+        if date_to:
+            query += " AND r.date_occurred <= %s"
+            params.append(date_to)
+        
+        return query, params
+    
+    def _report_names(self) -> tuple:
+        """
+        id -> name maps for resolving a page of REPORT_SELECT rows.
+        Lookup tables come from the cache; users from the directory (refreshed if stale).
+        """
+        user_directory.ensure_fresh(self)
+        lookups = self.load_lookups('departments', 'hazard_types', 'immediate_actions')
+        departments = {dept.dept_id: dept.dept_name for dept in lookups.departments}
+        hazard_types = {hazard.hazard_type_id: hazard.hazard_type for hazard in lookups.hazard_types}
+        actions = {action.action_id: action.action_description for action in lookups.immediate_actions}
+        return departments, hazard_types, actions
+    
+    def _row_to_report(self, row, names: tuple) -> Report:
+        """Map a REPORT_SELECT row to a Report record, filling in names from _report_names"""
+        departments, hazard_types, actions = names
+        (report_id, date_occurred, time_occurred, plant, employee_id, dept_id, equipment_area,
+         hazard_assessment, hazard_type_id, custom_hazard_type, description, immediate_action_id,
+         corrective_action, responsible_party_id, corrective_action_completed, completion_date,
+         completed_by_id, created_by_id, created_date, row_version) = row
+        
+        return Report(
+            report_id, date_occurred, time_occurred, plant,
+            user_directory.full_name(employee_id),
+            departments.get(dept_id), equipment_area, hazard_assessment,
+            hazard_types.get(hazard_type_id), custom_hazard_type, description,
+            actions.get(immediate_action_id), corrective_action,
+            user_directory.full_name(responsible_party_id),
+            corrective_action_completed, completion_date,
+            user_directory.full_name(completed_by_id),
+            user_directory.full_name(created_by_id),
+            created_date,
+            employee_id, dept_id, hazard_type_id, immediate_action_id,
+            responsible_party_id, completed_by_id, created_by_id,
+            # Opaque concurrency token for update_near_miss_reports
+            row_version.hex() if row_version else None
+        )
+    
+    def get_near_miss_reports(self, search_query: str = "", plant_filter: str = "", 
+                             user_filter: str = "", date_from: str = "", date_to: str = "") -> List[Report]:
+        """
+        Get near miss reports with filtering (search results are ordered by relevance).
+        Archived reports are included only when the dates reach back past the archive cutoff.
+        """
+        archive = self._reaches_archive(date_from, date_to)
+        # Resolve search matches and names before taking a connection; they may need their own
+        ranked_ids = self.search_report_ids(search_query) if search_query and not archive else None
+        filters, params = self._report_filters(search_query, plant_filter, user_filter, date_from, date_to,
+                                               report_ids=ranked_ids, scan_search=archive or ranked_ids is None)
+        names = self._report_names()
+        
+        conn = self.get_connection(readonly=True)
         try:
             cursor = conn.cursor()
-            cursor.execute("SELECT hazard_type_id, hazard_type FROM hazard_types ORDER BY hazard_type")
+            
+            query = self._report_select(archive=archive) + filters
+            query += " ORDER BY r.created_date DESC"
+            
+            cursor.execute(query, params)
             rows = cursor.fetchall()
-            return [{'hazard_type_id': row[0], 'hazard_type': row[1]} for row in rows]
+            
+            reports = [self._row_to_report(row, names) for row in rows]
+            if ranked_ids:
+                rank = {report_id: position for position, report_id in enumerate(ranked_ids)}
+                reports.sort(key=lambda report: rank.get(report['report_id'], len(rank)))
+            return reports
+            
         except Exception as e:
-            logger.error(f"Error getting hazard types: {e}")
+            logger.error(f"Error getting near miss reports: {e}")
             return []
         finally:
             conn.close()
     
-    def get_immediate_actions(self) -> List[Dict]:
-        """Get all immediate actions"""
-        conn = self.get_connection()
+    STREAM_BATCH_SIZE = 500
+    
+    def iter_near_miss_reports(self, search_query: str = "", plant_filter: str = "",
+                               user_filter: str = "", date_from: str = "", date_to: str = "",
+                               batch_size: int = None) -> Iterator[Report]:
+        """
+        Stream near miss reports (newest first) without materialising the result set.
+        Rows are pulled with fetchmany in batches; the connection is held only while the
+        iterator is alive and is returned to the pool when it is exhausted, closed or
+        garbage collected. Unlike get_near_miss_reports, errors are raised, not swallowed,
+        so a failed export is never silently truncated.
+        """
+        batch_size = batch_size or self.STREAM_BATCH_SIZE
+        archive = self._reaches_archive(date_from, date_to)
+        filters, params = self._report_filters(search_query, plant_filter, user_filter, date_from, date_to,
+                                               scan_search=archive)
+        query = self._report_select(archive=archive) + filters
+        query += " ORDER BY r.created_date DESC, r.report_id DESC"
+        
+        names = self._report_names()
+        
+        conn = self.get_connection(readonly=True)
         try:
             cursor = conn.cursor()
-            cursor.execute("SELECT action_id, action_description FROM immediate_actions ORDER BY action_description")
-            rows = cursor.fetchall()
-            return [{'action_id': row[0], 'action_description': row[1]} for row in rows]
+            cursor.execute(query, params)
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._row_to_report(row, names)
+                    
+        except GeneratorExit:
+            # Closed early: unread rows are still on the wire, so don't reuse this connection
+            conn.invalidate()
+            raise
         except Exception as e:
-            logger.error(f"Error getting immediate actions: {e}")
-            return []
+            logger.error(f"Error streaming near miss reports: {e}")
+            conn.invalidate()
+            raise
+        finally:
+            conn.close()
+    
+    def get_near_miss_reports_page(self, search_query: str = "", plant_filter: str = "",
+                                   user_filter: str = "", date_from: str = "", date_to: str = "",
+                                   page_size: int = None, cursor: str = None, with_counts: bool = False) -> Dict:
+        """
+        Get one page of near miss reports, newest first, or best match first for a search.
+        Listings use keyset pagination on (created_date, report_id) so every page costs the same.
+        Searches the index answers (at most SEARCH_RESULT_LIMIT matches) page through the
+        ranked matches by position instead; searches that fall back to a scan (too many
+        matches, or reaching the archive) are listed newest first.
+        Pass the returned next_cursor back in to fetch the following page.
+        Archived reports are included only when the dates reach back past the archive cutoff.
+        with_counts adds 'counts' ({total, high, medium, resolved}) over every report matching
+        the filters, not just this page.
+        Raises ValueError for a malformed cursor.
+        """
+        page_size = min(max(int(page_size or self.DEFAULT_PAGE_SIZE), 1), self.MAX_PAGE_SIZE)
+        archive = self._reaches_archive(date_from, date_to)
+        ranked_ids = self.search_report_ids(search_query) if search_query and not archive else None
+        if ranked_ids:
+            after, position = None, decode_search_cursor(cursor) if cursor else 0
+        else:
+            after, position = decode_report_cursor(cursor) if cursor else None, None
+        filters, params = self._report_filters(search_query, plant_filter, user_filter, date_from, date_to,
+                                               report_ids=ranked_ids, scan_search=archive or ranked_ids is None)
+        names = self._report_names()
+        counts = None
+        
+        conn = self.get_connection(readonly=True)
+        try:
+            db_cursor = conn.cursor()
+            
+            if with_counts:
+                db_cursor.execute(f"""
+                    SELECT COUNT(*),
+                           SUM(CASE WHEN r.hazard_assessment = 'High/Immediate' THEN 1 ELSE 0 END),
+                           SUM(CASE WHEN r.hazard_assessment = 'Medium' THEN 1 ELSE 0 END),
+                           SUM(CASE WHEN r.corrective_action_completed = 1 THEN 1 ELSE 0 END)
+                    FROM {self.REPORT_ARCHIVE_SOURCE if archive else 'near_miss_reports'} r
+                    WHERE 1=1 {filters}
+                """, params)
+                row = db_cursor.fetchone()
+                counts = dict(zip(('total', 'high', 'medium', 'resolved'), (value or 0 for value in row)))
+            
+            if ranked_ids:
+                page = self._ranked_page(db_cursor, ranked_ids, filters, params, position, page_size, names)
+                if with_counts:
+                    page['counts'] = counts
+                return page
+            
+            # Fetch one extra row to know whether another page exists
+            query = self._report_select(top="TOP (%s)", archive=archive) + filters
+            params = [page_size + 1] + params
+            
+            if after:
+                after_date, after_id = after
+                query += " AND (r.created_date < %s OR (r.created_date = %s AND r.report_id < %s))"
+                params.extend([after_date, after_date, after_id])
+            
+            query += " ORDER BY r.created_date DESC, r.report_id DESC"
+            
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
+            
+            reports = [self._row_to_report(row, names) for row in rows[:page_size]]
+            next_cursor = None
+            if len(rows) > page_size and reports:
+                last = reports[-1]
+                next_cursor = encode_report_cursor(last['created_date'], last['report_id'])
+            
+            page = {'reports': reports, 'next_cursor': next_cursor, 'page_size': page_size}
+            if with_counts:
+                page['counts'] = counts
+            return page
+            
+        except Exception as e:
+            logger.error(f"Error getting near miss reports page: {e}")
+            page = {'reports': [], 'next_cursor': None, 'page_size': page_size}
+            if with_counts:
+                page['counts'] = {'total': 0, 'high': 0, 'medium': 0, 'resolved': 0}
+            return page
         finally:
             conn.close()
     
-    def create_near_miss_report(self, data: Dict, created_by_id: int) -> bool:
-        """Create a new near miss report"""
+    def _ranked_page(self, db_cursor, ranked_ids: List[int], filters: str, params: list, position: int,
+                     page_size: int, names: tuple) -> Dict:
+        """One page of search matches in rank order, starting position matches in"""
+        db_cursor.execute("SELECT r.report_id FROM near_miss_reports r WHERE 1=1" + filters, params)
+        matching = {row[0] for row in db_cursor.fetchall()}
+        ordered = [report_id for report_id in ranked_ids if report_id in matching]
+        page_ids = ordered[position:position + page_size]
+        
+        reports = []
+        if page_ids:
+            db_cursor.execute(self._report_select() +
+                              f" AND r.report_id IN ({', '.join(str(int(report_id)) for report_id in page_ids)})")
+            rank = {report_id: index for index, report_id in enumerate(page_ids)}
+            reports = sorted((self._row_to_report(row, names) for row in db_cursor.fetchall()),
+                             key=lambda report: rank[report['report_id']])
+        
+        next_position = position + page_size
+        next_cursor = encode_search_cursor(next_position) if next_position < len(ordered) else None
+        return {'reports': reports, 'next_cursor': next_cursor, 'page_size': page_size}
+    
+    # Report fields update_near_miss_reports accepts, with the type each value is coerced to
+    EDITABLE_REPORT_FIELDS = {
+        'date_occurred': 'date', 'time_occurred': 'time', 'employee_id': 'int', 'plant': 'str',
+        'dept_id': 'int', 'equipment_area': 'str', 'hazard_assessment': 'str', 'hazard_type_id': 'int',
+        'custom_hazard_type': 'str', 'description': 'str', 'immediate_action_id': 'int',
+        'corrective_action': 'str', 'responsible_party_id': 'int', 'corrective_action_completed': 'bool',
+        'completion_date': 'date', 'completed_by_id': 'int'
+    }
+    REQUIRED_REPORT_FIELDS = ('date_occurred', 'time_occurred', 'employee_id', 'plant', 'description')
+    # Changing any of these moves the report to another report_stats_daily row (or between open/closed)
+    REPORT_STATS_FIELDS = ('plant', 'dept_id', 'hazard_type_id', 'hazard_assessment', 'corrective_action_completed')
+    MAX_BULK_UPDATES = 500
+    EDIT_HISTORY_VALUE_LENGTH = 500
+    
+    def _coerce_report_field(self, field: str, value):
+        """Normalise a submitted (or stored) value to its column's Python type; ValueError if it can't be"""
+        kind = self.EDITABLE_REPORT_FIELDS[field]
+        if kind == 'bool':
+            return value in ('on', True, 1, '1', 'true')
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+        if kind == 'int':
+            return int(value)
+        if kind == 'date':
+            if isinstance(value, datetime):
+                return value.date()
+            return value if isinstance(value, date) else datetime.strptime(str(value), '%Y-%m-%d').date()
+        if kind == 'time':
+            if isinstance(value, dt_time):
+                return value.replace(microsecond=0)
+            text = str(value).strip()
+            return datetime.strptime(text, '%H:%M:%S' if text.count(':') == 2 else '%H:%M').time()
+        return str(value).strip()
+    
+    def _completion_changes(self, changes: Dict, current: Dict, user_id: int) -> Dict:
+        """Stamp (or clear) completion_date / completed_by_id when an edit closes or reopens the action"""
+        completed = changes.get('corrective_action_completed')
+        if completed is None or completed == current['corrective_action_completed']:
+            return changes
+        changes = dict(changes)
+        if completed:
+            changes.setdefault('completion_date', current['completion_date'] or datetime.now().date())
+            changes.setdefault('completed_by_id', user_id)
+        else:
+            changes.setdefault('completion_date', None)
+            changes.setdefault('completed_by_id', None)
+        return changes
+    
+    def _history_value(self, value) -> Optional[str]:
+        if value is None:
+            return None
+        text = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        return text[:self.EDIT_HISTORY_VALUE_LENGTH]
+    
+    def _report_update_batch(self, edits: List[tuple], user_id: int) -> tuple:
+        """
+        SQL and params for one round trip of update_near_miss_reports: an UPDATE of just the
+        changed columns per report, guarded by the row_version the diff was computed from, one
+        multi-row edit_history INSERT and, if a stats field changed, a report_stats_daily merge
+        moving the reports from their old rows to the new. Only reports whose UPDATE matched get
+        history or stats rows; the batch ends by selecting their ids.
+        edits are (report_id, row_version, {field: (old, new)}) tuples.
+        """
+        statements = []
+        params = []
+        history = []
+        moves_stats = False
+        
+        for report_id, row_version, diff in edits:
+            # One OUTPUT ... INTO per statement: reports that move stats are copied to @updated below
+            output = "OUTPUT INSERTED.report_id INTO @updated"
+            if any(field in diff for field in self.REPORT_STATS_FIELDS):
+                moves_stats = True
+                output = """
+                    OUTPUT INSERTED.report_id, DELETED.created_date,
+                           DELETED.plant, DELETED.dept_id, DELETED.hazard_type_id, DELETED.hazard_assessment,
+                           DELETED.corrective_action_completed,
+                           INSERTED.plant, INSERTED.dept_id, INSERTED.hazard_type_id, INSERTED.hazard_assessment,
+                           INSERTED.corrective_action_completed INTO @moved
+                """
+            statements.append(f"""
+                UPDATE near_miss_reports
+                SET {', '.join(f"{field} = %s" for field in diff)}
+                {output}
+                WHERE report_id = %s AND row_version = %s;
+            """)
+            params.extend(new for _, new in diff.values())
+            params.extend([report_id, row_version])
+            
+            for field, (old, new) in diff.items():
+                history.append((report_id, user_id, field, self._history_value(old), self._history_value(new)))
+        
+        if moves_stats:
+            statements.append("INSERT INTO @updated (report_id) SELECT report_id FROM @moved;")
+        statements.append(f"""
+            INSERT INTO edit_history (report_id, user_id, field_changed, old_value, new_value)
+            SELECT h.report_id, h.user_id, h.field_changed, h.old_value, h.new_value
+            FROM (VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(history))})
+                AS h (report_id, user_id, field_changed, old_value, new_value)
+            WHERE h.report_id IN (SELECT report_id FROM @updated);
+        """)
+        for row in history:
+            params.extend(row)
+        
+        header = """
+            SET NOCOUNT ON;
+            DECLARE @updated TABLE (report_id INT PRIMARY KEY);
+        """
+        if moves_stats:
+            header += """
+                DECLARE @moved TABLE (
+                    report_id INT, created_date DATETIME,
+                    old_plant NVARCHAR(20), old_dept_id INT, old_hazard_type_id INT, old_assessment NVARCHAR(20),
+                    old_completed BIT,
+                    new_plant NVARCHAR(20), new_dept_id INT, new_hazard_type_id INT, new_assessment NVARCHAR(20),
+                    new_completed BIT
+                );
+            """
+            statements.append(self._report_stats_merge("""
+                SELECT created_date, old_plant, old_dept_id, old_hazard_type_id, old_assessment,
+                       -1, CASE WHEN old_completed = 1 THEN 0 ELSE -1 END
+                FROM @moved
+                UNION ALL
+                SELECT created_date, new_plant, new_dept_id, new_hazard_type_id, new_assessment,
+                       1, CASE WHEN new_completed = 1 THEN 0 ELSE 1 END
+                FROM @moved
+            """))
+        
+        statements.append("SELECT report_id FROM @updated;")
+        return header + ''.join(statements), params
+    
+    def update_near_miss_reports(self, updates: List[Dict], user_id: int,
+                                 require_row_version: bool = True) -> List[Dict]:
+        """
+        Apply field edits to many reports in one transaction.
+        Each update is {report_id, row_version, changes}: row_version is the token from the
+        report as the editor last read it and changes maps EDITABLE_REPORT_FIELDS to new
+        values. An update without a row_version is invalid unless require_row_version is
+        False, which is only for server-side state changes that aren't based on a copy the
+        user read (e.g. set_corrective_action_completed); those apply to the current row.
+        Only fields that actually differ are written, and each one gets an edit_history row.
+        Returns one {index, report_id, status, changed, error, report} dict per update, in
+        order; status is updated, unchanged, conflict, not_found or invalid, and report is
+        the stored row for updated reports. Raises on database errors (nothing is committed).
+        """
+        results = []
+        requested = {}
+        
+        for index, update in enumerate(updates):
+            result = {'index': index, 'report_id': None, 'status': None, 'changed': [], 'error': None,
+                      'report': None}
+            results.append(result)
+            
+            if not isinstance(update, dict) or not isinstance(update.get('changes'), dict):
+                result.update(status='invalid', error='Update must be an object with a "changes" object')
+                continue
+            try:
+                report_id = int(update.get('report_id'))
+            except (TypeError, ValueError):
+                result.update(status='invalid', error='report_id must be an integer')
+                continue
+            result['report_id'] = report_id
+            
+            unknown = sorted(set(update['changes']) - set(self.EDITABLE_REPORT_FIELDS))
+            if unknown:
+                result.update(status='invalid', error=f"Fields cannot be edited: {', '.join(unknown)}")
+                continue
+            if report_id in requested:
+                result.update(status='invalid', error='Report appears more than once in the request')
+                continue
+            if require_row_version and not update.get('row_version'):
+                result.update(status='invalid', error='row_version is required; reload the report and retry')
+                continue
+            changes = {}
+            try:
+                for field, value in update['changes'].items():
+                    changes[field] = self._coerce_report_field(field, value)
+            except (TypeError, ValueError):
+                result.update(status='invalid', error=f"Invalid value for {field}")
+                continue
+            cleared = [field for field in self.REQUIRED_REPORT_FIELDS if field in changes and changes[field] is None]
+            if cleared:
+                result.update(status='invalid', error=f"Required fields cannot be empty: {', '.join(cleared)}")
+                continue
+            
+            requested[report_id] = (result, changes, update.get('row_version'))
+        
+        if not requested:
+            return results
+        
+        columns = list(self.EDITABLE_REPORT_FIELDS)
+        names = self._report_names()
+        
         conn = self.get_connection()
         try:
+            conn.autocommit = False
             cursor = conn.cursor()
             
-            # Convert checkbox value to boolean
-            corrective_completed = 1 if data.get('corrective_action_completed') == 'on' else 0
+            # Read and lock the current rows; the diff below stays true until commit
+            cursor.execute(f"""
+                SELECT report_id, row_version, {', '.join(columns)}
+                FROM near_miss_reports WITH (UPDLOCK, ROWLOCK)
+                WHERE report_id IN ({', '.join(str(report_id) for report_id in requested)})
+            """)
+            current_rows = {row[0]: row for row in cursor.fetchall()}
+            
+            edits = []
+            for report_id, (result, changes, row_version) in requested.items():
+                row = current_rows.get(report_id)
+                if row is None:
+                    result.update(status='not_found', error='Report not found')
+                    continue
+                if row_version and (row[1].hex() if row[1] else None) != str(row_version).lower():
+                    result.update(status='conflict', error='Report was changed by someone else; reload and retry')
+                    continue
+                
+                current = {field: self._coerce_report_field(field, value) for field, value in zip(columns, row[2:])}
+                changes = self._completion_changes(changes, current, user_id)
+                diff = {field: (current[field], value) for field, value in changes.items() if value != current[field]}
+                if not diff:
+                    result['status'] = 'unchanged'
+                    continue
+                
+                result.update(status='updated', changed=list(diff))
+                edits.append((report_id, row[1], diff))
+            
+            # As few round trips as the parameter cap allows (usually one)
+            batches = []
+            batch_params = 0
+            for report_id, row_version, diff in edits:
+                cost = 6 * len(diff) + 2
+                if not batches or batch_params + cost > self.MAX_BATCH_PARAMS:
+                    batches.append([])
+                    batch_params = 0
+                batches[-1].append((report_id, row_version, diff))
+                batch_params += cost
             
-            cursor.execute("""
-                INSERT INTO near_miss_reports (
-                    date_occurred, time_occurred, employee_id, plant, dept_id, 
-                    equipment_area, hazard_assessment, hazard_type_id, 
-                    custom_hazard_type, description, immediate_action_id, 
-                    corrective_action, responsible_party_id, corrective_action_completed,
-                    completion_date, completed_by_id, created_by_id
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                data.get('date_occurred'),
-                data.get('time_occurred'),
-                data.get('employee_id'),
-                data.get('plant'),
-                data.get('dept_id') if data.get('dept_id') else None,
-                data.get('equipment_area'),
-                data.get('hazard_assessment'),
-                data.get('hazard_type_id') if data.get('hazard_type_id') else None,
-                data.get('custom_hazard_type'),
-                data.get('description'),
-                data.get('immediate_action_id') if data.get('immediate_action_id') else None,
-                data.get('corrective_action'),
-                data.get('responsible_party_id') if data.get('responsible_party_id') else None,
-                corrective_completed,
-                data.get('completion_date') if data.get('completion_date') else None,
-                data.get('completed_by_id') if data.get('completed_by_id') else None,
-                created_by_id
-            ))
-            
-            logger.info(f"Near miss report created successfully by user {created_by_id}")
-            return True
+            applied = set()
+            for batch in batches:
+                cursor.execute(*self._report_update_batch(batch, user_id))
+                applied.update(row[0] for row in cursor.fetchall())
+            
+            # The row lock makes a miss unlikely, but the row_version guard decides
+            lost = [edit for edit in edits if edit[0] not in applied]
+            for report_id, _, _ in lost:
+                requested[report_id][0].update(status='conflict', changed=[],
+                                               error='Report was changed by someone else; reload and retry')
+            edits = [edit for edit in edits if edit[0] in applied]
+            
+            reports = {}
+            if edits:
+                cursor.execute(self._report_select() +
+                               f" AND r.report_id IN ({', '.join(str(report_id) for report_id, _, _ in edits)})")
+                for row in cursor.fetchall():
+                    report = self._row_to_report(row, names)
+                    reports[report.report_id] = report
+            
+            conn.commit()
             
         except Exception as e:
-            logger.error(f"Error creating near miss report: {e}")
-            return False
+            logger.error(f"Error updating near miss reports: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
         finally:
             conn.close()
+        
+        for report_id, _, diff in edits:
+            report = reports.get(report_id)
+            requested[report_id][0]['report'] = report
+            # Re-index edited reports the search index already holds
+            if report and ('description' in diff or 'employee_id' in diff) and report_id <= report_index.high_water:
+                employee = user_directory.get(report.employee_id)
+                report_index.add(report_id, report.description,
+                                 employee.first_name if employee else None,
+                                 employee.last_name if employee else None)
+        
+        statuses = {}
+        for result in results:
+            statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        logger.info(f"Report update by user {user_id}: {statuses}")
+        return results
     
-    def get_near_miss_reports(self, search_query: str = "", plant_filter: str = "", 
-                             user_filter: str = "", date_from: str = "", date_to: str = "") -> List[Dict]:
-        """Get near miss reports with filtering"""
+    def update_near_miss_report(self, report_id: int, changes: Dict, user_id: int,
+                                row_version: str = None, require_row_version: bool = True) -> Dict:
+        """Single-report form of update_near_miss_reports; returns its result dict"""
+        return self.update_near_miss_reports(
+            [{'report_id': report_id, 'row_version': row_version, 'changes': changes}], user_id,
+            require_row_version=require_row_version
+        )[0]
+    
+    def get_near_miss_report(self, report_id: int) -> Optional[Report]:
+        """
+        One report read from the primary, so its row_version is current for an edit.
+        Returns None if it doesn't exist or on failure.
+        """
+        names = self._report_names()
+        
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
+            cursor.execute(self._report_select() + " AND r.report_id = %s", (report_id,))
+            row = cursor.fetchone()
+            return self._row_to_report(row, names) if row else None
             
-            query = """
-                SELECT 
-                    r.report_id, r.date_occurred, r.time_occurred, r.plant,
-                    u.first_name + ' ' + u.last_name as employee_name,
-                    d.dept_name, r.equipment_area, r.hazard_assessment,
-                    ht.hazard_type, r.custom_hazard_type, r.description,
-                    ia.action_description, r.corrective_action,
-                    rp.first_name + ' ' + rp.last_name as responsible_party,
-                    r.corrective_action_completed, r.completion_date,
-                    cb.first_name + ' ' + cb.last_name as completed_by,
-                    cr.first_name + ' ' + cr.last_name as created_by,
-                    r.created_date
-                FROM near_miss_reports r
-                LEFT JOIN users u ON r.employee_id = u.user_id
-                LEFT JOIN departments d ON r.dept_id = d.dept_id
-                LEFT JOIN hazard_types ht ON r.hazard_type_id = ht.hazard_type_id
-                LEFT JOIN immediate_actions ia ON r.immediate_action_id = ia.action_id
-                LEFT JOIN users rp ON r.responsible_party_id = rp.user_id
-                LEFT JOIN users cb ON r.completed_by_id = cb.user_id
-                LEFT JOIN users cr ON r.created_by_id = cr.user_id
-                WHERE 1=1
-            """
-            
-            params = []
+        except Exception as e:
+            logger.error(f"Error getting near miss report {report_id}: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def set_corrective_action_completed(self, report_id: int, completed: bool, user_id: int) -> bool:
+        """
+        Mark a report's corrective action completed (or reopen it); an audited edit through
+        update_near_miss_reports, so the dashboard rollup moves in the same transaction.
+        Returns True if the report exists (including when it was already in that state).
+        """
+        try:
+            # A toggle of the current state, not an edit of a copy the user read
+            result = self.update_near_miss_report(report_id, {'corrective_action_completed': completed}, user_id,
+                                                  require_row_version=False)
+        except Exception as e:
+            logger.error(f"Error updating corrective action for report {report_id}: {e}")
+            return False
+        
+        if result['status'] == 'not_found':
+            logger.warning(f"Corrective action update for unknown report {report_id}")
+            return False
+        
+        logger.info(f"Report {report_id} corrective action {'completed' if completed else 'reopened'} "
+                    f"by user {user_id}")
+        return True
+    
+    def rebuild_report_stats(self) -> int:
+        """
+        Recompute report_stats_daily from near_miss_reports and its archive (backfill / repair).
+        Runs as one transaction: report writes wait for the rebuild so none are counted twice
+        or lost, dashboard reads wait rather than see an empty rollup, and a failure leaves
+        the old rows in place. Returns the number of rollup rows written.
+        """
+        conn = self.get_connection()
+        try:
+            conn.autocommit = False
+            cursor = conn.cursor()
             
-            if search_query:
-                query += " AND (r.description LIKE %s OR u.first_name LIKE %s OR u.last_name LIKE %s)"
-                search_param = f"%{search_query}%"
-                params.extend([search_param, search_param, search_param])
+            # Lock the reports before the rollup, the same order report writes take them in,
+            # so a concurrent create/update waits instead of deadlocking
+            cursor.execute("""
+                SELECT (SELECT COUNT(*) FROM near_miss_reports WITH (TABLOCK, HOLDLOCK)),
+                       (SELECT COUNT(*) FROM near_miss_reports_archive WITH (TABLOCK, HOLDLOCK))
+            """)
+            cursor.fetchone()
+            cursor.execute("DELETE FROM report_stats_daily WITH (TABLOCKX)")
+            cursor.execute("""
+                INSERT INTO report_stats_daily (stat_date, plant, dept_id, hazard_type_id, hazard_assessment,
+                                                report_count, open_count)
+                SELECT CAST(created_date AS DATE), plant, ISNULL(dept_id, 0), ISNULL(hazard_type_id, 0),
+                       ISNULL(hazard_assessment, ''), COUNT(*),
+                       SUM(CASE WHEN corrective_action_completed = 1 THEN 0 ELSE 1 END)
+                FROM (
+                    SELECT created_date, plant, dept_id, hazard_type_id, hazard_assessment, corrective_action_completed
+                    FROM near_miss_reports WITH (TABLOCK, HOLDLOCK)
+                    UNION ALL
+                    SELECT created_date, plant, dept_id, hazard_type_id, hazard_assessment, corrective_action_completed
+                    FROM near_miss_reports_archive WITH (TABLOCK, HOLDLOCK)
+                ) r
+                GROUP BY CAST(created_date AS DATE), plant, ISNULL(dept_id, 0), ISNULL(hazard_type_id, 0),
+                         ISNULL(hazard_assessment, '');
+                SELECT @@ROWCOUNT;
+            """)
+            rows = cursor.fetchone()[0]
+            conn.commit()
             
-            if plant_filter:
-                query += " AND r.plant = %s"
-                params.append(plant_filter)
+            logger.info(f"Rebuilt report_stats_daily: {rows} rollup rows")
+            return rows
             
-            if user_filter:
-                query += " AND u.username = %s"
-                params.append(user_filter)
+        except Exception as e:
+            logger.error(f"Error rebuilding report stats: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+    
+    def archive_reports(self, older_than_days: int = None, batch_size: int = None) -> int:
+        """
+        Move closed reports submitted more than older_than_days ago (default ARCHIVE_AFTER_DAYS)
+        into near_miss_reports_archive, together with their edit history, email history and
+        attachment rows. Works in batches, each its own short transaction, so the hot tables
+        are never locked for long; reports with email still pending stay hot until it is sent.
+        Dashboard counts are unaffected (report_stats_daily keeps counting archived reports).
+        Returns the number of reports archived.
+        """
+        cutoff = datetime.now() - timedelta(days=older_than_days or self.ARCHIVE_AFTER_DAYS)
+        batch_size = batch_size or self.ARCHIVE_BATCH_SIZE
+        columns = ', '.join(('report_id',) + self.REPORT_INSERT_COLUMNS + ('created_date', 'client_key', 'row_version'))
+        archived = 0
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
             
-            if date_from:
-                query += " AND r.date_occurred >= %s"
-                params.append(date_from)
+            while True:
+                # READPAST skips rows someone is editing right now; they go in a later run
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    SET XACT_ABORT ON;
+                    DECLARE @batch TABLE (report_id INT PRIMARY KEY);
+                    
+                    BEGIN TRANSACTION;
+                    INSERT INTO @batch (report_id)
+                    SELECT TOP (%s) r.report_id
+                    FROM near_miss_reports r WITH (UPDLOCK, READPAST)
+                    WHERE r.corrective_action_completed = 1 AND r.created_date < %s
+                      AND NOT EXISTS (SELECT 1 FROM email_queue q
+                                      WHERE q.report_id = r.report_id AND q.status IN ('pending', 'sending'))
+                    ORDER BY r.report_id;
+                    
+                    DELETE FROM edit_history
+                    OUTPUT DELETED.history_id, DELETED.report_id, DELETED.user_id, DELETED.field_changed,
+                           DELETED.old_value, DELETED.new_value, DELETED.changed_date
+                    INTO edit_history_archive (history_id, report_id, user_id, field_changed,
+                                               old_value, new_value, changed_date)
+                    WHERE report_id IN (SELECT report_id FROM @batch);
+                    
+                    DELETE FROM email_history
+                    OUTPUT DELETED.history_id, DELETED.to_address, DELETED.subject, DELETED.report_id,
+                           DELETED.sent_date, DELETED.status
+                    INTO email_history_archive (history_id, to_address, subject, report_id, sent_date, status)
+                    WHERE report_id IN (SELECT report_id FROM @batch);
+                    
+                    DELETE FROM attachments
+                    OUTPUT DELETED.attachment_id, DELETED.report_id, DELETED.filename, DELETED.file_path,
+                           DELETED.uploaded_date
+                    INTO attachments_archive (attachment_id, report_id, filename, file_path, uploaded_date)
+                    WHERE report_id IN (SELECT report_id FROM @batch);
+                    
+                    -- Sent / failed queue rows are already recorded in email_history
+                    DELETE FROM email_queue
+                    WHERE report_id IN (SELECT report_id FROM @batch) AND status IN ('sent', 'failed');
+                    
+                    INSERT INTO near_miss_reports_archive ({columns})
+                    SELECT {columns} FROM near_miss_reports
+                    WHERE report_id IN (SELECT report_id FROM @batch);
+                    
+                    DELETE FROM near_miss_reports WHERE report_id IN (SELECT report_id FROM @batch);
+                    COMMIT TRANSACTION;
+                    
+                    SELECT report_id FROM @batch;
+                """, (batch_size, cutoff))
+                report_ids = [row[0] for row in cursor.fetchall()]
+                
+                for report_id in report_ids:
+                    report_index.remove(report_id)
+                archived += len(report_ids)
                 
-            if date_to:
-                query += " AND r.date_occurred <= %s"
-                params.append(date_to)
+                if len(report_ids) < batch_size:
+                    break
             
-            query += " ORDER BY r.created_date DESC"
+            logger.info(f"Archived {archived} reports closed before {cutoff:%Y-%m-%d}")
+            return archived
             
+        except Exception as e:
+            logger.error(f"Error archiving reports ({archived} archived before the failure): {e}")
+            # XACT_ABORT rolled the batch back; don't hand a connection that failed mid-batch back to the pool
+            conn.invalidate()
+            raise
+        finally:
+            conn.close()
+    
+    def get_dashboard_stats(self, plant: str = None) -> Optional[Dict]:
+        """
+        Dashboard counts read from the report_stats_daily rollup in one query:
+        totals (reports, open actions, reports this week, high-priority backlog) plus
+        breakdowns by plant, department, hazard type, assessment and month.
+        Returns None on failure.
+        """
+        today = datetime.now().date()
+        week_start = today - timedelta(days=today.weekday())
+        
+        lookups = self.load_lookups('departments', 'hazard_types')
+        departments = {dept.dept_id: dept.dept_name for dept in lookups.departments}
+        hazard_types = {hazard.hazard_type_id: hazard.hazard_type for hazard in lookups.hazard_types}
+        
+        conn = self.get_connection(readonly=True)
+        try:
+            cursor = conn.cursor()
+            query = """
+                SELECT GROUPING(s.plant), GROUPING(s.dept_id), GROUPING(s.hazard_type_id),
+                       GROUPING(s.hazard_assessment), GROUPING(m.stat_month),
+                       s.plant, s.dept_id, s.hazard_type_id, s.hazard_assessment, m.stat_month,
+                       SUM(s.report_count), SUM(s.open_count),
+                       SUM(CASE WHEN s.stat_date >= %s THEN s.report_count ELSE 0 END),
+                       SUM(CASE WHEN s.hazard_assessment = %s THEN s.open_count ELSE 0 END)
+                FROM report_stats_daily s
+                CROSS APPLY (SELECT DATEFROMPARTS(YEAR(s.stat_date), MONTH(s.stat_date), 1) AS stat_month) m
+            """
+            params = [week_start, self.HIGH_PRIORITY_ASSESSMENT]
+            if plant:
+                query += " WHERE s.plant = %s"
+                params.append(plant)
+            query += """
+                GROUP BY GROUPING SETS ((), (s.plant), (s.dept_id), (s.hazard_type_id),
+                                        (s.hazard_assessment), (m.stat_month))
+            """
             cursor.execute(query, params)
             rows = cursor.fetchall()
-            
-            reports = []
-            for row in rows:
-                reports.append({
-                    'report_id': row[0],
-                    'date_occurred': row[1],
-                    'time_occurred': row[2],
-                    'plant': row[3],
-                    'employee_name': row[4],
-                    'dept_name': row[5],
-                    'equipment_area': row[6],
-                    'hazard_assessment': row[7],
-                    'hazard_type': row[8],
-                    'custom_hazard_type': row[9],
-                    'description': row[10],
-                    'action_description': row[11],
-                    'corrective_action': row[12],
-                    'responsible_party': row[13],
-                    'corrective_action_completed': row[14],
-                    'completion_date': row[15],
-                    'completed_by': row[16],
-                    'created_by': row[17],
-                    'created_date': row[18]
-                })
-            
-            return reports
-            
         except Exception as e:
-            logger.error(f"Error getting near miss reports: {e}")
-            return []
+            logger.error(f"Error getting dashboard stats: {e}")
+            return None
         finally:
             conn.close()
+        
+        stats = {
+            'total_reports': 0, 'open_actions': 0, 'reports_this_week': 0, 'high_priority_backlog': 0,
+            'by_plant': [], 'by_department': [], 'by_hazard_type': [], 'by_assessment': [], 'by_month': []
+        }
+        first_month = today.replace(day=1)
+        for _ in range(self.DASHBOARD_MONTHS - 1):
+            first_month = (first_month - timedelta(days=1)).replace(day=1)
+        
+        for row in rows:
+            (no_plant, no_dept, no_hazard, no_assessment, no_month,
+             row_plant, dept_id, hazard_type_id, assessment, month,
+             reports, open_actions, this_week, high_open) = row
+            entry = {'reports': reports or 0, 'open': open_actions or 0}
+            
+            if not no_plant:
+                stats['by_plant'].append(dict(entry, name=row_plant))
+            elif not no_dept:
+                stats['by_department'].append(dict(entry, name=departments.get(dept_id, 'Unassigned')))
+            elif not no_hazard:
+                stats['by_hazard_type'].append(dict(entry, name=hazard_types.get(hazard_type_id, 'Other')))
+            elif not no_assessment:
+                stats['by_assessment'].append(dict(entry, name=assessment or 'Not assessed'))
+            elif not no_month:
+                if month >= first_month:
+                    stats['by_month'].append(dict(entry, name=month.strftime('%Y-%m')))
+            else:
+                stats.update(total_reports=entry['reports'], open_actions=entry['open'],
+                             reports_this_week=this_week or 0, high_priority_backlog=high_open or 0)
+        
+        for key in ('by_plant', 'by_department', 'by_hazard_type', 'by_assessment'):
+            stats[key].sort(key=lambda entry: -entry['reports'])
+        stats['by_month'].sort(key=lambda entry: entry['name'])
+        return stats
     
     def add_user(self, first_name: str, last_name: str, username: str, plant: str, email: str = None) -> Optional[int]:
         """Add a new user and return user_id"""
@@ -649,6 +2131,8 @@ class NearMissDatabase:
             result = cursor.fetchone()
             if result:
                 user_id = result[0]
+                self.invalidate_lookups('users', plant)
+                user_directory.add(User(user_id, first_name, last_name, username, email, plant, False, False))
                 logger.info(f"User added successfully: {username} (ID: {user_id})")
                 return user_id
             
@@ -659,3 +2143,143 @@ class NearMissDatabase:
             return None
         finally:
             conn.close()
+    
+    def _sync_lookup_versions(self):
+        """
+        Drop cached tables whose lookup_versions row moved since the last check (at most every
+        LOOKUP_VERSION_CHECK_SECONDS). If the table can't be read the cache falls back to its TTL.
+        """
+        global _lookup_versions_checked_at, _lookup_versions_synced
+        if time.monotonic() - _lookup_versions_checked_at < self.LOOKUP_VERSION_CHECK_SECONDS:
+            return
+        with _lookup_versions_lock:
+            if time.monotonic() - _lookup_versions_checked_at < self.LOOKUP_VERSION_CHECK_SECONDS:
+                return
+            _lookup_versions_checked_at = time.monotonic()
+            
+            conn = self.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT table_name, version FROM lookup_versions")
+                versions = dict(cursor.fetchall())
+            except Exception as e:
+                logger.warning(f"Error reading lookup versions, relying on cache TTL: {e}")
+                return
+            finally:
+                conn.close()
+            
+            for table, version in versions.items():
+                # A row that appears after the first sync is a table's first ever bump
+                if _lookup_versions.get(table, 0 if _lookup_versions_synced else version) != version:
+                    removed = lookup_cache.invalidate(table)
+                    logger.debug(f"Lookup {table} changed elsewhere, dropped {removed} cached entries")
+            _lookup_versions.clear()
+            _lookup_versions.update(versions)
+            _lookup_versions_synced = True
+    
+    def _publish_lookup_change(self, tables: List[str]):
+        """Bump lookup_versions so every process drops these tables on its next version check"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                MERGE lookup_versions WITH (HOLDLOCK) AS target
+                USING (VALUES {', '.join(['(%s)'] * len(tables))}) AS source (table_name)
+                ON target.table_name = source.table_name
+                WHEN MATCHED THEN UPDATE SET version = target.version + 1, changed_date = GETDATE()
+                WHEN NOT MATCHED THEN INSERT (table_name, version) VALUES (source.table_name, 1);
+            """, tuple(tables))
+        except Exception as e:
+            logger.warning(f"Error publishing lookup change for {tables}; other processes refresh "
+                           f"after their cache TTL: {e}")
+        finally:
+            conn.close()
+    
+    def invalidate_lookups(self, table: str = None, plant: str = None) -> int:
+        """
+        Drop cached lookup data after a write, here and (via lookup_versions) in every other
+        process. No table clears everything; a plant clears that plant plus the unfiltered list.
+        """
+        self._publish_lookup_change([table] if table else list(self.LOOKUP_CACHE_TTL))
+        if table is None:
+            removed = lookup_cache.invalidate()
+            user_directory.invalidate()
+        elif plant is None:
+            removed = lookup_cache.invalidate(table)
+        else:
+            removed = lookup_cache.invalidate(table, plant) + lookup_cache.invalidate(table, None)
+        
+        logger.debug(f"Invalidated {removed} cached lookup entries (table={table}, plant={plant})")
+        return removed
+    
+    def invalidate_lookup_tables(self, tables: List[str]) -> int:
+        """
+        invalidate_lookups for several whole tables with a single lookup_versions bump.
+        Call after the write has committed and its connection is back in the pool.
+        """
+        if not tables:
+            return 0
+        self._publish_lookup_change(list(tables))
+        removed = sum(lookup_cache.invalidate(table) for table in tables)
+        logger.debug(f"Invalidated {removed} cached lookup entries (tables={', '.join(tables)})")
+        return removed
+    
+    def save_dropdown_changes(self, changes: Dict) -> bool:
+        """Apply edits from the admin dropdowns page in a single transaction"""
+        # data-type on the page -> (table, id column, value column, cache keys to drop)
+        editable = {
+            'department': ('departments', 'dept_id', 'dept_name', ['departments', 'equipment']),
+            'equipment': ('equipment', 'equip_id', 'equip_name', ['equipment']),
+            'hazard_type': ('hazard_types', 'hazard_type_id', 'hazard_type', ['hazard_types']),
+            'immediate_action': ('immediate_actions', 'action_id', 'action_description', ['immediate_actions'])
+        }
+        touched = set()
+        
+        conn = self.get_connection()
+        try:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            
+            for change_type, (table, id_col, value_col, cache_tables) in editable.items():
+                for item_id, value in (changes.get(change_type) or {}).items():
+                    if value:
+                        cursor.execute(f"UPDATE {table} SET {value_col} = %s WHERE {id_col} = %s",
+                                       (value.strip(), int(item_id)))
+                        touched.update(cache_tables)
+            
+            for dept in changes.get('new_department') or []:
+                cursor.execute("INSERT INTO departments (plant, dept_name) VALUES (%s, %s)",
+                               (dept['plant'], dept['dept_name'].strip()))
+                touched.add('departments')
+            
+            for hazard_type in changes.get('new_hazard_type') or []:
+                cursor.execute("INSERT INTO hazard_types (hazard_type) VALUES (%s)", (hazard_type.strip(),))
+                touched.add('hazard_types')
+            
+            for action in changes.get('new_immediate_action') or []:
+                cursor.execute("INSERT INTO immediate_actions (action_description) VALUES (%s)", (action.strip(),))
+                touched.add('immediate_actions')
+            
+            for change_type, item_ids in (changes.get('delete') or {}).items():
+                if change_type not in editable:
+                    continue
+                table, id_col, _, cache_tables = editable[change_type]
+                for item_id in item_ids:
+                    cursor.execute(f"DELETE FROM {table} WHERE {id_col} = %s", (int(item_id),))
+                    touched.update(cache_tables)
+            
+            conn.commit()
+            logger.info(f"Dropdown changes saved: {sorted(touched)}")
+            
+        except Exception as e:
+            logger.error(f"Error saving dropdown changes: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return False
+        finally:
+            conn.close()
+        
+        self.invalidate_lookup_tables(sorted(touched))
+        return True
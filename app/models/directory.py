@@ -0,0 +1,129 @@
+"""
+User directory for NEARMISS System
+In-memory user_id -> name/plant/role map used to resolve names on report rows
+instead of joining users once per name column
+"""
+import threading
+import logging
+import time
+from typing import Dict, List, Optional
+
+from .records import User
+
+logger = logging.getLogger(__name__)
+
+
+class UserDirectory:
+    """
+    Process-wide map of every user, loaded once and kept current with a change token.
+
+    Every refresh_interval seconds a single aggregate query (row count, checksum of the
+    directory columns and newest created_date) is compared with the last one; the users
+    are only re-read when it differs. add_user pushes new users in directly. A failed
+    load is not retried for refresh_interval either, even before the first one succeeds.
+    """
+
+    def __init__(self, refresh_interval: float = 60):
+        self.refresh_interval = refresh_interval
+        self._by_id = {}
+        self._by_username = {}
+        self._token = None
+        self._checked_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def _due(self) -> bool:
+        now = time.monotonic()
+        if self._token is None:
+            # Never loaded (or invalidated): load now, unless the last attempt just failed
+            return now >= self._retry_at
+        return now - self._checked_at >= self.refresh_interval
+
+    def ensure_fresh(self, db):
+        """Reload from db if the change token moved (checked at most every refresh_interval)"""
+        if not self._due():
+            return
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if not self._due():
+                return
+            self._refresh(db)
+
+    def _refresh(self, db):
+        conn = None
+        try:
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*),
+                       CHECKSUM_AGG(BINARY_CHECKSUM(user_id, first_name, last_name, username,
+                                                    email, plant, is_admin, is_supervisor)),
+                       MAX(created_date)
+                FROM users
+            """)
+            token = tuple(cursor.fetchone())
+
+            if token != self._token:
+                cursor.execute("""
+                    SELECT user_id, first_name, last_name, username, email, plant, is_admin, is_supervisor
+                    FROM users
+                """)
+                users = [User.from_row(row) for row in cursor.fetchall()]
+                self._by_id = {user.user_id: user for user in users}
+                self._by_username = {user.username.lower(): user for user in users if user.username}
+                self._token = token
+                self.reloads += 1
+                logger.debug(f"User directory loaded {len(users)} users")
+
+            self._checked_at = time.monotonic()
+        except Exception as e:
+            # Keep serving the last good copy (if any); retry on the next check, not the next request
+            logger.error(f"Error refreshing user directory: {e}")
+            self._checked_at = time.monotonic()
+            self._retry_at = self._checked_at + self.refresh_interval
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def add(self, user: User):
+        """Insert or replace a single user (e.g. right after add_user)"""
+        with self._lock:
+            by_id = dict(self._by_id)
+            by_id[user.user_id] = user
+            by_username = dict(self._by_username)
+            if user.username:
+                by_username[user.username.lower()] = user
+            self._by_id, self._by_username = by_id, by_username
+
+    def invalidate(self):
+        """Force a token check on the next ensure_fresh"""
+        self._checked_at = 0.0
+        self._retry_at = 0.0
+        self._token = None
+
+    def get(self, user_id: int) -> Optional[User]:
+        return self._by_id.get(user_id)
+
+    def full_name(self, user_id: int) -> Optional[str]:
+        user = self._by_id.get(user_id)
+        return f"{user.first_name} {user.last_name}" if user else None
+
+    def find_by_username(self, username: str) -> Optional[User]:
+        return self._by_username.get(username.lower()) if username else None
+
+    def ids_matching_name(self, term: str) -> List[int]:
+        """user_ids whose first or last name contains term (case-insensitive)"""
+        term = term.lower()
+        return [user.user_id for user in self._by_id.values()
+                if term in (user.first_name or '').lower() or term in (user.last_name or '').lower()]
+
+    def stats(self) -> Dict:
+        return {'users': len(self._by_id), 'reloads': self.reloads}
+
+
+# Shared by every NearMissDatabase instance in the process
+user_directory = UserDirectory()
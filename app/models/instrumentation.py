@@ -0,0 +1,258 @@
+"""
+Query instrumentation for NEARMISS System
+Per-query latency histograms, row counts, connection acquire time and a slow-query log
+for every cursor handed out by the connection pool
+"""
+import re
+import sys
+import threading
+import logging
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Dedicated log for statements slower than QueryStats.slow_threshold (handler set up in create_app)
+slow_query_logger = logging.getLogger('nearmiss.slow_queries')
+
+# Histogram bucket upper bounds in seconds; the last bucket is everything above
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def redact_params(params) -> str:
+    """Describe query parameters by type only, so values never reach the logs"""
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: <{type(value).__name__}>" for key, value in params.items()) + "}"
+    return "(" + ", ".join(f"<{type(value).__name__}>" for value in params) + ")"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (not thread-safe; QueryStats holds the lock)"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def copy(self) -> 'Histogram':
+        copy = Histogram()
+        copy.counts, copy.count, copy.total, copy.max = list(self.counts), self.count, self.total, self.max
+        return copy
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (max for the overflow bucket)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, self.counts):
+            seen += bucket
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self) -> List[int]:
+        """Counts at or below each bound in LATENCY_BUCKETS, then the total (+Inf)"""
+        running = 0
+        result = []
+        for bucket in self.counts:
+            running += bucket
+            result.append(running)
+        return result
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            'p95_ms': round(self.quantile(0.95) * 1000, 2),
+            'max_ms': round(self.max * 1000, 2),
+            'total_ms': round(self.total * 1000, 1)
+        }
+
+
+class QueryStats:
+    """
+    Process-wide query counters, keyed by query name (the calling method unless the
+    cursor sets query_name). Also tracks pool acquire time and queries per request.
+    """
+
+    def __init__(self, slow_threshold: float = 0.5):
+        self.slow_threshold = slow_threshold
+        self._queries = {}
+        self._acquire = Histogram()
+        self._requests = {'requests': 0, 'queries': 0, 'max_queries': 0, 'query_time': 0.0}
+        self._slow = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _entry(self, name: str) -> Dict:
+        entry = self._queries.get(name)
+        if entry is None:
+            entry = self._queries[name] = {'latency': Histogram(), 'rows': 0, 'errors': 0}
+        return entry
+
+    def record(self, name: str, seconds: float, sql: str = None, params=None, error: bool = False):
+        """Record one execute() call"""
+        with self._lock:
+            entry = self._entry(name)
+            entry['latency'].observe(seconds)
+            if error:
+                entry['errors'] += 1
+            slow = self.slow_threshold is not None and seconds >= self.slow_threshold
+            if slow:
+                self._slow += 1
+
+        if getattr(self._local, 'active', False):
+            self._local.queries += 1
+            self._local.query_time += seconds
+
+        if slow:
+            statement = _WHITESPACE_RE.sub(" ", sql or "").strip()[:1000]
+            slow_query_logger.warning(f"{seconds * 1000:.1f} ms {name}{' (failed)' if error else ''}: "
+                                      f"{statement} params={redact_params(params)}")
+
+    def add_rows(self, name: str, rows: int):
+        """Count rows fetched for a query"""
+        with self._lock:
+            self._entry(name)['rows'] += rows
+
+    def record_acquire(self, seconds: float):
+        """Record time spent waiting for a pooled connection"""
+        with self._lock:
+            self._acquire.observe(seconds)
+
+    def start_request(self):
+        """Begin counting queries for the current thread's request"""
+        self._local.active = True
+        self._local.queries = 0
+        self._local.query_time = 0.0
+
+    def finish_request(self) -> Optional[tuple]:
+        """Stop counting; returns (queries, seconds) for the request, or None if none was started"""
+        if not getattr(self._local, 'active', False):
+            return None
+        self._local.active = False
+        queries, query_time = self._local.queries, self._local.query_time
+        with self._lock:
+            self._requests['requests'] += 1
+            self._requests['queries'] += queries
+            self._requests['query_time'] += query_time
+            if queries > self._requests['max_queries']:
+                self._requests['max_queries'] = queries
+        return queries, query_time
+
+    def histograms(self) -> Dict[str, Histogram]:
+        """Copies of the per-query latency histograms (for exporters)"""
+        with self._lock:
+            return {name: entry['latency'].copy() for name, entry in self._queries.items()}
+
+    def acquire_histogram(self) -> Histogram:
+        """Copy of the pool acquire-time histogram"""
+        with self._lock:
+            return self._acquire.copy()
+
+    def stats(self) -> Dict:
+        """Per-query summaries (slowest total first) plus acquire and per-request aggregates"""
+        with self._lock:
+            queries = [dict(entry['latency'].summary(), name=name, rows=entry['rows'], errors=entry['errors'])
+                       for name, entry in self._queries.items()]
+            acquire = self._acquire.summary()
+            requests = dict(self._requests)
+            slow = self._slow
+
+        queries.sort(key=lambda query: -query['total_ms'])
+        served = requests['requests']
+        requests['avg_queries'] = round(requests['queries'] / served, 2) if served else 0.0
+        requests['avg_query_ms'] = round(requests.pop('query_time') / served * 1000, 2) if served else 0.0
+        return {
+            'queries': queries,
+            'acquire': acquire,
+            'requests': requests,
+            'slow_queries': slow,
+            'slow_threshold_ms': round(self.slow_threshold * 1000) if self.slow_threshold is not None else None
+        }
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._acquire = Histogram()
+            self._requests = {'requests': 0, 'queries': 0, 'max_queries': 0, 'query_time': 0.0}
+            self._slow = 0
+
+
+class InstrumentedCursor:
+    """
+    pytds cursor wrapper that times execute()/executemany() and counts fetched rows.
+    Latency covers the execute call (server time plus the first packet of results);
+    set query_name before executing to override the caller-derived name.
+    """
+
+    def __init__(self, raw, stats: QueryStats):
+        self._raw = raw
+        self._stats = stats
+        self._current = None
+        self.query_name = None
+
+    def _caller(self) -> str:
+        # 0 = _caller, 1 = execute/executemany, 2 = the code that issued the query
+        code = sys._getframe(2).f_code
+        return getattr(code, 'co_qualname', code.co_name)
+
+    def _timed(self, method, name: str, operation: str, params):
+        self._current = name
+        started = time.perf_counter()
+        try:
+            result = method(operation, params)
+        except Exception:
+            self._stats.record(name, time.perf_counter() - started, operation, params, error=True)
+            raise
+        self._stats.record(name, time.perf_counter() - started, operation, params)
+        return result
+
+    def execute(self, operation, params=None):
+        return self._timed(self._raw.execute, self.query_name or self._caller(), operation, params)
+
+    def executemany(self, operation, params_seq):
+        return self._timed(self._raw.executemany, self.query_name or self._caller(), operation, params_seq)
+
+    def fetchone(self):
+        row = self._raw.fetchone()
+        if row is not None and self._current:
+            self._stats.add_rows(self._current, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._raw.fetchmany(size) if size is not None else self._raw.fetchmany()
+        if rows and self._current:
+            self._stats.add_rows(self._current, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._raw.fetchall()
+        if rows and self._current:
+            self._stats.add_rows(self._current, len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+# Shared by every pool in the process
+query_stats = QueryStats()
@@ -0,0 +1,322 @@
+"""
+Schema migrations for NEARMISS System
+Versioned, recorded schema changes applied on top of the create_tables baseline
+"""
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# SERVERPROPERTY('EngineEdition'): 3 = Enterprise/Developer, 5 = Azure SQL Database, 8 = Managed Instance
+ONLINE_INDEX_EDITIONS = (3, 5, 8)
+
+
+def _index(name: str, table: str, definition: str) -> str:
+    """CREATE INDEX guarded by existence so a half-applied version can be re-run"""
+    return f"""
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{name}' AND object_id = OBJECT_ID('{table}'))
+        CREATE INDEX {name} ON {table} {definition} {{online}}
+    """
+
+
+# (version, description, statements). Statements may use {online}, which expands to
+# WITH (ONLINE = ON) where the server edition supports online index builds.
+# Append new versions at the end; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "Report listing, filter and foreign key indexes", [
+        _index('IX_near_miss_reports_created', 'near_miss_reports',
+               "(created_date DESC, report_id DESC) INCLUDE (plant, date_occurred, employee_id)"),
+        _index('IX_near_miss_reports_plant_date', 'near_miss_reports',
+               "(plant, date_occurred) INCLUDE (created_date, employee_id)"),
+        _index('IX_near_miss_reports_employee', 'near_miss_reports', "(employee_id)"),
+        _index('IX_near_miss_reports_dept', 'near_miss_reports', "(dept_id)"),
+        _index('IX_near_miss_reports_hazard_type', 'near_miss_reports', "(hazard_type_id)"),
+        _index('IX_near_miss_reports_action', 'near_miss_reports', "(immediate_action_id)"),
+        _index('IX_near_miss_reports_responsible', 'near_miss_reports', "(responsible_party_id)"),
+        _index('IX_near_miss_reports_completed_by', 'near_miss_reports', "(completed_by_id)"),
+        _index('IX_near_miss_reports_created_by', 'near_miss_reports', "(created_by_id)"),
+        _index('IX_attachments_report', 'attachments', "(report_id)"),
+        _index('IX_edit_history_report', 'edit_history', "(report_id, changed_date)"),
+    ]),
+    (2, "Lookup table indexes", [
+        _index('IX_users_plant_name', 'users',
+               "(plant, last_name, first_name) INCLUDE (username, email, is_admin, is_supervisor)"),
+        _index('IX_departments_plant', 'departments', "(plant, dept_name)"),
+        _index('IX_equipment_plant_dept', 'equipment', "(plant, dept_id) INCLUDE (equip_name)"),
+    ]),
+    (3, "Email queue and history indexes", [
+        _index('IX_email_queue_status_created', 'email_queue',
+               "(status, created_date) INCLUDE (retry_count, to_address)"),
+        _index('IX_email_queue_report', 'email_queue', "(report_id)"),
+        _index('IX_email_history_report', 'email_history', "(report_id)"),
+    ]),
+    (4, "Client idempotency key for bulk report ingest", [
+        """
+        IF COL_LENGTH('near_miss_reports', 'client_key') IS NULL
+        ALTER TABLE near_miss_reports ADD client_key NVARCHAR(64) NULL
+        """,
+        """
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_near_miss_reports_client_key')
+        CREATE UNIQUE INDEX UX_near_miss_reports_client_key ON near_miss_reports (client_key)
+        WHERE client_key IS NOT NULL {online}
+        """,
+    ]),
+    (5, "Dashboard rollup table report_stats_daily", [
+        # One row per (submission day, plant, department, hazard type, assessment);
+        # 0 / '' stand in for a missing department, hazard type or assessment
+        """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='report_stats_daily' AND xtype='U')
+        CREATE TABLE report_stats_daily (
+            stat_date DATE NOT NULL,
+            plant NVARCHAR(20) NOT NULL,
+            dept_id INT NOT NULL,
+            hazard_type_id INT NOT NULL,
+            hazard_assessment NVARCHAR(20) NOT NULL,
+            report_count INT NOT NULL DEFAULT 0,
+            open_count INT NOT NULL DEFAULT 0,
+            CONSTRAINT PK_report_stats_daily
+                PRIMARY KEY (stat_date, plant, dept_id, hazard_type_id, hazard_assessment)
+        )
+        """,
+        # Backfill from existing reports (NearMissDatabase.rebuild_report_stats does the same later)
+        """
+        IF NOT EXISTS (SELECT 1 FROM report_stats_daily)
+        INSERT INTO report_stats_daily (stat_date, plant, dept_id, hazard_type_id, hazard_assessment,
+                                        report_count, open_count)
+        SELECT CAST(created_date AS DATE), plant, ISNULL(dept_id, 0), ISNULL(hazard_type_id, 0),
+               ISNULL(hazard_assessment, ''), COUNT(*),
+               SUM(CASE WHEN corrective_action_completed = 1 THEN 0 ELSE 1 END)
+        FROM near_miss_reports
+        GROUP BY CAST(created_date AS DATE), plant, ISNULL(dept_id, 0), ISNULL(hazard_type_id, 0),
+                 ISNULL(hazard_assessment, '')
+        """,
+    ]),
+    (6, "Row version on near_miss_reports for optimistic concurrency", [
+        """
+        IF COL_LENGTH('near_miss_reports', 'row_version') IS NULL
+        ALTER TABLE near_miss_reports ADD row_version ROWVERSION
+        """,
+    ]),
+    (7, "Archive tables for closed reports and their history", [
+        # Same columns as the hot tables, without identity, defaults or foreign keys
+        # (rows arrive via NearMissDatabase.archive_reports, already validated)
+        """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='near_miss_reports_archive' AND xtype='U')
+        CREATE TABLE near_miss_reports_archive (
+            report_id INT NOT NULL PRIMARY KEY,
+            date_occurred DATE NOT NULL,
+            time_occurred TIME NOT NULL,
+            employee_id INT NOT NULL,
+            plant NVARCHAR(20) NOT NULL,
+            dept_id INT NULL,
+            equipment_area NVARCHAR(100) NULL,
+            hazard_assessment NVARCHAR(20) NULL,
+            hazard_type_id INT NULL,
+            custom_hazard_type NVARCHAR(100) NULL,
+            description NVARCHAR(400) NOT NULL,
+            immediate_action_id INT NULL,
+            corrective_action NVARCHAR(MAX) NULL,
+            responsible_party_id INT NULL,
+            corrective_action_completed BIT NULL,
+            completion_date DATE NULL,
+            completed_by_id INT NULL,
+            created_by_id INT NOT NULL,
+            created_date DATETIME NULL,
+            client_key NVARCHAR(64) NULL,
+            row_version BINARY(8) NULL,
+            archived_date DATETIME NOT NULL DEFAULT GETDATE()
+        )
+        """,
+        """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='edit_history_archive' AND xtype='U')
+        CREATE TABLE edit_history_archive (
+            history_id INT NOT NULL PRIMARY KEY,
+            report_id INT NOT NULL,
+            user_id INT NOT NULL,
+            field_changed NVARCHAR(50) NOT NULL,
+            old_value NVARCHAR(500) NULL,
+            new_value NVARCHAR(500) NULL,
+            changed_date DATETIME NULL
+        )
+        """,
+        """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='email_history_archive' AND xtype='U')
+        CREATE TABLE email_history_archive (
+            history_id INT NOT NULL PRIMARY KEY,
+            to_address NVARCHAR(100) NOT NULL,
+            subject NVARCHAR(200) NOT NULL,
+            report_id INT NULL,
+            sent_date DATETIME NULL,
+            status NVARCHAR(20) NOT NULL
+        )
+        """,
+        """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='attachments_archive' AND xtype='U')
+        CREATE TABLE attachments_archive (
+            attachment_id INT NOT NULL PRIMARY KEY,
+            report_id INT NOT NULL,
+            filename NVARCHAR(255) NOT NULL,
+            file_path NVARCHAR(500) NOT NULL,
+            uploaded_date DATETIME NULL
+        )
+        """,
+        _index('IX_near_miss_reports_archive_created', 'near_miss_reports_archive',
+               "(created_date DESC, report_id DESC) INCLUDE (plant, date_occurred, employee_id)"),
+        _index('IX_near_miss_reports_archive_plant_date', 'near_miss_reports_archive',
+               "(plant, date_occurred) INCLUDE (created_date, employee_id)"),
+        _index('IX_near_miss_reports_archive_employee', 'near_miss_reports_archive', "(employee_id)"),
+        _index('IX_edit_history_archive_report', 'edit_history_archive', "(report_id, changed_date)"),
+        _index('IX_email_history_archive_report', 'email_history_archive', "(report_id)"),
+        _index('IX_attachments_archive_report', 'attachments_archive', "(report_id)"),
+        # Archival job: closed reports by age
+        _index('IX_near_miss_reports_completed_created', 'near_miss_reports',
+               "(corrective_action_completed, created_date)"),
+    ]),
+    (8, "SMTP messages-per-connection cap in email_config", [
+        """
+        IF COL_LENGTH('email_config', 'messages_per_connection') IS NULL
+        ALTER TABLE email_config ADD messages_per_connection INT NULL
+        """,
+    ]),
+    (9, "Email queue claim leases", [
+        """
+        IF COL_LENGTH('email_queue', 'lease_owner') IS NULL
+        ALTER TABLE email_queue ADD lease_owner NVARCHAR(100) NULL, lease_expires DATETIME NULL
+        """,
+        # TEXT can't be returned by the claim's OUTPUT clause
+        """
+        IF EXISTS (SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('email_queue')
+                   AND name = 'body' AND system_type_id = TYPE_ID('text'))
+        ALTER TABLE email_queue ALTER COLUMN body NVARCHAR(MAX) NOT NULL
+        """,
+        # Expired-lease reclaim
+        """
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_email_queue_lease' AND object_id = OBJECT_ID('email_queue'))
+        CREATE INDEX IX_email_queue_lease ON email_queue (lease_expires)
+        WHERE status = 'sending' {online}
+        """,
+    ]),
+    (10, "Email queue priority lanes", [
+        """
+        IF COL_LENGTH('email_queue', 'lane') IS NULL
+        ALTER TABLE email_queue ADD lane NVARCHAR(10) NOT NULL
+            CONSTRAINT DF_email_queue_lane DEFAULT 'normal'
+        """,
+        # Per-lane oldest-first claims
+        _index('IX_email_queue_lane_status_created', 'email_queue',
+               "(lane, status, created_date) INCLUDE (retry_count)"),
+    ]),
+    (11, "Lookup change versions for cross-process cache invalidation", [
+        """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='lookup_versions' AND xtype='U')
+        CREATE TABLE lookup_versions (
+            table_name NVARCHAR(50) NOT NULL PRIMARY KEY,
+            version INT NOT NULL DEFAULT 0,
+            changed_date DATETIME DEFAULT GETDATE()
+        )
+        """,
+    ]),
+    (12, "Client idempotency key lookup on archived reports", [
+        """
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_near_miss_reports_archive_client_key')
+        CREATE UNIQUE INDEX UX_near_miss_reports_archive_client_key ON near_miss_reports_archive (client_key)
+        WHERE client_key IS NOT NULL {online}
+        """,
+    ]),
+    (13, "Report change tracking index for search index refreshes", [
+        _index('IX_near_miss_reports_row_version', 'near_miss_reports', "(row_version)"),
+    ]),
+]
+
+
+class MigrationRunner:
+    """Applies pending MIGRATIONS in order and records each version in schema_migrations"""
+
+    def __init__(self, db, migrations: list = None):
+        self.db = db
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda migration: migration[0])
+
+    def ensure_version_table(self, cursor):
+        cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='schema_migrations' AND xtype='U')
+            CREATE TABLE schema_migrations (
+                version INT PRIMARY KEY,
+                description NVARCHAR(200) NOT NULL,
+                applied_date DATETIME DEFAULT GETDATE()
+            )
+        """)
+
+    def supports_online_index(self, cursor) -> bool:
+        cursor.execute("SELECT CAST(SERVERPROPERTY('EngineEdition') AS INT)")
+        row = cursor.fetchone()
+        return bool(row) and row[0] in ONLINE_INDEX_EDITIONS
+
+    def applied_versions(self, cursor) -> set:
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+    def pending(self) -> List[int]:
+        """Versions not yet applied"""
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            self.ensure_version_table(cursor)
+            applied = self.applied_versions(cursor)
+            return [version for version, _, _ in self.migrations if version not in applied]
+        finally:
+            conn.close()
+
+    def run(self) -> List[int]:
+        """Apply every pending migration, each in its own transaction. Returns versions applied."""
+        conn = self.db.get_connection()
+        applied_now = []
+        try:
+            cursor = conn.cursor()
+            self.ensure_version_table(cursor)
+
+            # Serialise concurrent runners (e.g. two app hosts starting together)
+            cursor.execute("""
+                EXEC sp_getapplock @Resource = 'nearmiss_schema_migrations',
+                                   @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = 60000
+            """)
+
+            online = "WITH (ONLINE = ON)" if self.supports_online_index(cursor) else ""
+            applied = self.applied_versions(cursor)
+
+            for version, description, statements in self.migrations:
+                if version in applied:
+                    continue
+
+                logger.info(f"Applying migration {version}: {description}")
+                conn.autocommit = False
+                try:
+                    for statement in statements:
+                        cursor.execute(statement.format(online=online))
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (version, description)
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+
+                applied_now.append(version)
+
+            cursor.execute("EXEC sp_releaseapplock @Resource = 'nearmiss_schema_migrations', @LockOwner = 'Session'")
+
+            if applied_now:
+                logger.info(f"Applied migrations: {applied_now}")
+            else:
+                logger.info("Schema is up to date")
+            return applied_now
+
+        except Exception as e:
+            logger.error(f"Error applying migrations: {e}")
+            # Session-owned applock would otherwise survive on a pooled connection
+            conn.invalidate()
+            raise
+        finally:
+            conn.close()
@@ -0,0 +1,323 @@
+"""
+Connection pool for NEARMISS System
+Keeps authenticated SQL Server connections open between requests
+"""
+import threading
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import pytds
+
+from .instrumentation import InstrumentedCursor, query_stats
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout"""
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pytds connection.
+    close() hands the connection back to its pool instead of closing the socket,
+    so existing `finally: conn.close()` blocks keep working unchanged.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = created_at
+        self.last_used = time.monotonic()
+        self.broken = False
+        self._returned = False
+
+    def cursor(self):
+        if self._returned:
+            raise pytds.InterfaceError("Connection already returned to pool")
+        return InstrumentedCursor(self._raw.cursor(), query_stats)
+
+    def close(self):
+        """Return connection to the pool (safe to call more than once)"""
+        if not self._returned:
+            self._returned = True
+            self._pool.release(self)
+
+    def invalidate(self):
+        """Mark the connection unusable so the pool closes it on return"""
+        self.broken = True
+
+    @property
+    def autocommit(self) -> bool:
+        return self._raw.autocommit
+
+    @autocommit.setter
+    def autocommit(self, value: bool):
+        # Must reach the driver: a plain attribute on the wrapper would leave every
+        # "transaction" committing statement by statement
+        self._raw.autocommit = value
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of pytds connections.
+
+    min_size          connections kept open even when idle
+    max_size          hard cap on open connections
+    checkout_timeout  seconds to wait for a free connection before PoolTimeout
+    idle_timeout      idle connections above min_size are closed after this many seconds
+    max_lifetime      connections are recycled after this many seconds regardless of use
+    validate          run a ping on checkout before handing the connection out
+    """
+
+    def __init__(self, connect_params: Dict, min_size: int = 2, max_size: int = 20,
+                 checkout_timeout: float = 10, idle_timeout: float = 300,
+                 max_lifetime: float = 1800, validate: bool = True):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: min_size=%s max_size=%s" % (min_size, max_size))
+
+        self.connect_params = connect_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.validate = validate
+
+        self._idle = deque()
+        self._open_count = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+            'failed_validations': 0,
+            'wait_time_total': 0.0
+        }
+
+    def _connect(self):
+        return pytds.connect(**self.connect_params)
+
+    def _ping(self, raw) -> bool:
+        try:
+            cursor = raw.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed validation: {e}")
+            return False
+
+    def _discard(self, raw):
+        """Close a raw connection (lock not held); caller must already have adjusted _open_count"""
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats['closed'] += 1
+
+    def _expired(self, pooled: PooledConnection, now: float) -> bool:
+        return self.max_lifetime and now - pooled.created_at >= self.max_lifetime
+
+    def _sweep_idle(self, now: float) -> list:
+        """Pop expired/idle connections (lock held). Returns raw connections to close."""
+        stale = []
+        keep = deque()
+        while self._idle:
+            pooled = self._idle.popleft()
+            too_idle = (self.idle_timeout and now - pooled.last_used >= self.idle_timeout
+                        and self._open_count - len(stale) > self.min_size)
+            if self._expired(pooled, now) or too_idle:
+                stale.append(pooled._raw)
+            else:
+                keep.append(pooled)
+        self._idle = keep
+        self._open_count -= len(stale)
+        return stale
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Check out a validated connection, opening a new one if below max_size"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            pooled = None
+            create = False
+            stale = []
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise pytds.InterfaceError("Connection pool is closed")
+
+                    now = time.monotonic()
+                    swept = self._sweep_idle(now)
+                    if swept:
+                        stale.extend(swept)
+                        self._cond.notify(len(swept))
+
+                    if self._idle:
+                        # LIFO keeps the warmest connections busy and lets the rest idle out
+                        pooled = self._idle.pop()
+                        break
+                    if self._open_count < self.max_size:
+                        self._open_count += 1
+                        create = True
+                        break
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        logger.error(f"Connection pool exhausted: {self._open_count} open, "
+                                     f"waited {timeout}s")
+                        raise PoolTimeout(f"No database connection available within {timeout}s")
+                    self._cond.wait(remaining)
+
+                self._in_use += 1
+
+            for raw in stale:
+                self._discard(raw)
+
+            if create:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open_count -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+                pooled = PooledConnection(self, raw, time.monotonic())
+            elif self.validate and not self._ping(pooled._raw):
+                with self._cond:
+                    self._open_count -= 1
+                    self._in_use -= 1
+                    self._stats['failed_validations'] += 1
+                    self._cond.notify()
+                self._discard(pooled._raw)
+                continue
+            else:
+                # Fresh wrapper per checkout so a stale reference can't return it twice
+                pooled = PooledConnection(self, pooled._raw, pooled.created_at)
+
+            pooled.last_used = time.monotonic()
+            with self._cond:
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += pooled.last_used - started
+            query_stats.record_acquire(pooled.last_used - started)
+            return pooled
+
+    def release(self, pooled: PooledConnection):
+        """Return a connection to the idle set, or close it if it is no longer fit for reuse"""
+        raw = pooled._raw
+        reusable = not pooled.broken
+
+        if reusable:
+            try:
+                # Never leak an open transaction to the next borrower
+                if not raw.autocommit:
+                    raw.rollback()
+                    raw.autocommit = self.connect_params.get('autocommit', False)
+            except Exception as e:
+                logger.warning(f"Discarding pooled connection after reset failure: {e}")
+                reusable = False
+
+        now = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if reusable and not self._closed and not self._expired(pooled, now):
+                pooled.last_used = now
+                self._idle.append(pooled)
+                raw = None
+            else:
+                self._open_count -= 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def warm(self) -> int:
+        """Open connections until min_size are available. Returns number opened."""
+        opened = 0
+        while True:
+            with self._cond:
+                if self._closed or self._open_count >= self.min_size:
+                    return opened
+                self._open_count += 1
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open_count -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+                self._idle.appendleft(PooledConnection(self, raw, time.monotonic()))
+                self._cond.notify()
+            opened += 1
+
+    def close_all(self):
+        """Close idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = [pooled._raw for pooled in self._idle]
+            self._idle.clear()
+            self._open_count -= len(idle)
+            self._cond.notify_all()
+        for raw in idle:
+            self._discard(raw)
+
+    def stats(self) -> Dict:
+        """Snapshot of pool utilisation"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'open': self._open_count,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size
+            })
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connect_params: Dict, **pool_params) -> ConnectionPool:
+    """
+    Return the process-wide pool for a server/database/login.
+    AuthManager, EmailManager and the app each build their own NearMissDatabase,
+    so pools are shared by target rather than owned by an instance.
+    """
+    key = (connect_params.get('dsn'), connect_params.get('port'),
+           connect_params.get('database'), connect_params.get('user'))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(connect_params, **pool_params)
+            _pools[key] = pool
+        return pool
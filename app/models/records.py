@@ -0,0 +1,129 @@
+"""
+Row types for NEARMISS System
+Compact, immutable __slots__ records returned by NearMissDatabase listings
+"""
+from typing import Dict
+
+
+class Record:
+    """
+    Immutable row with one slot per column (no per-instance __dict__).
+
+    Supports attribute access for Jinja templates (report.plant) and a read-only
+    mapping interface (report['plant'], .get(), .keys(), dict(report)) for code
+    that was written against the old per-row dicts.
+    Subclasses list their columns in __slots__, in SELECT order.
+    """
+    __slots__ = ()
+    _keys = {}.keys()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Shared set-like view of the field names (csv.DictWriter needs keys() - set)
+        cls._keys = dict.fromkeys(cls.__slots__).keys()
+
+    def __init__(self, *values, **fields):
+        if len(values) > len(self.__slots__):
+            raise TypeError(f"{type(self).__name__} takes at most {len(self.__slots__)} values")
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+        for name in self.__slots__[len(values):]:
+            object.__setattr__(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"{type(self).__name__} has no fields {sorted(fields)}")
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a DB row whose columns are in __slots__ order"""
+        return cls(*row)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._keys else default
+
+    def keys(self):
+        return self._keys
+
+    def values(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def _asdict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def _replace(self, **changes):
+        """Copy with some fields changed"""
+        return type(self)(**dict(self._asdict(), **changes))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.values() == other.values()
+
+    def __hash__(self):
+        return hash((type(self), tuple(self.values())))
+
+    def __reduce__(self):
+        return (type(self), tuple(self.values()))
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Report(Record):
+    __slots__ = (
+        'report_id', 'date_occurred', 'time_occurred', 'plant', 'employee_name',
+        'dept_name', 'equipment_area', 'hazard_assessment', 'hazard_type',
+        'custom_hazard_type', 'description', 'action_description', 'corrective_action',
+        'responsible_party', 'corrective_action_completed', 'completion_date',
+        'completed_by', 'created_by', 'created_date',
+        'employee_id', 'dept_id', 'hazard_type_id', 'immediate_action_id',
+        'responsible_party_id', 'completed_by_id', 'created_by_id', 'row_version'
+    )
+
+
+class User(Record):
+    __slots__ = ('user_id', 'first_name', 'last_name', 'username', 'email', 'plant', 'is_admin', 'is_supervisor')
+
+
+class Department(Record):
+    __slots__ = ('dept_id', 'plant', 'dept_name')
+
+
+class Equipment(Record):
+    __slots__ = ('equip_id', 'plant', 'dept_id', 'equip_name', 'dept_name')
+
+
+class HazardType(Record):
+    __slots__ = ('hazard_type_id', 'hazard_type')
+
+
+class ImmediateAction(Record):
+    __slots__ = ('action_id', 'action_description')
+
+
+class LookupBundle(Record):
+    """Lookup lists loaded together by NearMissDatabase.load_lookups (None = not requested)"""
+    __slots__ = ('users', 'departments', 'equipment', 'hazard_types', 'immediate_actions')
@@ -0,0 +1,90 @@
+"""
+In-process lookup cache for NEARMISS System
+TTL + LRU cache used for dropdown/reference data that rarely changes
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a time-to-live per key.
+
+    Keys are tuples whose first element names the table, e.g. ('departments', 'Red Oak'),
+    so invalidate('departments') drops every plant while invalidate('users', 'Telford')
+    drops only that plant's entry.
+    """
+
+    def __init__(self, max_entries: int = 256, default_ttl: float = 600):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return cached value, or None on miss/expiry"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        """Store value for ttl seconds (default_ttl when not given)"""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, *prefix) -> int:
+        """Drop every key starting with prefix (all keys when no prefix). Returns count removed."""
+        with self._lock:
+            if not prefix:
+                removed = len(self._data)
+                self._data.clear()
+            else:
+                size = len(prefix)
+                stale = [key for key in self._data
+                         if isinstance(key, tuple) and key[:size] == prefix]
+                for key in stale:
+                    del self._data[key]
+                removed = len(stale)
+            self._stats['invalidations'] += removed
+            return removed
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._data)
+            stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+# Shared by every NearMissDatabase instance in the process so invalidation is global
+lookup_cache = TTLCache(max_entries=256, default_ttl=600)
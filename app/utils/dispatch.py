@@ -0,0 +1,139 @@
+"""
+Parallel email dispatch for NEARMISS System
+A small worker pool for draining the email queue: each worker holds its own SMTP
+session, all workers share a global send rate limit, and the number of concurrent
+connections to one SMTP server is capped process-wide
+"""
+import threading
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: at most rate acquisitions per second, with bursts up to burst"""
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = float(rate)
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Process-wide per SMTP server, so overlapping queue runs (daemon thread, admin button) share them
+_server_slots = {}
+_server_rates = {}
+_registry_lock = threading.Lock()
+
+
+def server_slots(server: str, limit: int) -> threading.BoundedSemaphore:
+    """Semaphore capping concurrent connections to one SMTP server"""
+    with _registry_lock:
+        slots = _server_slots.get(server)
+        if slots is None or slots.limit != limit:
+            slots = threading.BoundedSemaphore(limit)
+            slots.limit = limit
+            _server_slots[server] = slots
+        return slots
+
+
+def server_rate(server: str, rate: float) -> Optional[TokenBucket]:
+    """Shared send-rate limiter for one SMTP server (None when unlimited)"""
+    if not rate:
+        return None
+    with _registry_lock:
+        bucket = _server_rates.get(server)
+        if bucket is None or bucket.rate != rate:
+            bucket = _server_rates[server] = TokenBucket(rate)
+        return bucket
+
+
+def dispatch(next_chunk: Callable[[], List], send: Callable, open_session: Callable, on_chunk: Callable,
+             workers: int = 1, slots: threading.BoundedSemaphore = None, rate: TokenBucket = None) -> Dict:
+    """
+    Send items with up to workers threads.
+
+    Each worker holds one of the server slots while it runs and takes work from
+    next_chunk() (thread-safe; an empty list means no more work) until it runs dry. It opens
+    one session (open_session()) on its first chunk and reuses it for the rest;
+    send(session, item) returns True on success. on_chunk(results) is called after every
+    chunk with [(item, ok)] so the caller can record outcomes in one write per chunk.
+    Returns {'sent', 'failed', 'workers', 'seconds'}.
+    """
+    totals = {'sent': 0, 'failed': 0}
+    totals_lock = threading.Lock()
+    started = time.monotonic()
+
+    def worker():
+        if slots is not None:
+            slots.acquire()
+        session = None
+        try:
+            while True:
+                try:
+                    chunk = next_chunk()
+                except Exception as e:
+                    logger.error(f"Error fetching dispatch work: {e}")
+                    return
+                if not chunk:
+                    return
+                if session is None:
+                    session = open_session()
+
+                results = []
+                for item in chunk:
+                    if rate is not None:
+                        rate.acquire()
+                    try:
+                        ok = bool(send(session, item))
+                    except Exception as e:
+                        logger.error(f"Dispatch send failed: {e}")
+                        ok = False
+                    results.append((item, ok))
+
+                try:
+                    on_chunk(results)
+                except Exception as e:
+                    # Outcomes couldn't be stored; the caller's retry path picks the items up again
+                    logger.error(f"Error recording dispatch results for {len(results)} items: {e}")
+                sent = sum(1 for _, ok in results if ok)
+                with totals_lock:
+                    totals['sent'] += sent
+                    totals['failed'] += len(results) - sent
+        finally:
+            if session is not None:
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            if slots is not None:
+                slots.release()
+
+    worker_count = max(1, workers)
+    if worker_count == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker, name=f'email-dispatch-{number}', daemon=True)
+                   for number in range(worker_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return dict(totals, workers=worker_count, seconds=round(time.monotonic() - started, 3))
@@ -2,20 +2,62 @@
 Email notification system for NEARMISS
 Handles SMTP configuration, email queue, and sending notifications
 """
+import os
+import uuid
+import socket
 import smtplib
 import logging
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from typing import Dict, List, Optional
 from ..models.database import NearMissDatabase
+from .smtp_session import SMTPSession
+from .dispatch import dispatch, server_slots, server_rate
+from .wakeup import notify as notify_queue
 
 logger = logging.getLogger(__name__)
 
 class EmailManager:
+    # Reload email_config this often, so a long-running process (the queue daemon, every web
+    # worker) picks up settings saved elsewhere; after a failed load, retry after CONFIG_RETRY_SECONDS
+    CONFIG_REFRESH_SECONDS = 60
+    CONFIG_RETRY_SECONDS = 30
+    
     def __init__(self):
         self.db = NearMissDatabase()
-        self.config = self.load_email_config()
+        # Loaded on first use (or by the startup warm-up), so building the manager needs no DB round trip
+        self._config = None
+        self._config_load_at = 0.0
+        self._config_lock = threading.Lock()
+    
+    @property
+    def config(self) -> Dict:
+        """
+        SMTP settings from email_config, reloaded every CONFIG_REFRESH_SECONDS; the last good
+        settings (or {} if there are none) while the database can't be read
+        """
+        if time.monotonic() >= self._config_load_at:
+            with self._config_lock:
+                if time.monotonic() >= self._config_load_at:
+                    config = self.load_email_config()
+                    if config:
+                        if self._config is not None and config != self._config:
+                            # Sessions are opened per queue run, so the next run connects with these
+                            logger.info(f"Email configuration changed: {config.get('smtp_server')}:"
+                                        f"{config.get('smtp_port')}")
+                        self._config = config
+                        self._config_load_at = time.monotonic() + self.CONFIG_REFRESH_SECONDS
+                    else:
+                        self._config_load_at = time.monotonic() + self.CONFIG_RETRY_SECONDS
+        return self._config or {}
+    
+    @config.setter
+    def config(self, value: Dict):
+        self._config = value or None
+        self._config_load_at = time.monotonic() + self.CONFIG_REFRESH_SECONDS if value else 0.0
     
     def load_email_config(self) -> Dict:
         """Load email configuration from database"""
@@ -34,7 +76,9 @@ class EmailManager:
                     'auth_type': row[5],
                     'use_auth': row[6],
                     'timeout': row[7],
-                    'retries': row[8]
+                    'retries': row[8],
+                    # Added by migration 8
+                    'messages_per_connection': row[9] if len(row) > 9 else None
                 }
             else:
                 # Default configuration
@@ -46,7 +90,8 @@ class EmailManager:
                     'auth_type': 'STARTTLS',
                     'use_auth': True,
                     'timeout': 30,
-                    'retries': 3
+                    'retries': 3,
+                    'messages_per_connection': SMTPSession.DEFAULT_MAX_MESSAGES
                 }
         except Exception as e:
             logger.error(f"Error loading email config: {e}")
@@ -61,8 +106,8 @@ class EmailManager:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO email_config (smtp_server, smtp_port, username, password_encrypted, 
-                                        auth_type, use_auth, timeout, retries)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                                        auth_type, use_auth, timeout, retries, messages_per_connection)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (
                 config.get('smtp_server'),
                 config.get('smtp_port', 587),
@@ -71,7 +116,8 @@ class EmailManager:
                 config.get('auth_type', 'STARTTLS'),
                 config.get('use_auth', True),
                 config.get('timeout', 30),
-                config.get('retries', 3)
+                config.get('retries', 3),
+                config.get('messages_per_connection', SMTPSession.DEFAULT_MAX_MESSAGES)
             ))
             logger.info("Email configuration saved successfully")
             return True
@@ -81,17 +127,28 @@ class EmailManager:
         finally:
             conn.close()
     
-    def queue_email(self, to_address: str, subject: str, body: str, report_id: int = None) -> bool:
-        """Add email to queue for sending"""
+    def queue_email(self, to_address: str, subject: str, body: str, report_id: int = None,
+                    notify: bool = True, lane: str = None) -> bool:
+        """
+        Add email to queue for sending in the given priority lane (see LANE_WEIGHTS);
+        notify wakes the queue processor to send it now
+        """
+        if lane not in self.LANE_WEIGHTS:
+            if lane is not None:
+                logger.warning(f"Unknown email lane {lane!r}, queuing as {self.DEFAULT_LANE}")
+            lane = self.DEFAULT_LANE
+        
         conn = self.db.get_connection()
         try:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO email_queue (to_address, subject, body, report_id, status, created_date)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (to_address, subject, body, report_id, 'pending', datetime.now()))
+                INSERT INTO email_queue (to_address, subject, body, report_id, status, created_date, lane)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (to_address, subject, body, report_id, 'pending', datetime.now(), lane))
             
-            logger.info(f"Email queued for {to_address}: {subject}")
+            logger.info(f"Email queued for {to_address} ({lane}): {subject}")
+            if notify:
+                notify_queue()
             return True
         except Exception as e:
             logger.error(f"Error queuing email: {e}")
@@ -99,87 +156,270 @@ class EmailManager:
         finally:
             conn.close()
     
-    def send_queued_emails(self) -> int:
-        """Send all pending emails in queue"""
-        conn = self.db.get_connection()
-        sent_count = 0
+    # Queue run dispatch: sender threads, rows per chunk (one claim and one status write each), and
+    # the limits applied per SMTP server across all runs in the process (Exchange Online allows 3
+    # concurrent SMTP AUTH connections per mailbox)
+    DISPATCH_WORKERS = 4
+    DISPATCH_CHUNK_SIZE = 25
+    MAX_CONNECTIONS_PER_SERVER = 3
+    MAX_SENDS_PER_SECOND = 20
+    # A claimed chunk must be sent and recorded within its lease, or another run takes it over.
+    # This is the floor; lease_seconds() stretches it to the chunk's worst-case send time.
+    LEASE_SECONDS = 600
+    
+    # Priority lanes (email_queue.lane), highest first, with their scheduling weights: while both
+    # have a backlog, each claimed chunk is 4 parts high to 1 part normal
+    LANE_WEIGHTS = {'high': 4, 'normal': 1}
+    DEFAULT_LANE = 'normal'
+    
+    # Rows a run may claim: pending, or claimed by a run whose lease ran out (crashed or hung).
+    # An expired lease is an abandoned attempt, so reclaiming one uses up a retry.
+    CLAIMABLE = """
+        retry_count + CASE WHEN status = 'sending' THEN 1 ELSE 0 END < %s
+        AND (status = 'pending' OR (status = 'sending' AND lease_expires < GETDATE()))
+    """
+    
+    @staticmethod
+    def new_lease_owner() -> str:
+        """Unique claim owner for one queue run: host:pid:random"""
+        return f"{socket.gethostname()[:60]}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+    
+    def send_queued_emails(self, workers: int = None, rate: float = None) -> int:
+        """
+        Send all pending emails in queue.
+        Workers claim rows a chunk at a time under a lease, so any number of runs (daemons on
+        several hosts, the admin button) can drain the queue together without sending a row
+        twice. Up to workers senders run in parallel, each over its own SMTP session, within
+        the per-server connection cap and send rate. Returns the number sent.
+        """
+        if not self.config or not self.config.get('smtp_server'):
+            logger.error("Email configuration not available")
+            return 0
+        
+        claimable = self.count_claimable_emails()
+        if not claimable:
+            return 0
+        
+        owner = self.new_lease_owner()
+        server = self.config['smtp_server']
+        sessions = []
+        workers = min(workers or self.DISPATCH_WORKERS, -(-claimable // self.DISPATCH_CHUNK_SIZE))
+        
+        def next_chunk():
+            return self._claim_emails(owner, self.DISPATCH_CHUNK_SIZE)
+        
+        def open_session():
+            session = self.open_smtp_session()
+            sessions.append(session)
+            return session
         
+        def send(session, email):
+            queue_id, to_address, subject, body, report_id, retry_count = email
+            return self.send_email(to_address, subject, body, session=session)
+        
+        def record(results):
+            self._record_send_results(owner, results)
+        
+        result = dispatch(
+            next_chunk, send, open_session, record, workers=workers,
+            slots=server_slots(server, self.MAX_CONNECTIONS_PER_SERVER),
+            rate=server_rate(server, self.MAX_SENDS_PER_SECOND if rate is None else rate)
+        )
+        
+        logger.info(f"Email queue run {owner}: {result['sent']} sent, {result['failed']} not sent, "
+                    f"{result['workers']} workers, {sum(session.connections for session in sessions)} "
+                    f"SMTP connections, {result['seconds']}s")
+        return result['sent']
+    
+    def count_claimable_emails(self) -> int:
+        """Rows waiting to be sent, skipping rows another run holds locked"""
+        conn = self.db.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT queue_id, to_address, subject, body, report_id, retry_count
-                FROM email_queue 
-                WHERE status = 'pending' AND retry_count < %s
-                ORDER BY created_date
-            """, (self.config.get('retries', 3),))
-            
-            pending_emails = cursor.fetchall()
-            
-            for email in pending_emails:
-                queue_id, to_address, subject, body, report_id, retry_count = email
-                
-                if self.send_email(to_address, subject, body):
-                    # Mark as sent
-                    cursor.execute("""
-                        UPDATE email_queue 
-                        SET status = 'sent', sent_date = %s 
-                        WHERE queue_id = %s
-                    """, (datetime.now(), queue_id))
-                    
-                    # Add to history
-                    cursor.execute("""
-                        INSERT INTO email_history (to_address, subject, report_id, sent_date, status)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (to_address, subject, report_id, datetime.now(), 'sent'))
-                    
-                    sent_count += 1
-                    logger.info(f"Email sent successfully to {to_address}")
-                    
-                else:
-                    # Increment retry count
-                    new_retry_count = retry_count + 1
-                    if new_retry_count >= self.config.get('retries', 3):
-                        # Mark as failed after max retries
-                        cursor.execute("""
-                            UPDATE email_queue 
-                            SET status = 'failed', retry_count = %s 
-                            WHERE queue_id = %s
-                        """, (new_retry_count, queue_id))
-                        
-                        cursor.execute("""
-                            INSERT INTO email_history (to_address, subject, report_id, sent_date, status)
-                            VALUES (%s, %s, %s, %s, %s)
-                        """, (to_address, subject, report_id, datetime.now(), 'failed'))
-                        
-                        logger.error(f"Email failed permanently for {to_address} after {new_retry_count} attempts")
-                    else:
-                        # Update retry count for next attempt
-                        cursor.execute("""
-                            UPDATE email_queue 
-                            SET retry_count = %s 
-                            WHERE queue_id = %s
-                        """, (new_retry_count, queue_id))
-                        
-                        logger.warning(f"Email retry {new_retry_count} for {to_address}")
-            
-            return sent_count
-            
+            cursor.execute(f"SELECT COUNT(*) FROM email_queue WITH (READPAST) WHERE {self.CLAIMABLE}",
+                           (self.config.get('retries', 3),))
+            row = cursor.fetchone()
+            return row[0] if row else 0
         except Exception as e:
-            logger.error(f"Error sending queued emails: {e}")
+            logger.error(f"Error reading email queue: {e}")
             return 0
         finally:
             conn.close()
     
-    def send_email(self, to_address: str, subject: str, body: str, is_html: bool = True) -> bool:
-        """Send individual email"""
-        if not self.config or not self.config.get('smtp_server'):
+    def lease_seconds(self, limit: int) -> int:
+        """
+        Lease for a chunk of limit rows: long enough for every send to time out twice (the
+        session reconnects once per message), so a slow but live run never loses its chunk
+        """
+        timeout = self.config.get('timeout') or 30
+        return max(self.LEASE_SECONDS, int(2 * limit * timeout))
+    
+    def lane_quotas(self, limit: int) -> Dict[str, int]:
+        """Each lane's share of a chunk of limit rows by LANE_WEIGHTS (at least one row per lane)"""
+        total = sum(self.LANE_WEIGHTS.values())
+        return {lane: max(1, limit * weight // total) for lane, weight in self.LANE_WEIGHTS.items()}
+    
+    def _claim_emails(self, owner: str, limit: int) -> List[tuple]:
+        """
+        Atomically lease up to limit of the oldest claimable rows to owner and return them as
+        (queue_id, to_address, subject, body, report_id, retry_count), highest lane first.
+        READPAST skips rows another run is claiming at the same moment instead of waiting on them.
+        
+        Lanes are scheduled by weight: each lane first claims up to its quota of the chunk, then
+        whatever quota a lane couldn't use goes to the others in priority order. A backlog of
+        high-priority mail is therefore sent first without starving the normal lane.
+        
+        Reclaiming an expired lease counts as a failed attempt (retry_count + 1); expired rows
+        with no retries left are marked failed instead of being sent again.
+        Raises on database errors.
+        """
+        # UPDATE TOP (n) can't take an ORDER BY, so each oldest-first pick is an updatable CTE
+        claim = f"""
+            WITH next_emails AS (
+                SELECT TOP (@take) *
+                FROM email_queue WITH (READPAST, UPDLOCK, ROWLOCK)
+                WHERE lane = %s AND {self.CLAIMABLE}
+                ORDER BY created_date, queue_id
+            )
+            UPDATE next_emails
+            SET retry_count = retry_count + CASE WHEN status = 'sending' THEN 1 ELSE 0 END,
+                status = 'sending', lease_owner = @owner,
+                lease_expires = DATEADD(SECOND, @lease_seconds, GETDATE())
+            OUTPUT INSERTED.queue_id, INSERTED.to_address, INSERTED.subject, INSERTED.body,
+                   INSERTED.report_id, INSERTED.retry_count, INSERTED.lane, DELETED.lease_owner
+            INTO @claimed;
+        """
+        retries = self.config.get('retries', 3)
+        # Each lane's quota first, then unused quota to the lanes in priority order (no cap)
+        passes = list(self.lane_quotas(limit).items()) + [(lane, None) for lane in self.LANE_WEIGHTS]
+        steps, params = [], []
+        for lane, quota in passes:
+            cap = f"IF @take > {int(quota)} SET @take = {int(quota)};" if quota is not None else ""
+            # TOP (0) claims nothing once the chunk is full
+            steps.append(f"""
+            SET @take = @limit - (SELECT COUNT(*) FROM @claimed);
+            IF @take < 0 SET @take = 0;
+            {cap}""" + claim)
+            params += [lane, retries]
+        
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SET NOCOUNT ON;
+                SET XACT_ABORT ON;
+                DECLARE @claimed TABLE (queue_id INT, to_address NVARCHAR(100), subject NVARCHAR(200),
+                                        body NVARCHAR(MAX), report_id INT, retry_count INT,
+                                        lane NVARCHAR(10), previous_owner NVARCHAR(100));
+                DECLARE @abandoned TABLE (to_address NVARCHAR(100), subject NVARCHAR(200), report_id INT);
+                DECLARE @limit INT = %s, @take INT, @owner NVARCHAR(100) = %s, @lease_seconds INT = %s,
+                        @retries INT = %s;
+                
+                -- Expired leases on the last attempt: the abandoned attempt was the final one
+                BEGIN TRANSACTION;
+                UPDATE email_queue WITH (READPAST, ROWLOCK)
+                SET retry_count = retry_count + 1, status = 'failed', lease_owner = NULL, lease_expires = NULL
+                OUTPUT INSERTED.to_address, INSERTED.subject, INSERTED.report_id INTO @abandoned
+                WHERE status = 'sending' AND lease_expires < GETDATE() AND retry_count + 1 >= @retries;
+                INSERT INTO email_history (to_address, subject, report_id, sent_date, status)
+                SELECT to_address, subject, report_id, GETDATE(), 'failed' FROM @abandoned;
+                COMMIT TRANSACTION;
+                {''.join(steps)}
+                SELECT queue_id, to_address, subject, body, report_id, retry_count, lane, previous_owner
+                FROM @claimed;
+            """, tuple([limit, owner, self.lease_seconds(limit), retries] + params))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        
+        lane_order = list(self.LANE_WEIGHTS)
+        rows = sorted(rows, key=lambda row: (lane_order.index(row[6]) if row[6] in lane_order else len(lane_order),
+                                             row[0]))
+        reclaimed = {row[7] for row in rows if row[7]}
+        if reclaimed:
+            # The previous owner may have sent some of these before it died; delivery is at-least-once
+            logger.warning(f"Reclaimed {sum(1 for row in rows if row[7])} emails with expired leases "
+                           f"from {', '.join(sorted(reclaimed))}")
+        return [tuple(row[:6]) for row in rows]
+    
+    def _record_send_results(self, owner: str, results: List[tuple]):
+        """
+        Store one chunk's outcomes in a single round trip and release the lease: sent rows are
+        marked sent, failed rows go back to pending with a retry (or become failed at the retry
+        limit), and both go to email_history. Rows no longer leased to owner (the lease expired
+        and another run reclaimed them) are left to that run.
+        results are [(queue row, ok)]; raises on database errors.
+        """
+        sent_ids = ', '.join(str(int(email[0])) for email, ok in results if ok) or 'NULL'
+        failed_ids = ', '.join(str(int(email[0])) for email, ok in results if not ok) or 'NULL'
+        
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SET NOCOUNT ON;
+                SET XACT_ABORT ON;
+                DECLARE @done TABLE (to_address NVARCHAR(100), subject NVARCHAR(200), report_id INT,
+                                     sent_date DATETIME, status NVARCHAR(20));
+                BEGIN TRANSACTION;
+                
+                UPDATE email_queue
+                SET status = 'sent', sent_date = GETDATE(), lease_owner = NULL, lease_expires = NULL
+                OUTPUT INSERTED.to_address, INSERTED.subject, INSERTED.report_id, INSERTED.sent_date,
+                       INSERTED.status
+                INTO @done
+                WHERE queue_id IN ({sent_ids}) AND status = 'sending' AND lease_owner = %s;
+                
+                UPDATE email_queue
+                SET retry_count = retry_count + 1,
+                    status = CASE WHEN retry_count + 1 >= %s THEN 'failed' ELSE 'pending' END,
+                    lease_owner = NULL, lease_expires = NULL
+                OUTPUT INSERTED.to_address, INSERTED.subject, INSERTED.report_id, GETDATE(),
+                       INSERTED.status
+                INTO @done
+                WHERE queue_id IN ({failed_ids}) AND status = 'sending' AND lease_owner = %s;
+                
+                INSERT INTO email_history (to_address, subject, report_id, sent_date, status)
+                SELECT to_address, subject, report_id, sent_date, status
+                FROM @done WHERE status IN ('sent', 'failed');
+                
+                COMMIT TRANSACTION;
+                SELECT COUNT(*) FROM @done;
+            """, (owner, self.config.get('retries', 3), owner))
+            row = cursor.fetchone()
+            recorded = row[0] if row else 0
+        finally:
+            conn.close()
+        
+        if recorded < len(results):
+            logger.warning(f"{len(results) - recorded} emails in chunk were no longer leased to {owner}; "
+                           f"their outcome is left to the run that reclaimed them")
+        failed = sum(1 for _, ok in results if not ok)
+        if failed:
+            logger.warning(f"{failed} of {len(results)} emails in chunk not sent; will retry up to "
+                           f"{self.config.get('retries', 3)} attempts")
+    
+    def open_smtp_session(self) -> SMTPSession:
+        """SMTP session for sending a batch; connects on the first message, close() when done"""
+        return SMTPSession(self.config)
+    
+    def send_email(self, to_address: str, subject: str, body: str, is_html: bool = True,
+                   session: SMTPSession = None) -> bool:
+        """
+        Send individual email.
+        Pass an open SMTPSession to reuse its connection; otherwise one is opened for this message.
+        A session keeps the settings it was opened with, so a config reload mid-run takes effect
+        from the next session.
+        """
+        config = session.config if session is not None else self.config
+        if not config or not config.get('smtp_server'):
             logger.error("Email configuration not available")
             return False
         
         try:
             # Create message
             msg = MIMEMultipart('alternative')
-            msg['From'] = self.config['username']
+            msg['From'] = config['username']
             msg['To'] = to_address
             msg['Subject'] = subject
             
@@ -188,18 +428,12 @@ class EmailManager:
             else:
                 msg.attach(MIMEText(body, 'plain'))
             
-            # Connect to SMTP server
-            with smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'], timeout=self.config.get('timeout', 30)) as server:
-                if self.config.get('auth_type') == 'STARTTLS':
-                    server.starttls()
-                
-                if self.config.get('use_auth') and self.config.get('password_encrypted'):
-                    # In production, decrypt the password here
-                    password = self.config['password_encrypted']  # Implement decryption
-                    server.login(self.config['username'], password)
-                
-                server.sendmail(self.config['username'], [to_address], msg.as_string())
-                return True
+            if session is not None:
+                session.send(config['username'], [to_address], msg.as_string())
+            else:
+                with SMTPSession(config) as single:
+                    single.send(config['username'], [to_address], msg.as_string())
+            return True
                 
         except Exception as e:
             logger.error(f"Error sending email to {to_address}: {e}")
@@ -216,6 +450,7 @@ class EmailManager:
                 return False
             
             # Generate email content based on notification type
+            lane = 'high' if notification_type == 'high_priority' else self.DEFAULT_LANE
             if notification_type == 'new_report':
                 subject = f"New Near Miss Report - {report_data.get('plant')} Plant"
                 body = self.generate_new_report_email(report_data)
@@ -229,9 +464,12 @@ class EmailManager:
             # Queue emails for all recipients
             success = True
             for recipient in recipients:
-                if not self.queue_email(recipient['email'], subject, body, report_data.get('report_id')):
+                if not self.queue_email(recipient['email'], subject, body, report_data.get('report_id'),
+                                        notify=False, lane=lane):
                     success = False
             
+            # One wakeup for the whole batch
+            notify_queue()
             return success
             
         except Exception as e:
@@ -483,6 +721,23 @@ class EmailManager:
             logger.error(f"Email connection test failed: {e}")
             return False
     
+    def get_queue_metrics(self) -> Dict:
+        """Queue depth per status with the age in seconds of the oldest row: {status: (count, age)}"""
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT status, COUNT(*), DATEDIFF(SECOND, MIN(created_date), GETDATE())
+                FROM email_queue
+                GROUP BY status
+            """)
+            return {status: (count, age) for status, count, age in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Error getting email queue metrics: {e}")
+            return {}
+        finally:
+            conn.close()
+    
     def get_email_queue_status(self) -> Dict:
         """Get email queue statistics"""
         conn = self.db.get_connection()
@@ -495,18 +750,40 @@ class EmailManager:
             
             # Get recent emails
             cursor.execute("""
-                SELECT to_address, subject, status, created_date, sent_date
+                SELECT TOP 20 to_address, subject, status, created_date, sent_date, lane
                 FROM email_queue 
-                ORDER BY created_date DESC 
-                LIMIT 20
+                ORDER BY created_date DESC
             """)
             recent_emails = cursor.fetchall()
             
+            # Per lane: waiting rows and the oldest one's age, and queue-to-send time over the last day
+            cursor.execute("""
+                SELECT lane,
+                       SUM(CASE WHEN status IN ('pending', 'sending') THEN 1 ELSE 0 END),
+                       DATEDIFF(SECOND, MIN(CASE WHEN status IN ('pending', 'sending') THEN created_date END),
+                                GETDATE()),
+                       SUM(CASE WHEN status = 'sent' AND sent_date >= DATEADD(DAY, -1, GETDATE())
+                                THEN 1 ELSE 0 END),
+                       AVG(CASE WHEN status = 'sent' AND sent_date >= DATEADD(DAY, -1, GETDATE())
+                                THEN DATEDIFF(SECOND, created_date, sent_date) END),
+                       MAX(CASE WHEN status = 'sent' AND sent_date >= DATEADD(DAY, -1, GETDATE())
+                                THEN DATEDIFF(SECOND, created_date, sent_date) END)
+                FROM email_queue
+                GROUP BY lane
+            """)
+            lanes = {lane: {'waiting': 0, 'oldest_wait': None, 'sent_24h': 0, 'avg_wait': None, 'max_wait': None}
+                     for lane in self.LANE_WEIGHTS}
+            for lane, waiting, oldest_wait, sent_24h, avg_wait, max_wait in cursor.fetchall():
+                lanes[lane] = {'waiting': waiting or 0, 'oldest_wait': oldest_wait, 'sent_24h': sent_24h or 0,
+                               'avg_wait': avg_wait, 'max_wait': max_wait}
+            
             return {
                 'pending': queue_stats.get('pending', 0),
+                'sending': queue_stats.get('sending', 0),
                 'sent': queue_stats.get('sent', 0),
                 'failed': queue_stats.get('failed', 0),
-                'recent_emails': recent_emails
+                'recent_emails': recent_emails,
+                'lanes': lanes
             }
         except Exception as e:
             logger.error(f"Error getting email queue status: {e}")
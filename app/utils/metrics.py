@@ -0,0 +1,218 @@
+"""
+Prometheus metrics for NEARMISS System
+Per-route request counters kept in per-thread shards (no lock on the request path),
+rendered with pool, query, email queue and worker-lag gauges in the text exposition format
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, List
+
+from ..models.instrumentation import LATENCY_BUCKETS
+
+# Response size histogram bounds in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class _RouteCounters:
+    """Counters for one (method, route) in one shard"""
+    __slots__ = ('latency', 'latency_sum', 'size', 'size_sum', 'count', 'statuses', 'errors')
+
+    def __init__(self):
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.size = [0] * (len(SIZE_BUCKETS) + 1)
+        self.size_sum = 0
+        self.count = 0
+        self.statuses = {}
+        self.errors = 0
+
+    def merge(self, other: '_RouteCounters'):
+        for position, value in enumerate(other.latency):
+            self.latency[position] += value
+        for position, value in enumerate(other.size):
+            self.size[position] += value
+        self.latency_sum += other.latency_sum
+        self.size_sum += other.size_sum
+        self.count += other.count
+        self.errors += other.errors
+        for status, value in list(other.statuses.items()):
+            self.statuses[status] = self.statuses.get(status, 0) + value
+
+
+class _Shard:
+    """One thread's counters; only the owning thread writes to it"""
+    __slots__ = ('thread', 'in_flight', 'routes')
+
+    def __init__(self, thread: threading.Thread):
+        self.thread = thread
+        self.in_flight = 0
+        self.routes = {}
+
+
+class RequestMetrics:
+    """
+    HTTP request metrics with a shard per worker thread.
+
+    Recording touches only the calling thread's shard, so the request path takes no
+    lock. snapshot() merges the shards and folds those of finished threads into a
+    retired total, so per-request threads (the development server) don't pile up.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def request_started(self):
+        self._shard().in_flight += 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float, size: int,
+                         error: bool = False):
+        shard = self._shard()
+        shard.in_flight -= 1
+        counters = shard.routes.get((method, route))
+        if counters is None:
+            counters = shard.routes[(method, route)] = _RouteCounters()
+        counters.latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        counters.latency_sum += seconds
+        counters.size[bisect_left(SIZE_BUCKETS, size)] += 1
+        counters.size_sum += size
+        counters.count += 1
+        counters.statuses[status] = counters.statuses.get(status, 0) + 1
+        if error or status >= 500:
+            counters.errors += 1
+
+    def snapshot(self) -> tuple:
+        """(in_flight, {(method, route): merged _RouteCounters})"""
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    # Dead threads can't write any more; fold them in once
+                    for key, counters in shard.routes.items():
+                        self._retired.setdefault(key, _RouteCounters()).merge(counters)
+            self._shards = live
+
+            merged = {}
+            for key, counters in self._retired.items():
+                merged.setdefault(key, _RouteCounters()).merge(counters)
+            in_flight = 0
+            for shard in live:
+                in_flight += shard.in_flight
+                for key, counters in list(shard.routes.items()):
+                    merged.setdefault(key, _RouteCounters()).merge(counters)
+        return in_flight, merged
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_bound(bound) -> str:
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+class PrometheusText:
+    """Builds a text-format exposition; samples are grouped under one HELP/TYPE per family"""
+
+    def __init__(self):
+        self._families = {}
+
+    def _family(self, name: str, kind: str, help_text: str) -> list:
+        lines = self._families.get(name)
+        if lines is None:
+            lines = self._families[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        return lines
+
+    def sample(self, name: str, kind: str, help_text: str, value, labels: Dict = None):
+        self._family(name, kind, help_text).append(f"{name}{_labels(labels)} {value}")
+
+    def histogram(self, name: str, help_text: str, bounds, counts: List[int], total, labels: Dict = None):
+        """counts are per-bucket (not cumulative), with the overflow bucket last"""
+        lines = self._family(name, 'histogram', help_text)
+        labels = labels or {}
+        running = 0
+        for bound, value in zip(bounds, counts):
+            running += value
+            lines.append(f"{name}_bucket{_labels(dict(labels, le=_format_bound(bound)))} {running}")
+        running += counts[-1]
+        lines.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {running}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {running}")
+
+    def render(self) -> str:
+        return '\n'.join(line for lines in self._families.values() for line in lines) + '\n'
+
+
+def render_metrics(request_metrics: RequestMetrics, pool_stats: Dict, query_histograms: Dict,
+                   acquire_histogram, email_queue: Dict, worker_lag: Dict) -> str:
+    """
+    Render every metric family.
+    email_queue maps status -> (count, oldest age in seconds); worker_lag maps a
+    worker name -> seconds behind (None when unknown).
+    """
+    text = PrometheusText()
+
+    in_flight, routes = request_metrics.snapshot()
+    text.sample('nearmiss_http_requests_in_flight', 'gauge', 'Requests currently being served', in_flight)
+    for (method, route), counters in sorted(routes.items()):
+        labels = {'method': method, 'route': route}
+        text.histogram('nearmiss_http_request_duration_seconds', 'Request latency by route',
+                       LATENCY_BUCKETS, counters.latency, counters.latency_sum, labels)
+        text.histogram('nearmiss_http_response_size_bytes', 'Response body size by route',
+                       SIZE_BUCKETS, counters.size, counters.size_sum, labels)
+        for status, count in sorted(counters.statuses.items()):
+            text.sample('nearmiss_http_requests_total', 'counter', 'Requests by route and status',
+                        count, dict(labels, status=status))
+        text.sample('nearmiss_http_request_errors_total', 'counter',
+                    'Requests that raised or returned a 5xx status', counters.errors, labels)
+
+    for state in ('open', 'in_use', 'idle'):
+        text.sample('nearmiss_db_pool_connections', 'gauge', 'Pooled database connections by state',
+                    pool_stats.get(state, 0), {'state': state})
+    text.sample('nearmiss_db_pool_max_connections', 'gauge', 'Pool size limit', pool_stats.get('max_size', 0))
+    text.sample('nearmiss_db_pool_utilisation_ratio', 'gauge', 'Connections in use / pool size limit',
+                round(pool_stats.get('in_use', 0) / pool_stats['max_size'], 4) if pool_stats.get('max_size') else 0)
+    text.sample('nearmiss_db_pool_checkouts_total', 'counter', 'Connections checked out of the pool',
+                pool_stats.get('checkouts', 0))
+    text.sample('nearmiss_db_pool_timeouts_total', 'counter', 'Checkouts that timed out waiting for a connection',
+                pool_stats.get('timeouts', 0))
+    text.histogram('nearmiss_db_connection_acquire_seconds', 'Time waiting for a pooled connection',
+                   LATENCY_BUCKETS, acquire_histogram.counts, acquire_histogram.total)
+
+    for name, histogram in sorted(query_histograms.items()):
+        text.histogram('nearmiss_db_query_duration_seconds', 'SQL execute latency by query',
+                       LATENCY_BUCKETS, histogram.counts, histogram.total, {'query': name})
+
+    for status, (count, _) in sorted(email_queue.items()):
+        text.sample('nearmiss_email_queue_depth', 'gauge', 'Email queue rows by status', count, {'status': status})
+
+    for worker, lag in sorted(worker_lag.items()):
+        if lag is not None:
+            text.sample('nearmiss_worker_lag_seconds', 'gauge',
+                        'How far a background worker is behind (age of its oldest unprocessed item)',
+                        round(lag, 3), {'worker': worker})
+
+    return text.render()
+
+
+# Shared by the whole process
+request_metrics = RequestMetrics()
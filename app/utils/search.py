@@ -0,0 +1,141 @@
+"""
+Report search index for NEARMISS System
+In-process inverted index over report descriptions and employee names,
+used when SQL Server full-text search is not available
+"""
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, List
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.lower())
+
+
+class ReportSearchIndex:
+    """
+    Token -> {report_id: weight} postings with prefix lookup over a sorted vocabulary.
+
+    Every query term must match (AND); a term matches any token it is a prefix of.
+    Reports are ranked by summed weights: exact token hits count double and
+    employee-name tokens are weighted by name_weight.
+    """
+
+    def __init__(self, name_weight: float = 2.0):
+        self.name_weight = name_weight
+        self._postings = {}
+        self._doc_tokens = {}
+        self._vocab = []
+        self._vocab_dirty = False
+        self._lock = threading.RLock()
+        self.high_water = 0
+        # Set by the loader: the source's change marker as of the last load (e.g. SQL Server's
+        # MIN_ACTIVE_ROWVERSION), so the next load reads only rows changed since
+        self.synced_version = None
+        self.last_refresh = 0.0
+        self.last_rebuild = 0.0
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def add(self, report_id: int, description: str, first_name: str = None, last_name: str = None):
+        """Index (or re-index) a single report"""
+        weights = {}
+        for token in tokenize(description):
+            weights[token] = weights.get(token, 0.0) + 1.0
+        for token in tokenize(first_name) + tokenize(last_name):
+            weights[token] = weights.get(token, 0.0) + self.name_weight
+
+        with self._lock:
+            self._remove_locked(report_id)
+            for token, weight in weights.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    self._vocab_dirty = True
+                postings[report_id] = weight
+            self._doc_tokens[report_id] = list(weights)
+            if report_id > self.high_water:
+                self.high_water = report_id
+
+    def remove(self, report_id: int):
+        """Drop a report from the index"""
+        with self._lock:
+            self._remove_locked(report_id)
+
+    def _remove_locked(self, report_id: int):
+        for token in self._doc_tokens.pop(report_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(report_id, None)
+                if not postings:
+                    del self._postings[token]
+                    self._vocab_dirty = True
+
+    def rebuild(self, rows):
+        """Replace the whole index from (report_id, description, first_name, last_name) rows"""
+        fresh = ReportSearchIndex(self.name_weight)
+        for row in rows:
+            fresh.add(*row)
+        with self._lock:
+            self._postings = fresh._postings
+            self._doc_tokens = fresh._doc_tokens
+            self._vocab = []
+            self._vocab_dirty = True
+            self.high_water = fresh.high_water
+
+    def clear(self):
+        """Empty the index"""
+        with self._lock:
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._vocab = []
+            self._vocab_dirty = False
+            self.high_water = 0
+            self.synced_version = None
+
+    def _term_scores(self, term: str) -> Dict[int, float]:
+        """Scores for every report containing a token that starts with term (lock held)"""
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+
+        scores = {}
+        position = bisect_left(self._vocab, term)
+        while position < len(self._vocab) and self._vocab[position].startswith(term):
+            token = self._vocab[position]
+            boost = 2.0 if token == term else 1.0
+            for report_id, weight in self._postings[token].items():
+                scores[report_id] = scores.get(report_id, 0.0) + weight * boost
+            position += 1
+        return scores
+
+    def search(self, query: str, limit: int = None) -> List[int]:
+        """Return report_ids matching every term in query, best match first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            # Start from the rarest term so intersections stay small
+            term_scores = sorted((self._term_scores(term) for term in terms), key=len)
+            totals = dict(term_scores[0])
+            for scores in term_scores[1:]:
+                totals = {report_id: total + scores[report_id]
+                          for report_id, total in totals.items() if report_id in scores}
+                if not totals:
+                    return []
+
+        # Higher score first, newer report first on ties
+        ranked = sorted(totals, key=lambda report_id: (-totals[report_id], -report_id))
+        return ranked[:limit] if limit else ranked
+
+
+# Shared by every NearMissDatabase instance in the process
+report_index = ReportSearchIndex()
@@ -0,0 +1,107 @@
+"""
+Reusable SMTP session for NEARMISS System
+One connected, authenticated SMTP session shared by many messages, reconnecting
+transparently when the server drops it (421, timeout) or after a per-connection cap
+"""
+import smtplib
+import socket
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Failures after which the same message is retried once on a fresh connection
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, socket.timeout, ConnectionError)
+
+
+class SMTPSession:
+    """
+    Lazily connected SMTP session built from an email_config dict.
+
+    send() opens the connection (STARTTLS / SSL and login) on first use and keeps it for
+    later messages. After max_messages messages the connection is recycled, since servers
+    such as Exchange Online throttle or drop long-lived sessions. A message that fails
+    because the connection went away (421 "service not available", disconnect, timeout)
+    is retried once on a new connection; any other SMTP error is raised to the caller.
+    """
+    DEFAULT_MAX_MESSAGES = 100
+
+    def __init__(self, config: Dict, max_messages: int = None):
+        self.config = config
+        self.max_messages = max_messages or config.get('messages_per_connection') or self.DEFAULT_MAX_MESSAGES
+        self._server = None
+        self._sent_on_connection = 0
+        self.connections = 0
+        self.messages = 0
+
+    def _connect(self):
+        timeout = self.config.get('timeout', 30)
+        if self.config.get('auth_type') == 'SSL':
+            server = smtplib.SMTP_SSL(self.config['smtp_server'], self.config['smtp_port'], timeout=timeout)
+        else:
+            server = smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'], timeout=timeout)
+        try:
+            if self.config.get('auth_type') == 'STARTTLS':
+                server.starttls()
+
+            if self.config.get('use_auth') and self.config.get('password_encrypted'):
+                # In production, decrypt the password here
+                password = self.config['password_encrypted']  # Implement decryption
+                server.login(self.config['username'], password)
+        except Exception:
+            self._abandon(server)
+            raise
+
+        self._server = server
+        self._sent_on_connection = 0
+        self.connections += 1
+        logger.debug(f"SMTP session connected to {self.config['smtp_server']} (connection {self.connections})")
+
+    @staticmethod
+    def _abandon(server):
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """QUIT the current connection, if any"""
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            self._abandon(server)
+
+    def send(self, from_address: str, to_addresses: List[str], message: str):
+        """Send one message, (re)connecting as needed. Raises smtplib errors the retry doesn't cover."""
+        if self._server is not None and self._sent_on_connection >= self.max_messages:
+            self.close()
+
+        for attempt in (1, 2):
+            if self._server is None:
+                self._connect()
+            try:
+                self._server.sendmail(from_address, to_addresses, message)
+                break
+            except smtplib.SMTPResponseException as e:
+                # 421: the server is closing the channel (throttled or shutting down)
+                if e.smtp_code != 421 or attempt == 2:
+                    raise
+                logger.warning(f"SMTP server closed the session (421), reconnecting: {e.smtp_error!r}")
+            except RECONNECT_ERRORS as e:
+                if attempt == 2:
+                    raise
+                logger.warning(f"SMTP session lost ({type(e).__name__}), reconnecting: {e}")
+            self._abandon(self._server)
+            self._server = None
+
+        self._sent_on_connection += 1
+        self.messages += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
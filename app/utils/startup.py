@@ -0,0 +1,96 @@
+"""
+Background warm-up for NEARMISS System
+Runs the DB-dependent startup work (pool, email config, caches, search index) on a
+daemon thread so create_app returns at once, and tracks readiness for /readyz
+"""
+import threading
+import logging
+import time
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """
+    Ordered startup steps run once on a background thread.
+
+    Required steps are retried with backoff until they succeed (the database may
+    simply not be up yet); the process is ready once all of them have. Optional
+    steps only pre-fill caches: a failure is logged and the cache fills on first use.
+    """
+    RETRY_DELAYS = (1, 2, 5, 10, 30)
+
+    def __init__(self):
+        self._steps = []
+        self._status = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started_at = None
+        self.ready_at = None
+
+    def add(self, name: str, func: Callable, required: bool = False):
+        self._steps.append((name, func, required))
+        self._status[name] = {'state': 'pending', 'required': required, 'seconds': None,
+                              'attempts': 0, 'error': None}
+
+    def start(self) -> threading.Thread:
+        """Start the warm-up thread (once)"""
+        with self._lock:
+            if self._thread is None:
+                self.started_at = time.monotonic()
+                self._thread = threading.Thread(target=self._run, name='nearmiss-warmup', daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def _run(self):
+        for name, func, required in self._steps:
+            attempt = 0
+            while True:
+                attempt += 1
+                started = time.monotonic()
+                self._update(name, state='running', attempts=attempt)
+                try:
+                    func()
+                except Exception as e:
+                    self._update(name, error=str(e))
+                    if not required:
+                        self._update(name, state='failed')
+                        logger.warning(f"Warm-up step {name} failed, will load on first use: {e}")
+                        break
+                    delay = self.RETRY_DELAYS[min(attempt, len(self.RETRY_DELAYS)) - 1]
+                    logger.error(f"Warm-up step {name} failed (attempt {attempt}), retrying in {delay}s: {e}")
+                    self._update(name, state='retrying')
+                    time.sleep(delay)
+                    continue
+                self._update(name, state='done', seconds=round(time.monotonic() - started, 3), error=None)
+                logger.info(f"Warm-up step {name} done in {time.monotonic() - started:.2f}s")
+                break
+
+        self.ready_at = time.monotonic()
+        logger.info(f"Warm-up complete in {self.ready_at - self.started_at:.2f}s")
+
+    def _update(self, name: str, **fields):
+        with self._lock:
+            self._status[name].update(fields)
+
+    @property
+    def ready(self) -> bool:
+        """True once every required step has succeeded"""
+        with self._lock:
+            return all(status['state'] == 'done' for status in self._status.values() if status['required'])
+
+    @property
+    def finished(self) -> bool:
+        return self.ready_at is not None
+
+    def status(self) -> Dict:
+        with self._lock:
+            steps = {name: dict(status) for name, status in self._status.items()}
+        return {
+            'ready': self.ready,
+            'finished': self.finished,
+            'uptime': round(time.monotonic() - self.started_at, 1) if self.started_at else 0.0,
+            'warmup_seconds': round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            'steps': steps
+        }
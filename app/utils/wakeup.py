@@ -0,0 +1,58 @@
+"""
+Email queue wakeup for NEARMISS System
+The web app sends a UDP datagram after queuing email; the queue processor daemon
+listens for it and runs at once instead of waiting for its next poll
+"""
+import socket
+import select
+import logging
+from typing import Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Where process_emails.py --daemon listens, and where the web app signals. Datagrams are
+# hints only (the daemon still polls), so a lost one or a stopped daemon costs latency, not mail.
+WAKEUP_HOST = '127.0.0.1'
+WAKEUP_PORT = 8765
+WAKEUP_TARGETS = [(WAKEUP_HOST, WAKEUP_PORT)]
+
+_sender = None
+
+
+def notify(targets: Iterable[Tuple[str, int]] = None):
+    """Signal queue processors that new email is waiting. Never raises."""
+    global _sender
+    try:
+        if _sender is None:
+            _sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _sender.setblocking(False)
+        for target in targets or WAKEUP_TARGETS:
+            _sender.sendto(b'email', target)
+    except OSError as e:
+        # Nobody listening (ICMP refused) or the buffer is full; the daemon's poll picks it up
+        logger.debug(f"Email wakeup not delivered: {e}")
+
+
+class WakeupListener:
+    """Bound UDP socket the daemon waits on between queue runs"""
+
+    def __init__(self, host: str = WAKEUP_HOST, port: int = WAKEUP_PORT):
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(self.address)
+        self._socket.setblocking(False)
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to timeout seconds; True if woken by a signal. Coalesces queued signals."""
+        readable, _, _ = select.select([self._socket], [], [], max(0.0, timeout))
+        if not readable:
+            return False
+        while True:
+            try:
+                self._socket.recv(64)
+            except OSError:
+                # BlockingIOError once drained
+                return True
+
+    def close(self):
+        self._socket.close()
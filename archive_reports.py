@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+NEARMISS Report Archiver
+Moves closed reports older than the archive cutoff (and their history rows) out of the hot tables
+Run this periodically via cron or a scheduled task, e.g. nightly
+
+Usage:
+    python archive_reports.py [--days 730] [--batch-size 500]
+"""
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.models.database import NearMissDatabase
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Archive closed reports"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=NearMissDatabase.ARCHIVE_AFTER_DAYS,
+                        help='archive closed reports submitted more than this many days ago')
+    parser.add_argument('--batch-size', type=int, default=NearMissDatabase.ARCHIVE_BATCH_SIZE,
+                        help='reports moved per transaction')
+    args = parser.parse_args()
+    
+    try:
+        db = NearMissDatabase()
+        
+        # Make sure the archive tables exist
+        db.apply_migrations()
+        
+        logger.info(f"Archiving closed reports older than {args.days} days...")
+        archived = db.archive_reports(args.days, args.batch_size)
+        logger.info(f"Archive complete ({archived} reports moved)")
+        
+    except Exception as e:
+        logger.error(f"Archiving failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
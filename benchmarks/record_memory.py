@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: per-row dicts vs __slots__ records
+Builds N synthetic report/user rows each way, from the same columns, and reports heap
+usage via tracemalloc and build time (measured separately, without tracing)
+
+Usage:
+    python benchmarks/record_memory.py [--rows 100000]
+"""
+import os
+import gc
+import time as clock
+import tracemalloc
+import argparse
+from datetime import datetime, date, time
+
+# Import the module file directly so the benchmark doesn't need Flask or pytds
+import importlib.util
+_spec = importlib.util.spec_from_file_location(
+    'records', os.path.join(os.path.dirname(__file__), '..', 'app', 'models', 'records.py'))
+records = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(records)
+
+
+def report_row(i):
+    # Every Report column (display names, ids, row_version) as NearMissDatabase fills them
+    return (i, date(2025, 1, 1), time(8, 15), 'Red Oak', f'Employee {i % 500}', 'Press', 'Press 3',
+            'Medium', 'Pinch point', None, f'Description for report {i}', 'Reported to supervisor',
+            None, None, False, None, None, f'Creator {i % 50}', datetime(2025, 1, 1, 8, 30),
+            i % 500, 12, 4, 2, None, None, i % 50, f'{i:016x}')
+
+
+def user_row(i):
+    return (i, f'First{i}', f'Last{i}', f'user{i}', f'user{i}@fresco.com', 'Telford', False, False)
+
+
+def as_dict(cls, row):
+    return dict(zip(cls.__slots__, row))
+
+
+def measure(build, rows):
+    """Bytes allocated by build() for rows already in memory"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def timed(build, rows):
+    """Seconds build() takes for rows already in memory"""
+    gc.collect()
+    started = clock.perf_counter()
+    result = build(rows)
+    elapsed = clock.perf_counter() - started
+    del result
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-row dict and __slots__ record memory')
+    parser.add_argument('--rows', '-n', type=int, default=100000, help='Rows per result set (default: 100000)')
+    args = parser.parse_args()
+
+    print(f"{'Type':<10}{'dict MB':>10}{'record MB':>12}{'bytes/row saved':>18}{'saving':>9}"
+          f"{'dict ms':>10}{'record ms':>12}")
+    for cls, make_row in ((records.Report, report_row), (records.User, user_row)):
+        rows = [make_row(i) for i in range(args.rows)]
+        # Like for like: both forms hold exactly the record's columns
+        if len(rows[0]) != len(cls.__slots__):
+            raise SystemExit(f"{cls.__name__} benchmark row has {len(rows[0])} values, "
+                             f"record has {len(cls.__slots__)} columns")
+        build_dicts = lambda rs: [as_dict(cls, row) for row in rs]
+        build_records = lambda rs: [cls.from_row(row) for row in rs]
+        dict_bytes = measure(build_dicts, rows)
+        record_bytes = measure(build_records, rows)
+        saved = (dict_bytes - record_bytes) / args.rows
+        print(f"{cls.__name__:<10}{dict_bytes / 1e6:>10.1f}{record_bytes / 1e6:>12.1f}"
+              f"{saved:>18.0f}{(1 - record_bytes / dict_bytes) * 100:>8.0f}%"
+              f"{timed(build_dicts, rows) * 1000:>10.0f}{timed(build_records, rows) * 1000:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import and create_app() cost
+Runs each sample in a fresh interpreter (so imports are cold) and reports the time to
+import the app package and to build the Flask app. create_app must not wait on the
+database, so the numbers should not change when it is slow or unreachable.
+
+Usage:
+    python benchmarks/startup_time.py [--runs 10] [--importtime 15]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Executed in each child interpreter; prints one JSON line with the timings
+CHILD = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported}))
+"""
+
+
+def sample(importtime: bool = False):
+    """One cold start; returns (timings dict, stderr text)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"child failed: {result.stderr.strip()[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr: str, top: int):
+    """(cumulative us, module) for the slowest imports in -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        entries.append((int(cumulative), module.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold import and create_app() time')
+    parser.add_argument('--runs', '-n', type=int, default=10, help='Cold starts to sample (default: 10)')
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='Also list the N slowest imports of one extra run')
+    args = parser.parse_args()
+
+    samples = [sample()[0] for _ in range(args.runs)]
+
+    print(f"{'Phase':<12}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for phase in ('import', 'create_app'):
+        values = [run[phase] * 1000 for run in samples]
+        print(f"{phase:<12}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+    totals = [(run['import'] + run['create_app']) * 1000 for run in samples]
+    print(f"{'total':<12}{statistics.median(totals):>12.1f}{min(totals):>10.1f}{max(totals):>10.1f}")
+
+    if args.importtime:
+        _, stderr = sample(importtime=True)
+        print(f"\n{'cumulative ms':>14}  module")
+        for cumulative, module in slowest_imports(stderr, args.importtime):
+            print(f"{cumulative / 1000:>14.1f}  {module}")
+
+
+if __name__ == '__main__':
+    main()
@@ -98,6 +98,10 @@ def clean_dropdown_data():
                 logger.info(f"Updated department: '{dept_name}' -> '{cleaned}'")
         
         conn.close()
+        
+        # Bumps lookup_versions so running web workers drop their cached dropdowns
+        # within NearMissDatabase.LOOKUP_VERSION_CHECK_SECONDS
+        db.invalidate_lookups()
         logger.info("Data cleanup completed successfully!")
         return True
         
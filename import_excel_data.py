@@ -47,6 +47,11 @@ def import_equipment_data():
             'Warehouse': 'Warehouse'
         }
         
+        conn.close()
+        
+        # Collect everything first, then apply it with one MERGE per table
+        equipment_rows = []
+        
         # Process each department column
         for excel_col, db_dept in dept_mapping.items():
             if excel_col in df.columns:
@@ -61,43 +66,30 @@ def import_equipment_data():
                         for equip_name in equipment_list:
                             equip_name = str(equip_name).strip()
                             if equip_name and equip_name != 'General':
-                                # Insert equipment if it doesn't exist
-                                cursor.execute("""
-                                    IF NOT EXISTS (SELECT 1 FROM equipment WHERE plant = %s AND dept_id = %s AND equip_name = %s)
-                                    INSERT INTO equipment (plant, dept_id, equip_name) VALUES (%s, %s, %s)
-                                """, (plant, dept_id, equip_name, plant, dept_id, equip_name))
-                                
-                                logger.info(f"Added equipment: {equip_name} to {plant} - {db_dept}")
+                                equipment_rows.append((plant, dept_id, equip_name))
+                                logger.info(f"Found equipment: {equip_name} for {plant} - {db_dept}")
         
-        # Also read and update hazard types from Excel
+        # Also read hazard types from Excel
+        hazard_types = []
         hazard_df = pd.read_excel(excel_file, sheet_name='Hazard Types')
         if not hazard_df.empty and len(hazard_df.columns) > 0:
             hazard_col = hazard_df.columns[0]
-            hazard_types = hazard_df[hazard_col].dropna().tolist()
-            
-            for hazard_type in hazard_types:
-                hazard_type = str(hazard_type).strip()
-                if hazard_type:
-                    cursor.execute("""
-                        IF NOT EXISTS (SELECT 1 FROM hazard_types WHERE hazard_type = %s)
-                        INSERT INTO hazard_types (hazard_type) VALUES (%s)
-                    """, (hazard_type, hazard_type))
+            hazard_types = [str(value).strip() for value in hazard_df[hazard_col].dropna().tolist()]
+            hazard_types = [value for value in hazard_types if value]
         
-        # Update immediate actions from Excel
+        # Read immediate actions from Excel
+        actions = []
         actions_df = pd.read_excel(excel_file, sheet_name='Immediate Action Taken')
         if not actions_df.empty and len(actions_df.columns) > 0:
             actions_col = actions_df.columns[0]
-            actions = actions_df[actions_col].dropna().tolist()
-            
-            for action in actions:
-                action = str(action).strip()
-                if action:
-                    cursor.execute("""
-                        IF NOT EXISTS (SELECT 1 FROM immediate_actions WHERE action_description = %s)
-                        INSERT INTO immediate_actions (action_description) VALUES (%s)
-                    """, (action, action))
+            actions = [str(value).strip() for value in actions_df[actions_col].dropna().tolist()]
+            actions = [value for value in actions if value]
         
-        conn.close()
+        # Set-based upsert in one transaction; bumps lookup_versions so running web workers
+        # drop their cached dropdowns within NearMissDatabase.LOOKUP_VERSION_CHECK_SECONDS
+        changed = db.seed_reference_data(equipment=equipment_rows, hazard_types=hazard_types,
+                                         immediate_actions=actions)
+        logger.info(f"Rows added/updated: {changed}")
         logger.info("Excel data import completed successfully!")
         return True
         
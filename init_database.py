@@ -32,6 +32,10 @@ def main():
         logger.info("Creating tables...")
         db.create_tables()
         
+        # Apply versioned schema migrations
+        logger.info("Applying schema migrations...")
+        db.apply_migrations()
+        
         # Insert initial data
         logger.info("Inserting initial data...")
         db.insert_initial_data()
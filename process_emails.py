@@ -2,7 +2,7 @@
 """
 NEARMISS Email Queue Processor
 Background script to process queued emails
-Run this periodically via cron or as a service
+Run this periodically via cron, or as a service with --daemon
 """
 import sys
 import os
@@ -15,6 +15,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
 try:
     from app.utils.email import EmailManager
+    from app.utils.wakeup import WakeupListener, WAKEUP_HOST, WAKEUP_PORT
 except ImportError as e:
     print(f"Error importing EmailManager: {e}")
     print("Make sure you're running from the NEARMISS directory")
@@ -32,7 +33,7 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def main():
+def main(workers=None, rate=None):
     """Main email processing function"""
     logger.info("=" * 50)
     logger.info("NEARMISS Email Queue Processor Starting")
@@ -58,7 +59,7 @@ def main():
         
         # Process email queue
         logger.info("Processing email queue...")
-        sent_count = email_manager.send_queued_emails()
+        sent_count = email_manager.send_queued_emails(workers=workers, rate=rate)
         
         if sent_count > 0:
             logger.info(f"Successfully sent {sent_count} emails")
@@ -68,6 +69,7 @@ def main():
         # Get queue status
         status = email_manager.get_email_queue_status()
         logger.info(f"Queue Status - Pending: {status.get('pending', 0)}, "
+                   f"Sending: {status.get('sending', 0)}, "
                    f"Sent: {status.get('sent', 0)}, "
                    f"Failed: {status.get('failed', 0)}")
         
@@ -79,20 +81,66 @@ def main():
         logger.error(f"Error in email processor: {e}")
         sys.exit(1)
 
-def run_daemon(interval=300):
-    """Run as daemon process with specified interval (default 5 minutes)"""
-    logger.info(f"Starting email processor daemon (checking every {interval} seconds)")
+# Daemon polling: right after a run that sent mail, poll again soon (more may be on its way,
+# e.g. queued on another host); each idle poll doubles the wait up to --interval
+MIN_POLL_SECONDS = 5
+# How often the daemon logs queue status while running
+STATUS_LOG_SECONDS = 3600
+
+def run_daemon(interval=300, workers=None, rate=None, wakeup_port=WAKEUP_PORT):
+    """
+    Run as daemon process. Wakes as soon as the web app signals new email on the UDP
+    wakeup port, and otherwise polls adaptively, at most every interval seconds when idle.
+    """
+    logger.info(f"Starting email processor daemon (wakeup on UDP {WAKEUP_HOST}:{wakeup_port}, "
+                f"polling every {MIN_POLL_SECONDS}-{interval} seconds)")
+    
+    listener = None
+    try:
+        listener = WakeupListener(WAKEUP_HOST, wakeup_port)
+    except OSError as e:
+        logger.warning(f"Cannot listen for wakeups on {WAKEUP_HOST}:{wakeup_port} ({e}); polling only")
     
     try:
+        # Its config reloads every EmailManager.CONFIG_REFRESH_SECONDS, so settings saved from
+        # the admin page reach the next queue run without a restart
+        email_manager = EmailManager()
+        
+        # Once at startup; each queue run reports its own SMTP failures
+        if email_manager.config.get('smtp_server') and email_manager.test_email_connection():
+            logger.info("Email server connection test successful")
+        else:
+            logger.warning("Email server connection test failed - continuing with queue processing")
+        
+        poll = MIN_POLL_SECONDS
+        status_logged_at = 0.0
         while True:
-            main()
-            logger.info(f"Sleeping for {interval} seconds...")
-            time.sleep(interval)
+            sent_count = email_manager.send_queued_emails(workers=workers, rate=rate)
+            if sent_count:
+                logger.info(f"Successfully sent {sent_count} emails")
+            
+            if time.monotonic() - status_logged_at >= STATUS_LOG_SECONDS:
+                status = email_manager.get_email_queue_status()
+                logger.info(f"Queue Status - Pending: {status.get('pending', 0)}, "
+                           f"Sending: {status.get('sending', 0)}, "
+                           f"Sent: {status.get('sent', 0)}, "
+                           f"Failed: {status.get('failed', 0)}")
+                status_logged_at = time.monotonic()
+            
+            poll = MIN_POLL_SECONDS if sent_count else min(poll * 2, interval)
+            if listener is not None:
+                if listener.wait(poll):
+                    logger.debug("Woken by new email")
+            else:
+                time.sleep(poll)
     except KeyboardInterrupt:
         logger.info("Email processor daemon stopped by user")
     except Exception as e:
         logger.error(f"Email processor daemon error: {e}")
         sys.exit(1)
+    finally:
+        if listener is not None:
+            listener.close()
 
 if __name__ == '__main__':
     import argparse
@@ -101,7 +149,13 @@ if __name__ == '__main__':
     parser.add_argument('--daemon', '-d', action='store_true', 
                        help='Run as daemon process')
     parser.add_argument('--interval', '-i', type=int, default=300,
-                       help='Interval in seconds for daemon mode (default: 300)')
+                       help='Longest wait between queue polls in daemon mode, in seconds (default: 300)')
+    parser.add_argument('--wakeup-port', type=int, default=WAKEUP_PORT,
+                       help=f'UDP port the daemon listens on for new-email signals; the web app signals WAKEUP_TARGETS in app/utils/wakeup.py (default: {WAKEUP_PORT})')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                       help=f'Parallel senders, each with its own SMTP session (default: {EmailManager.DISPATCH_WORKERS})')
+    parser.add_argument('--rate', '-r', type=float, default=None,
+                       help=f'Max emails per second to the SMTP server, 0 for unlimited (default: {EmailManager.MAX_SENDS_PER_SECOND})')
     
     args = parser.parse_args()
     
@@ -111,6 +165,6 @@ if __name__ == '__main__':
         os.makedirs(log_dir)
     
     if args.daemon:
-        run_daemon(args.interval)
+        run_daemon(args.interval, args.workers, args.rate, args.wakeup_port)
     else:
-        main()
\ No newline at end of file
+        main(args.workers, args.rate)
\ No newline at end of file
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Rebuild the dashboard statistics rollup for NEARMISS system
+Recomputes report_stats_daily from near_miss_reports (backfill or repair after manual edits)
+"""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.models.database import NearMissDatabase
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Rebuild report_stats_daily"""
+    try:
+        db = NearMissDatabase()
+        
+        # Make sure the rollup table exists
+        db.apply_migrations()
+        
+        logger.info("Rebuilding dashboard statistics...")
+        rows = db.rebuild_report_stats()
+        logger.info(f"Dashboard statistics rebuilt ({rows} rollup rows)")
+        
+    except Exception as e:
+        logger.error(f"Statistics rebuild failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
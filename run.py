@@ -67,6 +67,7 @@ def main():
         logger.info("  - http://localhost:7758/entry (Near Miss Entry)")
         logger.info("  - http://localhost:7758/reports (View Reports)")
         logger.info("  - http://localhost:7758/debug (Debug information)")
+        logger.info("  - http://localhost:7758/healthz, /readyz (Liveness / readiness probes)")
         logger.info("="*60)
         
         # Start the Flask development server
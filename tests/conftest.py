@@ -0,0 +1,121 @@
+"""
+Shared fixtures for NEARMISS tests
+FakeConnection stands in for a pytds connection: it keeps statements executed in a
+transaction apart until commit(), so tests can assert what a failure leaves behind
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# The app modules import the real driver and Flask at import time
+pytest.importorskip('pytds')
+pytest.importorskip('flask')
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = -1
+        self.description = None
+
+    def execute(self, operation, params=None):
+        self.conn.execute(operation, params)
+        self.rows = list(self.conn.result_for(operation))
+
+    def executemany(self, operation, params_seq):
+        for params in params_seq:
+            self.execute(operation, params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def nextset(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    Minimal transactional DB-API connection.
+
+    committed   statements that are durable (autocommit, or committed transactions)
+    pending     statements in the open transaction, dropped by rollback()
+    fail_on     substring, or callable(operation, params); a matching statement raises RuntimeError
+    results     substring -> rows returned by a statement containing it
+    """
+
+    def __init__(self, autocommit: bool = True):
+        self.autocommit = autocommit
+        self.committed = []
+        self.pending = []
+        self.fail_on = None
+        self.results = {}
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def execute(self, operation, params=None):
+        if callable(self.fail_on) and self.fail_on(operation, params) or \
+                isinstance(self.fail_on, str) and self.fail_on in operation:
+            raise RuntimeError("statement failed")
+        (self.committed if self.autocommit else self.pending).append((operation, params))
+
+    def result_for(self, operation):
+        for marker, rows in self.results.items():
+            if marker in operation:
+                return rows
+        return []
+
+    def commit(self):
+        self.committed.extend(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        self.closed = True
+
+    def durable(self, marker: str) -> list:
+        """Committed statements containing marker"""
+        return [operation for operation, _ in self.committed if marker in operation]
+
+
+@pytest.fixture
+def fake_conn():
+    return FakeConnection()
+
+
+@pytest.fixture
+def fake_pool(fake_conn, monkeypatch):
+    """A ConnectionPool whose every connection is fake_conn"""
+    from app.models.pool import ConnectionPool
+
+    pool = ConnectionPool({'autocommit': True}, min_size=0, max_size=4, validate=False)
+    monkeypatch.setattr(pool, '_connect', lambda: fake_conn)
+    return pool
+
+
+@pytest.fixture
+def fake_db(fake_pool, monkeypatch):
+    """NearMissDatabase whose connections all come from fake_pool"""
+    from app.models.database import NearMissDatabase
+
+    db = NearMissDatabase(read_replicas=[])
+    monkeypatch.setattr(NearMissDatabase, 'pool', property(lambda self: fake_pool))
+    return db
@@ -0,0 +1,29 @@
+"""Bulk report ingest is all-or-nothing"""
+import pytest
+
+from app.models.database import NearMissDatabase
+
+
+def report(key):
+    return {'client_key': key, 'date_occurred': '2024-03-01', 'time_occurred': '08:30',
+            'employee_id': 5, 'plant': 'Red Oak', 'description': f'Report {key}'}
+
+
+def test_failed_chunk_commits_nothing(fake_db, fake_conn, monkeypatch):
+    monkeypatch.setattr(NearMissDatabase, 'BULK_CHUNK_SIZE', 1)
+    # The second chunk's batch fails after the first chunk's went through
+    fake_conn.fail_on = lambda operation, params: 'INSERT INTO @incoming' in operation and params[0] == 1
+
+    with pytest.raises(RuntimeError):
+        fake_db.create_near_miss_reports_bulk([report('a'), report('b')], created_by_id=5)
+
+    assert fake_conn.durable('INSERT INTO near_miss_reports') == []
+
+
+def test_archived_client_keys_count_as_duplicates(fake_db, fake_conn):
+    fake_conn.results['INSERT INTO @incoming'] = [(0, 41, 'duplicate')]
+    results = fake_db.create_near_miss_reports_bulk([report('a')], created_by_id=5)
+
+    batch = fake_conn.durable('INSERT INTO @incoming')[0]
+    assert 'FROM near_miss_reports_archive a WITH (UPDLOCK, HOLDLOCK)' in batch
+    assert results[0]['status'] == 'duplicate' and results[0]['report_id'] == 41
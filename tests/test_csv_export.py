@@ -0,0 +1,22 @@
+"""CSV export formatting"""
+import csv
+import io
+
+from app import CSV_EXPORT_FIELDS, _csv_rows
+from app.models.records import Report
+
+
+def parse(lines):
+    return list(csv.reader(io.StringIO(''.join(lines))))
+
+
+def test_empty_export_has_header():
+    assert parse(_csv_rows([])) == [list(CSV_EXPORT_FIELDS)]
+
+
+def test_export_omits_internal_columns():
+    values = list(range(len(Report.__slots__)))
+    rows = parse(_csv_rows([Report(*values)]))
+    assert rows[0] == list(CSV_EXPORT_FIELDS)
+    assert 'row_version' not in rows[0] and 'employee_id' not in rows[0]
+    assert rows[1] == [str(value) for value in values[:len(CSV_EXPORT_FIELDS)]]
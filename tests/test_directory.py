@@ -0,0 +1,32 @@
+"""User directory refresh"""
+from app.models.directory import UserDirectory
+
+
+class UnreachableDatabase:
+    def __init__(self):
+        self.attempts = 0
+
+    def get_connection(self):
+        self.attempts += 1
+        raise RuntimeError("database unreachable")
+
+
+def test_failed_first_load_waits_before_retrying():
+    directory = UserDirectory(refresh_interval=60)
+    db = UnreachableDatabase()
+
+    for _ in range(5):
+        directory.ensure_fresh(db)
+
+    assert db.attempts == 1
+
+
+def test_invalidate_retries_at_once():
+    directory = UserDirectory(refresh_interval=60)
+    db = UnreachableDatabase()
+    directory.ensure_fresh(db)
+
+    directory.invalidate()
+    directory.ensure_fresh(db)
+
+    assert db.attempts == 2
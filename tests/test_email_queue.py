@@ -0,0 +1,62 @@
+"""Email queue claims and leases"""
+import pytest
+
+from app.utils.email import EmailManager
+
+CONFIG = {'smtp_server': 'smtp.example.com', 'smtp_port': 587, 'timeout': 30, 'retries': 3}
+
+
+@pytest.fixture
+def manager(fake_db):
+    manager = EmailManager()
+    manager.db = fake_db
+    manager.config = dict(CONFIG)
+    return manager
+
+
+def claim_statement(fake_conn):
+    return next((operation, params) for operation, params in fake_conn.committed if '@claimed' in operation)
+
+
+def test_reclaim_uses_a_retry(manager, fake_conn):
+    manager._claim_emails('host:1:abc', 25)
+
+    operation, _ = claim_statement(fake_conn)
+    assert "retry_count = retry_count + CASE WHEN status = 'sending' THEN 1 ELSE 0 END" in operation
+    # Expired leases with no retries left are failed, not sent again
+    assert "status = 'failed'" in operation
+    assert 'INSERT INTO email_history' in operation
+
+
+def test_lease_covers_worst_case_chunk(manager, fake_conn):
+    manager._claim_emails('host:1:abc', 25)
+
+    _, params = claim_statement(fake_conn)
+    assert params[2] == 2 * 25 * 30
+    assert manager.lease_seconds(1) == EmailManager.LEASE_SECONDS
+
+
+def test_config_reloads_after_refresh_interval(manager, monkeypatch):
+    import app.utils.email as email_module
+
+    now = [1000.0]
+    monkeypatch.setattr(email_module.time, 'monotonic', lambda: now[0])
+    manager.config = dict(CONFIG)
+    saved = dict(CONFIG, smtp_server='smtp.office365.com')
+    monkeypatch.setattr(manager, 'load_email_config', lambda: saved)
+
+    assert manager.config['smtp_server'] == 'smtp.example.com'
+    now[0] += EmailManager.CONFIG_REFRESH_SECONDS
+    assert manager.config['smtp_server'] == 'smtp.office365.com'
+
+
+def test_failed_reload_keeps_last_config(manager, monkeypatch):
+    import app.utils.email as email_module
+
+    now = [1000.0]
+    monkeypatch.setattr(email_module.time, 'monotonic', lambda: now[0])
+    manager.config = dict(CONFIG)
+    monkeypatch.setattr(manager, 'load_email_config', lambda: {})
+
+    now[0] += EmailManager.CONFIG_REFRESH_SECONDS
+    assert manager.config['smtp_server'] == 'smtp.example.com'
@@ -0,0 +1,96 @@
+"""Lookup cache invalidation across processes and dropdown edits"""
+import pytest
+
+from app.models import database
+from app.utils.cache import lookup_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_versions(monkeypatch):
+    monkeypatch.setattr(database, '_lookup_versions', {})
+    monkeypatch.setattr(database, '_lookup_versions_checked_at', 0.0)
+    monkeypatch.setattr(database, '_lookup_versions_synced', False)
+    lookup_cache.invalidate()
+    yield
+    lookup_cache.invalidate()
+
+
+def test_version_change_elsewhere_drops_cached_table(fake_db, fake_conn, monkeypatch):
+    fake_conn.results['FROM lookup_versions'] = [('departments', 1), ('hazard_types', 4)]
+    fake_db._sync_lookup_versions()
+    lookup_cache.set(('departments', 'Red Oak'), ['cached'])
+    lookup_cache.set(('hazard_types',), ['cached'])
+
+    # Another process bumped departments
+    fake_conn.results['FROM lookup_versions'] = [('departments', 2), ('hazard_types', 4)]
+    monkeypatch.setattr(database, '_lookup_versions_checked_at', 0.0)
+    fake_db._sync_lookup_versions()
+
+    assert lookup_cache.get(('departments', 'Red Oak')) is None
+    assert lookup_cache.get(('hazard_types',)) == ['cached']
+
+
+def test_first_bump_elsewhere_drops_cached_table(fake_db, fake_conn, monkeypatch):
+    # No table has been bumped yet, so lookup_versions is empty
+    fake_db._sync_lookup_versions()
+    lookup_cache.set(('departments', 'Red Oak'), ['cached'])
+
+    # Another process makes the first change to departments
+    fake_conn.results['FROM lookup_versions'] = [('departments', 1)]
+    monkeypatch.setattr(database, '_lookup_versions_checked_at', 0.0)
+    fake_db._sync_lookup_versions()
+
+    assert lookup_cache.get(('departments', 'Red Oak')) is None
+
+
+def test_dropdown_save_publishes_one_bump_after_commit(fake_db, fake_conn):
+    saved = fake_db.save_dropdown_changes({
+        'department': {'3': 'Paint Line'},
+        'new_hazard_type': ['Pinch point']
+    })
+
+    assert saved is True
+    bumps = [(operation, params) for operation, params in fake_conn.committed if 'MERGE lookup_versions' in operation]
+    assert len(bumps) == 1
+    assert sorted(bumps[0][1]) == ['departments', 'equipment', 'hazard_types']
+    last_update = max(i for i, (operation, _) in enumerate(fake_conn.committed) if 'UPDATE departments' in operation)
+    assert fake_conn.committed.index(bumps[0]) > last_update
+
+
+def test_invalidate_publishes_version_bump(fake_db, fake_conn):
+    fake_db.invalidate_lookups('equipment')
+    assert fake_conn.durable('MERGE lookup_versions')
+
+
+def test_failed_dropdown_save_leaves_nothing(fake_db, fake_conn):
+    fake_conn.fail_on = 'DELETE FROM departments'
+    saved = fake_db.save_dropdown_changes({
+        'department': {'3': 'Paint Line'},
+        'new_hazard_type': ['Pinch point'],
+        'delete': {'department': ['7']}
+    })
+    assert saved is False
+    assert fake_conn.durable('UPDATE departments') == []
+    assert fake_conn.durable('INSERT INTO hazard_types') == []
+    assert fake_conn.durable('MERGE lookup_versions') == []
+
+
+def test_load_parallel_runs_loaders_concurrently(fake_db):
+    import threading
+
+    both_started = threading.Barrier(2, timeout=5)
+
+    def loader(value):
+        # Deadlocks (and times out) unless the two loaders overlap
+        both_started.wait()
+        return value
+
+    assert fake_db.load_parallel(first=(loader, 1), second=(loader, 2)) == {'first': 1, 'second': 2}
+
+
+def test_load_parallel_reraises_loader_errors(fake_db):
+    def broken():
+        raise RuntimeError("lookup failed")
+
+    with pytest.raises(RuntimeError):
+        fake_db.load_parallel(users=lambda: [], hazard_types=broken)
@@ -0,0 +1,32 @@
+"""Schema migrations apply all-or-nothing"""
+import pytest
+
+from app.models.migrations import MigrationRunner
+
+
+def test_failed_migration_leaves_no_partial_schema(fake_db, fake_conn):
+    fake_conn.results['FROM schema_migrations'] = []
+    fake_conn.fail_on = 'ALTER TABLE widgets ADD broken'
+    runner = MigrationRunner(fake_db, migrations=[
+        (1, "Widgets", [
+            "ALTER TABLE widgets ADD colour NVARCHAR(20) NULL",
+            "ALTER TABLE widgets ADD broken INT NULL",
+        ]),
+    ])
+
+    with pytest.raises(RuntimeError):
+        runner.run()
+
+    assert fake_conn.durable('ADD colour') == []
+    assert fake_conn.durable('INSERT INTO schema_migrations') == []
+
+
+def test_applied_migration_is_recorded(fake_db, fake_conn):
+    fake_conn.results['FROM schema_migrations'] = []
+    runner = MigrationRunner(fake_db, migrations=[
+        (1, "Widgets", ["ALTER TABLE widgets ADD colour NVARCHAR(20) NULL"]),
+    ])
+
+    assert runner.run() == [1]
+    assert fake_conn.durable('ADD colour')
+    assert fake_conn.durable('INSERT INTO schema_migrations')
@@ -0,0 +1,29 @@
+"""Connection pool transaction handling"""
+
+
+def test_autocommit_reaches_driver(fake_pool, fake_conn):
+    conn = fake_pool.acquire()
+    conn.autocommit = False
+    assert fake_conn.autocommit is False
+    assert conn.autocommit is False
+    conn.close()
+
+
+def test_rollback_undoes_write(fake_pool, fake_conn):
+    conn = fake_pool.acquire()
+    conn.autocommit = False
+    conn.cursor().execute("INSERT INTO departments (dept_name) VALUES ('Paint')")
+    conn.rollback()
+    conn.autocommit = True
+    conn.close()
+    assert fake_conn.durable('INSERT INTO departments') == []
+
+
+def test_release_rolls_back_open_transaction(fake_pool, fake_conn):
+    conn = fake_pool.acquire()
+    conn.autocommit = False
+    conn.cursor().execute("INSERT INTO departments (dept_name) VALUES ('Paint')")
+    conn.close()
+    assert fake_conn.durable('INSERT INTO departments') == []
+    # Next borrower gets the pool's configured autocommit back
+    assert fake_conn.autocommit is True
@@ -0,0 +1,23 @@
+"""Report listing pages"""
+
+COUNTS = "SUM(CASE WHEN r.hazard_assessment = 'High/Immediate'"
+
+
+def test_counts_cover_every_filtered_report(fake_db, fake_conn):
+    fake_conn.results[COUNTS] = [(120, 30, 40, None)]
+
+    page = fake_db.get_near_miss_reports_page(plant_filter='Red Oak', page_size=50, with_counts=True)
+
+    assert page['counts'] == {'total': 120, 'high': 30, 'medium': 40, 'resolved': 0}
+    counts_sql, counts_params = next((operation, params) for operation, params in fake_conn.committed
+                                     if COUNTS in operation)
+    assert 'TOP' not in counts_sql
+    assert 'r.plant = %s' in counts_sql
+    assert counts_params == ['Red Oak']
+
+
+def test_counts_only_when_asked(fake_db, fake_conn):
+    page = fake_db.get_near_miss_reports_page(plant_filter='Red Oak')
+
+    assert 'counts' not in page
+    assert not any(COUNTS in operation for operation, _ in fake_conn.committed)
@@ -0,0 +1,21 @@
+"""Dashboard rollup rebuild"""
+import pytest
+
+
+def test_failed_rebuild_keeps_old_rollup(fake_db, fake_conn):
+    fake_conn.fail_on = 'INSERT INTO report_stats_daily'
+
+    with pytest.raises(RuntimeError):
+        fake_db.rebuild_report_stats()
+
+    assert fake_conn.durable('DELETE FROM report_stats_daily') == []
+
+
+def test_rebuild_locks_reports_before_rollup(fake_db, fake_conn):
+    fake_conn.results['SELECT @@ROWCOUNT'] = [(12,)]
+
+    assert fake_db.rebuild_report_stats() == 12
+    statements = [operation for operation, _ in fake_conn.committed]
+    lock_reports = next(i for i, sql in enumerate(statements) if 'near_miss_reports WITH (TABLOCK, HOLDLOCK)' in sql)
+    delete_rollup = next(i for i, sql in enumerate(statements) if 'DELETE FROM report_stats_daily' in sql)
+    assert lock_reports < delete_rollup
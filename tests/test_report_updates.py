@@ -0,0 +1,45 @@
+"""Report edits and their row_version concurrency check"""
+import pytest
+
+from app.models.database import NearMissDatabase
+
+LOCKED_SELECT = 'WITH (UPDLOCK, ROWLOCK)'
+APPLIED = 'SELECT report_id FROM @updated'
+VERSION = bytes.fromhex('00000000000007d1')
+
+
+@pytest.fixture
+def report_row(fake_conn):
+    """Report 7 as the locked read sees it"""
+    row = (7, VERSION) + (None,) * len(NearMissDatabase.EDITABLE_REPORT_FIELDS)
+    fake_conn.results[LOCKED_SELECT] = [row]
+    return row
+
+
+def test_update_is_guarded_by_row_version(fake_db, fake_conn, report_row):
+    fake_conn.results[APPLIED] = [(7,)]
+
+    result = fake_db.update_near_miss_report(7, {'description': 'Forklift'}, 1, VERSION.hex())
+
+    assert result['status'] == 'updated'
+    update = next((operation, params) for operation, params in fake_conn.committed
+                  if 'UPDATE near_miss_reports' in operation)
+    assert 'WHERE report_id = %s AND row_version = %s' in update[0]
+    assert list(update[1])[:3] == ['Forklift', 7, VERSION]
+
+
+def test_update_matching_no_row_is_conflict(fake_db, fake_conn, report_row):
+    # The row changed between the locked read and the UPDATE
+    fake_conn.results[APPLIED] = []
+
+    result = fake_db.update_near_miss_report(7, {'description': 'Forklift'}, 1, VERSION.hex())
+
+    assert result['status'] == 'conflict'
+    assert result['changed'] == []
+
+
+def test_row_version_is_required(fake_db, fake_conn, report_row):
+    result = fake_db.update_near_miss_report(7, {'description': 'Forklift'}, 1)
+
+    assert result['status'] == 'invalid'
+    assert fake_conn.durable('UPDATE near_miss_reports') == []
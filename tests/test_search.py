@@ -0,0 +1,120 @@
+"""Report search never truncates listings or exports"""
+import pytest
+
+from app.models.database import NearMissDatabase
+from app.utils.search import report_index
+
+
+@pytest.fixture
+def indexed(fake_db, monkeypatch):
+    monkeypatch.setattr(NearMissDatabase, 'fulltext_available', lambda self: False)
+    monkeypatch.setattr(NearMissDatabase, 'refresh_search_index', lambda self, full=False, wait=True: 0)
+    monkeypatch.setattr(NearMissDatabase, 'SEARCH_RESULT_LIMIT', 3)
+    monkeypatch.setattr(report_index, 'last_rebuild', 1e12)
+    monkeypatch.setattr(report_index, 'last_refresh', 1e12)
+    return fake_db
+
+
+def test_matches_within_limit_filter_by_id(indexed, monkeypatch):
+    monkeypatch.setattr(report_index, 'search', lambda query, limit=None: [9, 4, 7])
+    query, params = indexed._report_filters('forklift')
+    assert 'r.report_id IN (9, 4, 7)' in query
+    assert params == []
+
+
+def test_matches_over_limit_fall_back_to_complete_scan(indexed, monkeypatch):
+    monkeypatch.setattr(report_index, 'search', lambda query, limit=None: [9, 4, 7, 2][:limit])
+    monkeypatch.setattr('app.models.directory.user_directory.ensure_fresh', lambda db: None)
+    assert indexed.search_report_ids('forklift') is None
+    query, params = indexed._report_filters('forklift')
+    assert 'r.description LIKE %s' in query
+    assert params == ['%forklift%']
+
+
+def test_scan_fallback_ands_the_index_terms(indexed, monkeypatch):
+    monkeypatch.setattr(report_index, 'search', lambda query, limit=None: [9, 4, 7, 2][:limit])
+    monkeypatch.setattr('app.models.directory.user_directory.ensure_fresh', lambda db: None)
+    query, params = indexed._report_filters('Forklift, reversing')
+    assert query.count('r.description LIKE %s') == 2
+    assert params == ['%forklift%', '%reversing%']
+
+
+def test_listing_searches_once(indexed, monkeypatch):
+    calls = []
+    monkeypatch.setattr(report_index, 'search', lambda query, limit=None: calls.append(query) or [9, 4, 7, 2][:limit])
+    monkeypatch.setattr('app.models.directory.user_directory.ensure_fresh', lambda db: None)
+    indexed.get_near_miss_reports('forklift')
+    assert len(calls) == 1
+
+
+def test_unbuilt_index_builds_in_background_and_scans(indexed, monkeypatch):
+    started = []
+    monkeypatch.setattr(NearMissDatabase, 'start_search_index_rebuild', lambda self: started.append(True))
+    monkeypatch.setattr(report_index, 'last_rebuild', 0.0)
+    assert indexed.search_report_ids('forklift') is None
+    assert started
+
+
+def test_stale_index_rebuilds_in_background(indexed, monkeypatch):
+    started = []
+    monkeypatch.setattr(NearMissDatabase, 'start_search_index_rebuild', lambda self: started.append(True))
+    monkeypatch.setattr(NearMissDatabase, 'refresh_search_index',
+                        lambda self, full=False, wait=True: pytest.fail("rebuilt in the request"))
+    monkeypatch.setattr(report_index, 'last_rebuild', 1.0)
+    monkeypatch.setattr(report_index, 'search', lambda query, limit=None: [9, 4])
+    assert indexed.search_report_ids('forklift') == [9, 4]
+    assert started
+
+
+def test_index_lag_is_age_of_oldest_unindexed_report(indexed, fake_conn, monkeypatch):
+    monkeypatch.setattr(report_index, 'high_water', 120)
+    fake_conn.results['WHERE report_id > %s'] = [(42,)]
+    assert indexed.search_index_lag() == 42.0
+    assert fake_conn.committed[-1][1] == (120,)
+
+
+def test_index_lag_is_zero_when_current(indexed, fake_conn):
+    fake_conn.results['WHERE report_id > %s'] = [(None,)]
+    assert indexed.search_index_lag() == 0.0
+
+
+def test_index_lag_absent_under_fulltext(indexed, monkeypatch):
+    monkeypatch.setattr(NearMissDatabase, 'fulltext_available', lambda self: True)
+    assert indexed.search_index_lag() is None
+
+
+def test_search_pages_follow_rank(indexed, fake_conn, monkeypatch):
+    monkeypatch.setattr(report_index, 'search', lambda query, limit=None: [9, 4, 7])
+    fake_conn.results['SELECT r.report_id FROM near_miss_reports r'] = [(4,), (7,), (9,)]
+    monkeypatch.setattr(NearMissDatabase, '_row_to_report',
+                        lambda self, row, names: {'report_id': row[0]})
+    fake_conn.results['AND r.report_id IN (9, 4)'] = [(4,), (9,)]
+    fake_conn.results['AND r.report_id IN (7)'] = [(7,)]
+
+    first = indexed.get_near_miss_reports_page('forklift', page_size=2)
+    assert [report['report_id'] for report in first['reports']] == [9, 4]
+
+    second = indexed.get_near_miss_reports_page('forklift', page_size=2, cursor=first['next_cursor'])
+    assert [report['report_id'] for report in second['reports']] == [7]
+    assert second['next_cursor'] is None
+
+
+def test_refresh_reads_changes_since_last_load(fake_db, fake_conn, monkeypatch):
+    from app.models import database
+    from app.utils.search import ReportSearchIndex
+
+    index = ReportSearchIndex()
+    index.add(40, 'old wording')
+    index.synced_version = b'\x00\x00\x00\x00\x00\x00\x07\xd0'
+    monkeypatch.setattr(database, 'report_index', index)
+    monkeypatch.setattr('app.models.directory.user_directory.ensure_fresh', lambda db: None)
+    fake_conn.results['MIN_ACTIVE_ROWVERSION'] = [(b'\x00\x00\x00\x00\x00\x00\x07\xe0',)]
+    # Report 40 was edited in another process; its id is below the newest indexed report
+    fake_conn.results['WHERE row_version >= %s'] = [(40, 'Forklift reversing', None)]
+    index.add(90, 'newer report')
+
+    assert fake_db.refresh_search_index() == 1
+    assert fake_conn.committed[-1][1] == (b'\x00\x00\x00\x00\x00\x00\x07\xd0',)
+    assert index.search('forklift') == [40]
+    assert index.search('wording') == []
+    assert index.synced_version == b'\x00\x00\x00\x00\x00\x00\x07\xe0'
@@ -0,0 +1,25 @@
+"""Reference data seeding is all-or-nothing"""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def merge_counts(fake_conn):
+    fake_conn.results['SELECT @@ROWCOUNT'] = [(1,)]
+
+
+def test_failing_seed_leaves_nothing_behind(fake_db, fake_conn):
+    fake_conn.fail_on = 'MERGE immediate_actions'
+
+    with pytest.raises(RuntimeError):
+        fake_db.seed_reference_data(hazard_types=['Slip', 'Trip'], immediate_actions=['Stopped work'])
+
+    assert fake_conn.durable('MERGE hazard_types') == []
+    assert fake_conn.durable('#seed_hazard_types') == []
+    assert fake_conn.durable('MERGE lookup_versions') == []
+
+
+def test_seed_commits_every_table(fake_db, fake_conn):
+    fake_db.seed_reference_data(hazard_types=['Slip'], immediate_actions=['Stopped work'])
+
+    assert fake_conn.durable('MERGE hazard_types')
+    assert fake_conn.durable('MERGE immediate_actions')